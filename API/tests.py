@@ -1,3 +1,35 @@
-from django.test import TestCase
+from SystemApp.test import support
+from SystemApp.test.support import call
+from API import urls
 
-# Create your tests here.
+#Entries and exits of 100 new plates, then the exit of a vehicle parked before the batch. Exits of seeded tickets are
+#timed in 2100 as the tenants are seeded at the current time
+EVENTS = [{'flow': flow, 'plate_number': f'RAZ{n:03d}Z', 'customer_id': '{customer_id}', 'gate': '{gate_id}', 'time': str(1644480000 + n * 60 + offset)}
+          for flow, offset in (('entry', 0), ('exit', 3600)) for n in range(100)]
+EVENTS.append({'flow': 'exit', 'plate_number': 'RAB000C', 'customer_id': '{customer_id}', 'gate': '{gate_id}', 'time': '4102444800', 'amount_payed': 500, 'payment_method': 'Cash'})
+
+
+class APIQueryBudgetTestCase(support.QueryBudgetTestCase):
+    urlconf = urls
+    budgets = {
+        'ParkingLogs_Port': [
+            #Entries timed in 2022 also open the rollup row of their day
+            call('/api/post', 13, method='post', data={'flow': 'entry', 'plate_number': 'RAS001S', 'customer_id': '{customer_id}', 'gate': '{gate_id}', 'time': '1644480000'}),
+            call('/api/post', 11, method='post', data={'flow': 'exit', 'plate_number': 'RAG005C', 'customer_id': '{customer_id}', 'gate': '{gate_id}', 'time': '4102444800'}),
+            call('/api/post', 0, method='post', data={'flow': 'exit'}, status=400),
+        ],
+        'ParkingLogs_Events': [
+            call('/api/events', 22, milliseconds=1000, method='post', data={'events': EVENTS}, json=True),
+        ],
+        'ParkingLogs_Journal': [
+            call('/api/journal', 0, method='post', data={'flow': 'entry', 'plate_number': 'RAS001S', 'customer_id': '{customer_id}', 'gate': '{gate_id}', 'time': '1644480000'}),
+        ],
+        'AsyncParkingLogs_Post': [
+            call('/api/async/post', 13, method='post', data={'flow': 'entry', 'plate_number': 'RAS001S', 'customer_id': '{customer_id}', 'gate': '{gate_id}', 'time': '1644480000'}),
+            call('/api/async/post', 12, method='post', data={'flow': 'exit', 'plate_number': 'RAE010C', 'customer_id': '{customer_id}', 'gate': '{gate_id}', 'time': '4102444800'}),
+            call('/api/async/post', 0, method='post', data={'flow': 'park'}),
+        ],
+        'AsyncParkingLogs_Events': [
+            call('/api/async/events', 22, milliseconds=1000, method='post', data={'events': EVENTS}, json=True),
+        ],
+    }
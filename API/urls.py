@@ -5,5 +5,9 @@ from . import views
 
 urlpatterns = [    
     ###Auth Related#####
-    path('post', views.ParkingLogs.Post, name='ParkingLogs_Port')
+    path('post', views.ParkingLogs.Post, name='ParkingLogs_Port'),
+    path('events', views.ParkingLogs.Events, name='ParkingLogs_Events'),
+    path('journal', views.ParkingLogs.Journal, name='ParkingLogs_Journal'),
+    path('async/post', views.AsyncParkingLogs.Post, name='AsyncParkingLogs_Post'),
+    path('async/events', views.AsyncParkingLogs.Events, name='AsyncParkingLogs_Events'),
 ]
\ No newline at end of file
@@ -1,33 +1,89 @@
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, HttpResponseNotFound, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.core.exceptions import ObjectDoesNotExist
 from requests.api import request
 import SystemApp
-import datetime
-from uuid import uuid4
+from SystemApp import dedupe
+from SystemApp import ingestion
+from SystemApp import journal
+import json
+
+
+def async_csrf_exempt(view):
+    #csrf_exempt wraps a view in a plain function before Django 5.0, which would hide the coroutine
+    view.csrf_exempt = True
+    return view
+
+
+def batch(request):
+    """The events of a batch request, or the response rejecting it."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        events = json.loads(request.body)
+    except ValueError:
+        return HttpResponseBadRequest('Events must be sent as a JSON array')
+    if isinstance(events, dict):
+        events = events.get('events')
+    if not isinstance(events, list):
+        return HttpResponseBadRequest('Events must be sent as a JSON array')
+    if len(events) > ingestion.MAX_EVENTS:
+        return HttpResponseBadRequest(f'At most {ingestion.MAX_EVENTS} events can be sent at once')
+    return events
+
+
+def replay(result):
+    """The answer to a retried camera event, from the `result` it had the first time."""
+    response = HttpResponse()
+    response['TicketId'] = result['ticket_id']
+    if 'cost' in result:
+        response['Cost'] = result['cost']
+    response['Duplicate'] = 'true'
+    return response
 
 
 class ParkingLogs:
     @csrf_exempt
     def Post(request):
         if request.method == 'POST':
+            if request.POST.get('flow') in ingestion.FLOWS:
+                try:
+                    event = ingestion.Event(request.POST.dict())
+                except ingestion.InvalidEvent as error:
+                    return HttpResponseBadRequest(str(error))
+                #A retried event is answered with its first ticket
+                key = (event.customer_id, event.event_id)
+                cached = dedupe.cached({key}) if event.event_id else {}
+                if key in cached:
+                    return replay(cached[key])
+                if not SystemApp.models.Gates.objects.filter(gate_id=event.gate_id, customer_id=event.customer_id).exists():
+                    return HttpResponseBadRequest('Unknown customer or gate')
+
             if request.POST.get('flow') == 'entry':
-                ticket_id = uuid4()
-                SystemApp.models.Parkinglog.objects.create(plate_number=request.POST.get('plate_number'), 
-                                    date = datetime.datetime.now(),
-                                    ticket_id = ticket_id,
-                                    customer_id = SystemApp.models.Customers.objects.get(customer_id=request.POST.get('customer_id')),
-                                    checkin_time= int(float(request.POST.get('time'))),
-                                    checkin_method = 'Camera',
-                                    entry_gate= SystemApp.models.Gates.objects.get(gate_id=request.POST.get('gate')),
-                                    parked = True)
-        
                 try:
-                    SystemApp.models.Parkinglog.objects.filter(ticket_id=ticket_id).update(subscription=SystemApp.models.Subscriptions.objects.get(plate_number=request.POST.get('plate_number')))
-                except ObjectDoesNotExist:
-                    pass
+                    ticket = ingestion.open_ticket(event.customer_id, event.gate_id, event.plate_number, event.time, event.event_id)
+                except ingestion.DuplicateEvent as duplicate:
+                    return replay(duplicate.result)
+
                 response = HttpResponse()
-                response['TicketId'] = ticket_id
+                response['TicketId'] = ticket.ticket_id
+                response['Occupancy'] = SystemApp.models.Occupancy.current(ticket.customer_id_id)
+                return response
+
+            elif request.POST.get('flow') == 'exit':
+                try:
+                    ticket = ingestion.close_ticket(event.customer_id, event.gate_id, event.plate_number, event.time, event.amount_payed, event.payment_method, event.event_id)
+                except ingestion.NotParked as error:
+                    return HttpResponseNotFound(str(error))
+                except ingestion.DuplicateEvent as duplicate:
+                    return replay(duplicate.result)
+                except ingestion.InvalidEvent as error:
+                    return HttpResponseBadRequest(str(error))
+
+                response = HttpResponse()
+                response['TicketId'] = ticket.ticket_id
+                response['Cost'] = ticket.cost
+                response['Occupancy'] = SystemApp.models.Occupancy.current(event.customer_id)
                 return response
 
             else:
@@ -35,4 +91,75 @@ class ParkingLogs:
                 response['TicketId'] = 200
                 return response
         else:
-            return None
\ No newline at end of file
+            return None
+
+    @csrf_exempt
+    def Events(request):
+        """
+        Entry and exit events buffered by a gate agent, as a JSON array (or the
+        `events` of a JSON object) of {flow, customer_id, gate, plate_number,
+        time} objects, exits optionally with amount_payed and payment_method,
+        each optionally with the event_id its retries are sent again under.
+        Answers a ticket id or an error per event, in order.
+        """
+        events = batch(request)
+        if isinstance(events, HttpResponse):
+            return events
+        return JsonResponse({'results': ingestion.ingest(events)})
+
+    @csrf_exempt
+    def Journal(request):
+        """
+        A camera event, with the fields of Post, appended to the write-behind
+        journal and acknowledged with 202 before its ticket is written. The
+        drain_journal command writes it later. Answers the sequence number
+        of the event in the journal and the event_id it was given.
+        """
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        try:
+            seq, event_id = journal.append(request.POST.dict())
+        except ingestion.InvalidEvent as error:
+            return HttpResponseBadRequest(str(error))
+
+        response = HttpResponse(status=202)
+        response['Journaled'] = seq
+        response['EventId'] = event_id
+        return response
+
+
+class AsyncParkingLogs:
+    """
+    The camera endpoints as coroutines, for the ASGI application. Entries and
+    exits of concurrent requests are written together by the event loop's Batcher,
+    in Django's database thread, while the loop keeps serving connections.
+    """
+    @async_csrf_exempt
+    async def Post(request):
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        if request.POST.get('flow') not in ingestion.FLOWS:
+            response = HttpResponse()
+            response['TicketId'] = 200
+            return response
+        result = await ingestion.batcher().submit(request.POST.dict())
+        if result.get('error') == str(ingestion.NotParked()):
+            return HttpResponseNotFound(result['error'])
+        if 'error' in result:
+            return HttpResponseBadRequest(result['error'])
+        if result.get('duplicate'):
+            return replay(result)
+
+        response = HttpResponse()
+        response['TicketId'] = result['ticket_id']
+        if 'cost' in result:
+            response['Cost'] = result['cost']
+        response['Occupancy'] = result['occupancy']
+        return response
+
+    @async_csrf_exempt
+    async def Events(request):
+        events = batch(request)
+        if isinstance(events, HttpResponse):
+            return events
+        return JsonResponse({'results': await sync_to_async(ingestion.ingest)(events)})
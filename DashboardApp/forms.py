@@ -1,6 +1,10 @@
 from django import forms
 from django.utils import timezone
+from django.db import transaction
 import SystemApp
+from SystemApp import bookkeeping
+from SystemApp import memberships
+from SystemApp import tariffs
 from .models import *
 import datetime
 
@@ -36,12 +40,14 @@ class TarrifForm(forms.Form):
     cost = forms.IntegerField(label='Price in Rwf', widget=forms.NumberInput(attrs={'class': 'form-control', 'id':'cost', 'type':'number', 'placeholder':'RWF'}))
 
     def create(self):
+        tariffs.validate(self.cleaned_data['customer_id'].customer_id, self.cleaned_data['from_time'], self.cleaned_data['to_time'])
         tarrif = SystemApp.models.Tarrif(customer_id=self.cleaned_data['customer_id'], from_time=self.cleaned_data['from_time'], to_time=self.cleaned_data['to_time'], cost=float(self.cleaned_data['cost']), datetime=timezone.now())
         tarrif.save()
         return tarrif
 
     def update(self):
-        tarrif = SystemApp.models.Tarrif.objects.get(pk=self.cleaned_data['tarrif_id'])
+        tarrif = SystemApp.models.Tarrif.objects.get(pk=self.cleaned_data['tarrif_id'], customer_id=self.cleaned_data['customer_id'])
+        tariffs.validate(tarrif.customer_id_id, self.cleaned_data['from_time'], self.cleaned_data['to_time'], exclude=tarrif.tarrif_id)
         tarrif.from_time = self.cleaned_data['from_time']
         tarrif.to_time = self.cleaned_data['to_time']
         tarrif.cost = float(self.cleaned_data['cost'])
@@ -67,7 +73,10 @@ class TicketForm:
         def create(self):
             format_datetime = datetime.datetime.strptime(str(self.cleaned_data['date']) + ' ' + str(self.cleaned_data['entry_time']), '%Y-%m-%d %H:%M:%S') 
             ticket = SystemApp.models.Parkinglog(plate_number=self.cleaned_data['plate_number'].upper(), date = timezone.now(), customer_id = self.cleaned_data['user'].customer_id, checkin_time= format_datetime.timestamp(),checkin_method = 'Manual', checkin_user = self.cleaned_data['user'], entry_gate= SystemApp.models.Gates.objects.get(gate_id=self.cleaned_data['gate'].gate_id), parked = True)
-            ticket.save()
+            ticket.subscription_id = memberships.lookup(ticket.customer_id_id, ticket.plate_number)
+            with transaction.atomic():
+                ticket.save()
+                bookkeeping.ticket_opened(ticket)
             return ticket
 
     class CheckoutForm(forms.Form):
@@ -111,17 +120,25 @@ class TicketForm:
         method = forms.CharField(label='Payment Method', widget=forms.Select(choices=Payment_Method, attrs={'class': 'form-control', 'id':'checkout_payment_method'}))
 
 
+        @transaction.atomic
         def update(self):
             ticket = SystemApp.models.Parkinglog.objects.get(ticket_id=self.cleaned_data['ticket_id'])
+            was_parked = ticket.parked
+            if not was_parked:
+                #Checking out a closed ticket again replaces its earlier exit in the rollups
+                bookkeeping.ticket_reopened(ticket)
             ticket.checkout_time = datetime.datetime.strptime(str(self.cleaned_data['exit_date']) + ' ' + str(self.cleaned_data['exit_time']), '%Y-%m-%d %H:%M:%S').timestamp()
-            ticket.checkout_gate = SystemApp.models.Gates.objects.get(gate_id=self.cleaned_data['exit_gate'].gate_id)
             ticket.checkout_method = 'Manual'
-            ticket.exit_gate = SystemApp.models.Gates.objects.get(gate_id=self.cleaned_data['exit_gate'].gate_id)
+            ticket.exit_gate = self.cleaned_data['exit_gate']
             ticket.checkout_user = self.cleaned_data['user']
             ticket.amount_payed = self.cleaned_data['payed']
             ticket.payment_method = self.cleaned_data['method']
+            if ticket.subscription_id is None:
+                #Subscribed since the vehicle came in
+                ticket.subscription_id = memberships.lookup(ticket.customer_id_id, ticket.plate_number)
             ticket.parked = False
             ticket.save()
+            bookkeeping.ticket_closed(ticket, was_parked=was_parked)
             return ticket
 
 class SubscriptionForm(forms.ModelForm):
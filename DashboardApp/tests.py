@@ -1,3 +1,54 @@
-from django.test import TestCase
+from SystemApp.test import support
+from SystemApp.test.support import call
+from DashboardApp import urls
+import datetime
 
-# Create your tests here.
+TODAY = str(datetime.date.today())
+
+
+class DashboardQueryBudgetTestCase(support.QueryBudgetTestCase):
+    urlconf = urls
+    budgets = {
+        'index': [call('/', 0)],
+        'login': [call('/login', 2), call('/login', 2, method='post')],
+        'logout': [call('/logout', 4)],
+        'registration': [call('/join', 2), call('/join', 2, method='post')],
+        'dashboard_page': [call('/dashboard', 10), call('/dashboard', 10, data={'gates': 'today'})],
+        'dashboard_series': [call('/dashboard/series', 6), call('/dashboard/series', 6, data={'bucket': 'hour'}),
+                             call('/dashboard/series', 3, data={'bucket': 'minute'}, status=400)],
+        'dashboard_cache_stats': [call('/dashboard/cache', 2)],
+        'dashboard_journal_stats': [call('/dashboard/journal', 2)],
+        'dashboard_sql_profile': [call('/dashboard/sql', 4), call('/dashboard/sql', 2, data={'format': 'json'})],
+        'parking': [
+            call('/parking', 14),
+            call('/parking', 6, data={'format': 'json', 'ticket_id': '{parked_ticket_id}'}),
+            call('/parking', 24, method='post', data={'action': 'add', 'date': TODAY, 'entry_time': '08:30', 'gate': '{gate_id}', 'plate_number': 'RAZ999Z'}),
+            call('/parking', 25, method='post', data={'action': 'update', 'ticket_id': '{parked_ticket_id}', 'entry_date': TODAY, 'entry_time': '08:30', 'entry_gate': '{gate_id}',
+                                                     'exit_date': TODAY, 'exit_time': '09:30', 'exit_gate': '{gate_id}', 'payed': 500, 'method': 'Cash'}),
+            call('/parking', 22, method='post', data={'action': 'delete', 'item_id': '{ticket_id}'}),
+        ],
+        'parking_quotes': [call('/parking/quotes', 6), call('/parking/quotes', 6, data={'ticket_id': '{ticket_id},{parked_ticket_id}'})],
+        'history': [call('/history', 7)],
+        'history_data': [call('/history/data', 5, data={'draw': 1, 'start': 0, 'length': 25}), call('/history/data', 5, data={'plate_contains': 'AB1', 'parked': 'false'})],
+        'history_search': [call('/history/search', 4, data={'plate': 'RAB', 'size': 100})],
+        'history_export': [call('/history/export.csv', 4), call('/history/export.xlsx', 4, data={'gzip': '1'})],
+        'pricing': [call('/pricing', 6), call('/pricing', 8, method='post', data={'action': 'add', 'from_time': 1440, 'to_time': 2880, 'cost': 2000})],
+        'pricing_simulation': [call('/pricing/simulate', 6), call('/pricing/simulate', 5, method='post', data={'tariffs': [[0, 120, 300], [121, 1440, 800]]}, json=True)],
+        'subscription': [
+            call('/subscription', 6),
+            call('/subscription', 7, method='post', data={'action': 'add', 'name': 'Subscriber', 'plate_number': 'RAT123T', 'start_date': TODAY, 'end_date': TODAY,
+                                                          'amount': 20000, 'phone_number': '0788000000'}),
+        ],
+        'subscription_export': [call('/subscription/export.csv', 4)],
+        'accounts_page': [call('/accounts', 6)],
+        'add_account': [call('/accounts/add', 6, method='post', data={'first_name': 'New', 'last_name': 'Cashier', 'email': 'new{customer_id}@ewawe.rw', 'phonenum': '0788000000',
+                                                                       'password': 'secret', 'role': 'Cashier'})],
+        'self_profile': [call('/accounts/profile', 6)],
+        'user_profile': [call('/accounts/{user_id}/profile', 6)],
+        'VerifyEmail': [call('/sign-up/verify-mail', 2)],
+        'VerifyEmailToken': [call('/sign-up/verify/mail/expired', 1)],
+        'VerifyEmailSuccess': [call('/sign-up/verify/mail/success', 1)],
+        'settings_page': [call('/settings', 6)],
+        'add_gate': [call('/settings/gates/add', 5, method='post', data={'gate_name': 'Back', 'status': 'Active'})],
+        'contact_us_page': [call('/contact-us', 4)],
+    }
@@ -12,20 +12,30 @@ urlpatterns = [
 
     ###Dashboard Related #####
     path('dashboard', views.DashboardView.dashboard_page, name='dashboard_page'),
+    path('dashboard/series', views.DashboardView.series, name='dashboard_series'),
+    path('dashboard/cache', views.DashboardView.cache_stats, name='dashboard_cache_stats'),
+    path('dashboard/journal', views.DashboardView.journal_stats, name='dashboard_journal_stats'),
+    path('dashboard/sql', views.DashboardView.sql_profile, name='dashboard_sql_profile'),
 
     ### Parked Vehicles Related#####
     path('parking', views.parking.as_view(), name='parking'),
+    path('parking/quotes', views.quotes.tickets, name='parking_quotes'),
 
     ###Parking Logs Related#####
     path('history', views.history.history_page, name='history'),
+    path('history/data', views.history.history_data, name='history_data'),
+    path('history/search', views.history.advanced_search, name='history_search'),
+    path('history/export.<str:format>', views.export.history, name='history_export'),
     
     ###Tarrif Related#####
     path('pricing', views.pricing.as_view(), name='pricing'),
+    path('pricing/simulate', views.simulations.revenue, name='pricing_simulation'),
 
     ###Subcribers
     path('subscription', views.subscription.as_view() , name='subscription'),
+    path('subscription/export.<str:format>', views.export.subscriptions, name='subscription_export'),
 
-    path('accounts', views.users.add_user, name='accounts_page'),
+    path('accounts', views.users.accounts_page, name='accounts_page'),
     path('accounts/add', views.users.add_user, name='add_account'),
     path('accounts/profile', views.users.self_profile, name='self_profile'),
     path('accounts/<int:user_id>/profile', views.users.user_profile, name='user_profile'),
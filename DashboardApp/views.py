@@ -1,16 +1,31 @@
-from django.http import Http404, HttpResponseBadRequest, JsonResponse, HttpRequest, HttpResponse 
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, HttpRequest, HttpResponse, StreamingHttpResponse
 from DashboardApp.forms import LoginForm
 from SystemApp import models
+from SystemApp import statistics
+from SystemApp import caching
+from SystemApp import bookkeeping
+from SystemApp import pagination
+from SystemApp import search
+from SystemApp import exports
+from SystemApp import listings
+from SystemApp import profiling
+from SystemApp import tariffs
+from SystemApp import simulation
+from SystemApp import memberships
+from SystemApp import journal
 from django.shortcuts import render, redirect
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import auth
 from django.core.exceptions import ObjectDoesNotExist
 from django.views import View
 from django.core import serializers
+from django.db import transaction
 from django.contrib.auth.mixins import LoginRequiredMixin
 from DashboardApp import forms
-from django.utils.timezone import datetime
+from django.utils.timezone import datetime, make_aware
+from datetime import timedelta
 import pytz
 import json
 import time
@@ -94,7 +109,10 @@ class pricing(LoginRequiredMixin, View):
             form = forms.TarrifForm(request.POST)
             if form.is_valid():
                 form.cleaned_data['customer_id'] = request.user.customer_id
-                form.create()
+                try:
+                    form.create()
+                except tariffs.InvalidTariff as error:
+                    return self.rejected(request, error)
                 self.context['tarrifs'] = models.Tarrif.objects.filter(customer_id=request.user.customer_id.customer_id)
                 self.context['success'] = {'message': 'Tarrif updated successfully'}
                 return render(request, self.template_name, self.context)
@@ -106,7 +124,13 @@ class pricing(LoginRequiredMixin, View):
         elif request.POST.get('action') == 'update':
             form = forms.TarrifForm(request.POST)
             if form.is_valid():
-                form.update()
+                form.cleaned_data['customer_id'] = request.user.customer_id
+                try:
+                    form.update()
+                except models.Tarrif.DoesNotExist:
+                    raise Http404("No such tarrif")
+                except tariffs.InvalidTariff as error:
+                    return self.rejected(request, error)
                 self.context['tarrifs'] = models.Tarrif.objects.filter(customer_id=request.user.customer_id.customer_id)
                 self.context['success'] = {'message': 'Tarrif updated successfully'}
                 return render(request, self.template_name, self.context)
@@ -117,13 +141,20 @@ class pricing(LoginRequiredMixin, View):
 
         elif request.POST.get('action') == 'delete':
             tarrif_id = request.POST.get('tarrif_id')
-            models.Tarrif.objects.get(tarrif_id=tarrif_id).delete()
+            #Deleting a tarrif may leave minutes uncovered, which is only a warning
+            alerts = tariffs.removal_alerts(request.user.customer_id.customer_id, tarrif_id)
+            models.Tarrif.objects.filter(tarrif_id=tarrif_id, customer_id=request.user.customer_id.customer_id).delete()
             self.context['tarrifs'] = models.Tarrif.objects.filter(customer_id=request.user.customer_id.customer_id)
-            return render(request, self.template_name, self.context)
+            return render(request, self.template_name, dict(self.context, alerts=alerts))
 
         else:
             return HttpResponseBadRequest()
 
+    def rejected(self, request, error):
+        #Tarrifs that would overlap or leave a gap in the schedule
+        return render(request, self.template_name, dict(self.context, tarrifs=models.Tarrif.objects.filter(customer_id=request.user.customer_id.customer_id),
+                                                        alerts=[{'message': str(error), 'title': 'Tarrif rejected', 'type': 'error'}]))
+
 
  
 class parking(LoginRequiredMixin, View):
@@ -134,19 +165,23 @@ class parking(LoginRequiredMixin, View):
         if request.GET.get('format') == 'json':
             if request.GET.get('ticket_id') and not request.GET.get('cost'):
                 ticket_id = int(request.GET.get('ticket_id'))
-                ticket_obj = models.Parkinglog.objects.filter(ticket_id=ticket_id, customer_id=request.user.customer_id.customer_id)
-                if ticket_obj.exists():
-                    ticket_json = {'fields' :json.loads(serializers.serialize('json', [ticket_obj[0],]))[0]['fields']}
+                ticket = models.Parkinglog.objects.filter(ticket_id=ticket_id, customer_id=request.user.customer_id.customer_id).first()
+                if ticket is not None:
+                    ticket_json = {'fields' :json.loads(serializers.serialize('json', [ticket,]))[0]['fields']}
                     ticket_json['fields']['cost'], ticket_json['alerts']  = models.Tarrif.match_tarrif(request.user.customer_id.customer_id, time.time(), ticket_json['fields']['checkin_time'])
-                    ticket_json['fields']['checkin_time'] = datetime.utcfromtimestamp(ticket_obj.first().checkin_time + 7400).strftime('%H:%M')
-                    ticket_json['fields']['checkin_date'] = datetime.utcfromtimestamp(ticket_obj.first().checkin_time).strftime('%Y-%m-%d')
+                    if ticket.subscription_id is None:
+                        ticket_json['fields']['subscription'] = memberships.lookup(ticket.customer_id_id, ticket.plate_number)
+                    ticket_json['fields']['checkin_time'] = datetime.utcfromtimestamp(ticket.checkin_time + 7400).strftime('%H:%M')
+                    ticket_json['fields']['checkin_date'] = datetime.utcfromtimestamp(ticket.checkin_time).strftime('%Y-%m-%d')
                     return JsonResponse(ticket_json, safe=False)
                 else:
                     return JsonResponse({'error': 'No such ticket exists'})
             elif request.GET.get('ticket_id') and request.GET.get('checkout_time') and request.GET.get('checkin_time'):
-                response = {'fields': {'cost': models.Tarrif.match_tarrif(request.GET.get('checkout_time'), request.GET.get('checkin_time') ) }}
-
-                return JsonResponse({'error': 'No such ticket exists'})
+                try:
+                    cost, alerts = models.Tarrif.match_tarrif(request.user.customer_id.customer_id, request.GET.get('checkout_time'), request.GET.get('checkin_time'))
+                except ValueError:
+                    return HttpResponseBadRequest("Check in and checkout times must be timestamps")
+                return JsonResponse({'fields': {'cost': cost}, 'alerts': alerts})
             
             else:
                 return HttpResponseBadRequest("Please provide a ticket id")
@@ -156,7 +191,7 @@ class parking(LoginRequiredMixin, View):
             self.context['CheckinForm'].populate(request.user.customer_id.customer_id)
             self.context['TicketForm'] = forms.TicketForm.CheckoutForm()
             self.context['alerts'] = None
-            self.context['vehicles'] = models.Parkinglog.objects.filter(customer_id=request.user.customer_id.customer_id, parked=True)
+            self.context['vehicles'] = listings.parked_vehicles(request.user.customer_id.customer_id)
             self.context['user'] = request.user
             return render(request, self.template_name, self.context)
 
@@ -167,12 +202,12 @@ class parking(LoginRequiredMixin, View):
             if form.is_valid():
                 if models.Parkinglog.objects.filter(customer_id=request.user.customer_id.customer_id, plate_number=form.cleaned_data['plate_number'], parked = True).exists():
                     self.context['alerts'] = [{'message': 'Vehicle already parked! Consider checking out the vehicle.', 'title':'Vehicel already parked', 'type':'error'},]
-                    self.context['vehicles'] = models.Parkinglog.objects.filter(customer_id=request.user.customer_id.customer_id)
+                    self.context['vehicles'] = listings.parked_vehicles(request.user.customer_id.customer_id)
                     return render(request, self.template_name, self.context)
                 else:
                     form.cleaned_data['user'] = request.user
                     form.create()
-                    self.context['vehicles'] = models.Parkinglog.objects.filter(customer_id=request.user.customer_id.customer_id)
+                    self.context['vehicles'] = listings.parked_vehicles(request.user.customer_id.customer_id)
                     self.context['alerts'] = [{'message': f"Ticket with vehicle plate number {form.cleaned_data['plate_number']} has been added sucessfully.", 'title':'Vehicle added succesffuly', 'type':'success'}]
                     return render(request, self.template_name, self.context)
             else:
@@ -185,12 +220,12 @@ class parking(LoginRequiredMixin, View):
             if form.is_valid():
                 form.cleaned_data['user'] = request.user
                 form.update()
-                self.context['vehicles'] = models.Parkinglog.objects.filter(customer_id=request.user.customer_id.customer_id, parked=True)
+                self.context['vehicles'] = listings.parked_vehicles(request.user.customer_id.customer_id)
                 self.context['success'] = {'message': f'Checkout with Plate Number {form.cleaned_data["plate_number"]} has been done effectively!'}
                 return render(request, self.template_name, self.context)
             else:
                 self.context['parkingForm'] = form
-                self.context['vehicles'] = models.Parkinglog.objects.filter(customer_id=request.user.customer_id.customer_id, parked=True)
+                self.context['vehicles'] = listings.parked_vehicles(request.user.customer_id.customer_id)
                 self.context['alerts'] = form.errors.get_json_data()
                 return render(request, self.template_name, self.context)
 
@@ -198,19 +233,62 @@ class parking(LoginRequiredMixin, View):
             ticket_id = request.POST.get('item_id')
             obj =  models.Parkinglog.objects.filter(ticket_id=ticket_id, customer_id=request.user.customer_id.customer_id)
             if obj.exists(): 
-                plate_number = obj.first().plate_number
-                obj.delete()
+                ticket = obj.first()
+                plate_number = ticket.plate_number
+                with transaction.atomic():
+                    obj.delete()
+                    bookkeeping.ticket_removed(ticket)
                 self.context['alerts'] = [{'message': f"Ticket with with Plate number {plate_number} has been removed.", 'title':'Ticket removed successfully', 'type':'success'}]
-                self.context['vehicles'] = models.Parkinglog.objects.filter(customer_id=request.user.customer_id.customer_id)
+                self.context['vehicles'] = listings.parked_vehicles(request.user.customer_id.customer_id)
                 return render(request, self.template_name, self.context)
             else:
                 self.context['alerts'] = [{'message': 'Unable to find ticket with matching plate number', 'title':'Invalid request', 'type':'error'},]
-                self.context['vehicles'] = models.Parkinglog.objects.filter(customer_id=request.user.customer_id.customer_id)
+                self.context['vehicles'] = listings.parked_vehicles(request.user.customer_id.customer_id)
                 return render(request, self.template_name, self.context)
 
         else:
             return HttpResponseBadRequest()
 
+class simulations:
+    @login_required
+    def revenue(request):
+        """
+        Revenue of the tickets closed from `start` to `end` (YYYY-MM-DD, the
+        last 30 days by default) under the proposed `tariffs` of the JSON body,
+        a list of [from_time, to_time, cost], or under the current tariffs.
+        """
+        customer_id = request.user.customer_id.customer_id
+        try:
+            body = json.loads(request.body or '{}') if request.method == 'POST' else {}
+            params = dict(request.GET.items(), **body)
+            end = datetime.strptime(params['end'], '%Y-%m-%d').date() if params.get('end') else datetime.today().date()
+            start = datetime.strptime(params['start'], '%Y-%m-%d').date() if params.get('start') else end - timedelta(days=29)
+            proposal = params.get('tariffs')
+            if proposal is None:
+                proposal = models.Tarrif.objects.filter(customer_id=customer_id).values_list('from_time', 'to_time', 'cost')
+            if start > end:
+                return HttpResponseBadRequest("The start date must not be after the end date")
+            return JsonResponse(simulation.simulate(customer_id, proposal, start, end))
+        except tariffs.InvalidTariff as error:
+            return HttpResponseBadRequest(str(error))
+        except (ValueError, TypeError, AttributeError):
+            return HttpResponseBadRequest("Dates must be formatted as YYYY-MM-DD and tariffs given as [from_time, to_time, cost] lists")
+
+class quotes:
+    @login_required
+    def tickets(request):
+        """
+        Current cost, elapsed time and subscription status of the tickets
+        `ticket_id` (repeated or comma separated), or of every parked vehicle.
+        """
+        ids = [value for values in request.GET.getlist('ticket_id') for value in values.split(',') if value]
+        try:
+            ticket_ids = [int(value) for value in ids] if ids else None
+        except ValueError:
+            return HttpResponseBadRequest("Ticket ids must be numbers")
+        tickets, alerts = tariffs.quote_tickets(request.user.customer_id.customer_id, ticket_ids)
+        return JsonResponse({'quotes': tickets, 'alerts': alerts})
+
 class subscription(LoginRequiredMixin, View):
     template_name = "DashboardApp/Subscription/Subscriptions.html"
     context = {'SubscriptionForm' : forms.SubscriptionForm() }
@@ -254,25 +332,126 @@ class subscription(LoginRequiredMixin, View):
 
 
 class DashboardView:
+    def dashboard_context(customer_id, window):
+        today = datetime.today().date()
+        return {
+            'stats': statistics.dashboard_stats(customer_id),
+            'gates': list(statistics.gate_statistics(customer_id, window=window)),
+            'subscriptions_count': models.Subscriptions.objects.filter(customer_id=customer_id).count(),
+            'payements_summary': statistics.payment_summary(customer_id),
+            'payements_summary_today': statistics.payment_summary(customer_id, date_from=today, date_to=today),
+        }
+
     @login_required
     def dashboard_page(request):
-        context = {'parking_logs' : models.Parkinglog.objects.filter(customer_id=request.user.customer_id.customer_id)}
-        context['gates'] = models.Gates.objects.filter(customer_id=request.user.customer_id.customer_id)
-        context['subscription'] = models.Subscriptions.objects.filter(customer_id = request.user.customer_id.customer_id)
-        context['user'] = request.user
-        context['customer'] = request.user.customer_id
-        context['payements_summary'] = models.Customers.objects.get(customer_id = request.user.customer_id.customer_id).payements_summary
+        customer_id = request.user.customer_id.customer_id
+        #Only the known windows, any other value counts since the first ticket and shares its cache entry
+        window = request.GET.get('gates') if request.GET.get('gates') in statistics.GATE_WINDOWS else None
+        context = caching.get_or_set(customer_id, f'context:{window}:{datetime.today().date()}', lambda: DashboardView.dashboard_context(customer_id, window))
+        context = dict(context, user=request.user, customer=request.user.customer_id)
         return render(request, 'DashboardApp/Dashboard/dashboard.html', context)
 
+    @login_required
+    def series(request):
+        customer_id = request.user.customer_id.customer_id
+        try:
+            end = datetime.strptime(request.GET.get('end'), '%Y-%m-%d').date() if request.GET.get('end') else datetime.today().date()
+            start = datetime.strptime(request.GET.get('start'), '%Y-%m-%d').date() if request.GET.get('start') else end - timedelta(days=6)
+        except ValueError:
+            return HttpResponseBadRequest("Dates must be formatted as YYYY-MM-DD")
+        if start > end:
+            return HttpResponseBadRequest("The start date must not be after the end date")
+        bucket = request.GET.get('bucket') or None
+        if bucket is not None and bucket not in statistics.SERIES_BUCKETS:
+            return HttpResponseBadRequest(f"The bucket must be one of {', '.join(statistics.SERIES_BUCKETS)}")
+        start_time = int(make_aware(datetime.combine(start, datetime.min.time())).timestamp())
+        end_time = int(make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time())).timestamp())
+        series = caching.get_or_set(customer_id, f'series:{start}:{end}:{bucket}', lambda: statistics.activity_series(customer_id, start_time, end_time, bucket=bucket))
+        return JsonResponse(series)
+
+    @staff_member_required
+    def cache_stats(request):
+        return JsonResponse(caching.stats())
+
+    @staff_member_required
+    def journal_stats(request):
+        return JsonResponse(journal.stats())
+
+    @staff_member_required
+    def sql_profile(request):
+        """SQL profile of the sampled requests per view, as a page or with ?format=json."""
+        if request.method == 'POST' and request.POST.get('action') == 'reset':
+            profiling.reset()
+            return redirect(reverse('dashboard_sql_profile'))
+        context = {'sample_rate': profiling.sample_rate(), 'views': profiling.report()}
+        if request.GET.get('format') == 'json':
+            return JsonResponse(context)
+        return render(request, 'DashboardApp/Dashboard/SQLProfile.html', dict(context, user=request.user))
+
 
 
 class history:
     @login_required
     def history_page(request):
-        context = {'parking_logs': models.Parkinglog.objects.filter(customer_id=request.user.customer_id.customer_id)}
+        context = {'total_cars': pagination.history_estimate(request.user.customer_id.customer_id)}
+        context['gates'] = models.Gates.objects.filter(customer_id=request.user.customer_id.customer_id)
         context['user'] = request.user
         return render(request, 'DashboardApp/ParkingLogs/HistoryPage.html', context)
 
+    @login_required
+    def history_data(request):
+        """One page of parking logs for the DataTables server-side processing mode."""
+        customer_id = request.user.customer_id.customer_id
+        column = request.GET.get('order[0][column]', '')
+        order = request.GET.get(f'columns[{column}][data]', 'checkin_time')
+        descending = request.GET.get('order[0][dir]', 'desc') == 'desc'
+        try:
+            draw = int(request.GET.get('draw', 0))
+            start = int(request.GET.get('start', 0))
+            size = int(request.GET.get('length', pagination.HISTORY_PAGE_SIZE))
+            filters = search.parse_filters(request.GET)
+            rows, cursor = pagination.history_page(customer_id, order, descending, after=request.GET.get('after') or None, size=size,
+                                                   logs=search.search_logs(customer_id, filters))
+        except (pagination.InvalidCursor, search.InvalidSearch) as error:
+            return HttpResponseBadRequest(str(error))
+        except ValueError:
+            return HttpResponseBadRequest("Invalid page or sort column")
+        #The estimate comes from the rollups and must never hide a page that exists
+        total = max(pagination.history_estimate(customer_id), start + len(rows) + (1 if cursor else 0))
+        matching = start + len(rows) + (1 if cursor else 0) if filters else total
+        data = [{
+            'ticket_id': row.ticket_id,
+            'date': row.date,
+            'plate_number': row.plate_number,
+            'entry_gate': row.entry_gate,
+            'checkin_time': row.checkin_datetime,
+            'checkout_time': row.checkout_datetime,
+            'exit_gate': row.exit_gate,
+            'duration': row.format_duration,
+            'amount_payed': row.amount_payed or 0,
+            'subscribed': row.subscribed,
+        } for row in listings.ticket_rows(rows)]
+        return JsonResponse({'draw': draw, 'recordsTotal': total, 'recordsFiltered': matching, 'data': data, 'next': cursor})
+
+    @login_required
+    def advanced_search(request):
+        """
+        Advanced history search, see SystemApp.search.parse_filters for the
+        filters. Results come in pages of `size` tickets; pass the returned
+        `next` cursor as `after` to read the following page.
+        """
+        customer_id = request.user.customer_id.customer_id
+        try:
+            filters = search.parse_filters(request.GET)
+            rows, cursor = pagination.history_page(customer_id, request.GET.get('order', 'checkin_time'), request.GET.get('dir', 'desc') == 'desc',
+                                                   after=request.GET.get('after') or None, size=int(request.GET.get('size', pagination.HISTORY_PAGE_SIZE)),
+                                                   logs=search.search_logs(customer_id, filters))
+        except (pagination.InvalidCursor, search.InvalidSearch) as error:
+            return HttpResponseBadRequest(str(error))
+        except ValueError:
+            return HttpResponseBadRequest("Invalid page size or sort order")
+        return JsonResponse({'results': rows, 'next': cursor})
+
     
 
     @login_required
@@ -280,7 +459,7 @@ class history:
         context = {'ticket' : models.Parkinglog.objects.get(ticket_id=ticket_id)}
         context['gates'] = models.Gates.objects.filter(customer_id=context['ticket'].customer_id.customer_id)
         context['user'] = request.user
-        context['cost'] = models.Tarrif.match_tarrif(context['ticket'].elapsed)
+        context['cost'], context['alerts'] = models.Tarrif.match_tarrif(request.user.customer_id.customer_id, time.time(), context['ticket'].checkin_time)
         context['subscription'] = models.Subscriptions.is_subscribed(customer_id=request.user.customer_id.customer_id, plate_number = context['ticket'].plate_number)
         return render(request, 'DashboardApp/ParkingLogs/CheckoutForm.html', context)
 
@@ -288,7 +467,52 @@ class history:
 
        
 
+class export:
+    def stream(request, rows, format, filename, sheet):
+        compress = request.GET.get('gzip') in ('1', 'true')
+        content_type, extension = exports.FORMATS[format]
+        response = StreamingHttpResponse(exports.stream(rows, format, sheet=sheet, compress=compress), content_type='application/gzip' if compress else content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}{".gz" if compress else ""}"'
+        return response
+
+    @login_required
+    def history(request, format):
+        if format not in exports.FORMATS:
+            raise Http404("Unknown export format")
+        customer_id = request.user.customer_id.customer_id
+        try:
+            filters = search.parse_filters(request.GET)
+        except search.InvalidSearch as error:
+            return HttpResponseBadRequest(str(error))
+        rows = exports.history_rows(customer_id, search.search_logs(customer_id, filters))
+        return export.stream(request, rows, format, f'parking-history-{datetime.today().date()}', 'Parking History')
+
+    @login_required
+    def subscriptions(request, format):
+        if format not in exports.FORMATS:
+            raise Http404("Unknown export format")
+        try:
+            filters = search.parse_filters(request.GET)
+        except search.InvalidSearch as error:
+            return HttpResponseBadRequest(str(error))
+        rows = exports.subscription_rows(request.user.customer_id.customer_id, filters)
+        return export.stream(request, rows, format, f'subscriptions-{datetime.today().date()}', 'Subscriptions')
+
+
 class users:
+    @login_required
+    def accounts_page(request):
+        try:
+            start = datetime.strptime(request.GET.get('start'), '%Y-%m-%d') if request.GET.get('start') else None
+            end = datetime.strptime(request.GET.get('end'), '%Y-%m-%d') + timedelta(days=1) if request.GET.get('end') else None
+        except ValueError:
+            return HttpResponseBadRequest("Dates must be formatted as YYYY-MM-DD")
+        context = {'users': list(statistics.cashier_statistics(request.user.customer_id.customer_id,
+                                                               start=start and int(make_aware(start).timestamp()),
+                                                               end=end and int(make_aware(end).timestamp())))}
+        context['total_accounts'] = len(context['users'])
+        return render(request, 'DashboardApp/Accounts/user.html', context)
+
     @login_required
     def add_user(request):
         if request.method == "POST":
@@ -306,12 +530,15 @@ class users:
 
     @login_required
     def self_profile(request):
-        context = {'user_profile': request.user}
+        context = {'user_profile': statistics.cashier_statistics(request.user.customer_id.customer_id).get(user_id=request.user.user_id)}
         return render(request, 'DashboardApp/Accounts/Profile.html', context)
 
     @login_required
     def user_profile(request, user_id):
-        context = {'user_profile': models.Users.objects.get(user_id=user_id)}
+        try:
+            context = {'user_profile': statistics.cashier_statistics(request.user.customer_id.customer_id).get(user_id=user_id)}
+        except models.Users.DoesNotExist:
+            raise Http404("No such user")
         context['user'] = request.user
         return render(request, 'DashboardApp/Accounts/Profile.html', context)
 
@@ -2,6 +2,8 @@
 ASGI config for System project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The camera endpoints under api/async/ are coroutines and only pay off served
+from here, e.g. gunicorn System.asgi:application -k uvicorn.workers.UvicornWorker
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
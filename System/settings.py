@@ -53,12 +53,13 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'SystemApp.staticfiles.AsyncWhiteNoiseMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'SystemApp.profiling.SQLProfileMiddleware',
 ]
 
 ROOT_URLCONF = 'System.urls'
@@ -74,6 +75,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'SystemApp.context_processors.occupancy',
             ],
         },
     },
@@ -108,6 +110,40 @@ DATABASES = {
 if 'test' in sys.argv or 'test_coverage' in sys.argv: #Covers regular testing and django-coverage
     DATABASES['default']['ENGINE'] = 'django.db.backends.sqlite3'
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Set CACHE_DIR to share the dashboard cache between workers through the file backend
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ewawe-parking',
+    }
+}
+
+if os.environ.get('CACHE_DIR'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR'),
+    }
+
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', 300))
+
+#Seconds a worker keeps a compiled tariff schedule, the longest it misses a change made through another worker when the cache is not shared
+TARIFF_SCHEDULE_TTL = int(os.environ.get('TARIFF_SCHEDULE_TTL', 60))
+
+#Seconds an index of subscribed plates is kept, the longest a worker misses a subscription changed through another one when the cache is not shared
+SUBSCRIPTION_INDEX_TTL = int(os.environ.get('SUBSCRIPTION_INDEX_TTL', 60))
+
+#Seconds the result of a camera event is kept to answer the retries of its gate agent
+EVENT_DEDUPE_WINDOW = int(os.environ.get('EVENT_DEDUPE_WINDOW', 86400))
+
+#SQLite file of the write-behind journal of camera events, local to each server
+CAMERA_JOURNAL_PATH = os.environ.get('CAMERA_JOURNAL_PATH', BASE_DIR / 'journal.sqlite3')
+
+#Share of requests whose SQL is profiled, 0 turns the profiler off
+SQL_PROFILE_SAMPLE_RATE = float(os.environ.get('SQL_PROFILE_SAMPLE_RATE', 0))
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
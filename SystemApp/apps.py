@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SystemappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'SystemApp'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,69 @@
+"""
+Derived data kept in step with the parking logs.
+
+Every code path that opens, closes or removes a ticket calls these helpers
+inside the same transaction as its own write, so the rollups and counters
+never disagree with the tickets they summarise.
+"""
+from collections import Counter
+
+from .models import DailyActivity, Occupancy, PlateTrigram, RevenueLedger, increment
+
+
+def ticket_opened(ticket):
+    DailyActivity.record_entry(ticket)
+    Occupancy.record_entry(ticket)
+
+
+def ticket_closed(ticket, was_parked=True):
+    """Record the checkout of `ticket`, already saved with its exit details."""
+    DailyActivity.record_exit(ticket)
+    RevenueLedger.record(ticket)
+    if was_parked:
+        Occupancy.record_exit(ticket)
+
+
+def ticket_reopened(ticket):
+    """Take back the recorded checkout of `ticket` before it is checked out again."""
+    DailyActivity.record_exit(ticket, sign=-1)
+    RevenueLedger.record(ticket, sign=-1)
+
+
+def ticket_removed(ticket):
+    DailyActivity.forget(ticket)
+    if ticket.parked:
+        Occupancy.record_entry(ticket, sign=-1)
+    else:
+        RevenueLedger.record(ticket, sign=-1)
+
+
+def tickets_opened(tickets):
+    """
+    Record a batch of opened `tickets` with one update per rollup row touched
+    rather than per ticket.
+    """
+    entries, parked = Counter(), Counter()
+    for ticket in tickets:
+        entries[(ticket.customer_id_id, ticket.date, ticket.entry_gate_id)] += 1
+        parked[(ticket.customer_id_id, ticket.entry_gate_id)] += 1
+    for (customer_id, date, gate_id), count in entries.items():
+        DailyActivity.record(customer_id, date, gate_id, entries=count)
+    for (customer_id, gate_id), count in parked.items():
+        Occupancy.adjust(customer_id, gate_id, count)
+    PlateTrigram.record_many(tickets)
+
+
+def tickets_closed(tickets):
+    """Record the checkout of a batch of parked `tickets`, already saved with their exit details."""
+    exits, ledgers, left = {}, {}, Counter()
+    for ticket in tickets:
+        key = (ticket.customer_id_id, ticket.date, ticket.exit_gate_id, ticket.payment_method)
+        exits.setdefault(key, Counter()).update(exits=1, revenue=ticket.cost or 0, amount_payed=ticket.amount_payed or 0, duration=ticket.duration or 0)
+        ledgers.setdefault(ticket.customer_id_id, Counter()).update(tickets=1, revenue=ticket.cost or 0, amount_payed=ticket.amount_payed or 0)
+        left[(ticket.customer_id_id, ticket.entry_gate_id)] += 1
+    for (customer_id, date, gate_id, payment_method), totals in exits.items():
+        DailyActivity.record(customer_id, date, gate_id, payment_method, **totals)
+    for customer_id, totals in ledgers.items():
+        increment(RevenueLedger, {'customer_id_id': customer_id}, totals)
+    for (customer_id, gate_id), count in left.items():
+        Occupancy.adjust(customer_id, gate_id, -count)
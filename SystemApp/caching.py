@@ -0,0 +1,81 @@
+"""
+Per-customer cache for computed dashboard data.
+
+Entries are namespaced by a per-customer version number kept in the cache
+itself. Invalidating a customer bumps its version, which orphans exactly that
+customer's entries (they expire on their own) and works the same on the
+local-memory, file and shared cache backends.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_ALIAS = getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')
+TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+STATS_KEYS = ('dashboard:stats:hits', 'dashboard:stats:misses')
+MISSING = object()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _increment(key, delta=1):
+    cache = _cache()
+    cache.add(key, 0, None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        #The key was evicted between add and incr
+        cache.set(key, delta, None)
+        return delta
+
+
+def version(customer_id):
+    cache = _cache()
+    key = f'dashboard:{customer_id}:version'
+    current = cache.get(key)
+    if current is None:
+        cache.add(key, 1, None)
+        current = cache.get(key, 1)
+    return current
+
+
+def invalidate(customer_id):
+    """Drop every cached entry of a customer."""
+    if customer_id is not None:
+        _increment(f'dashboard:{customer_id}:version')
+
+
+def invalidate_on_commit(customer_id, invalidate=invalidate):
+    """
+    Invalidate a customer now and again once the current transaction
+    commits: another process may have cached what it read before the commit
+    in between.
+    """
+    invalidate(customer_id)
+    transaction.on_commit(lambda: invalidate(customer_id))
+
+
+def get_or_set(customer_id, name, compute, timeout=None):
+    """Return the cached value `name` of a customer, computing it on a miss."""
+    cache = _cache()
+    key = f'dashboard:{customer_id}:{version(customer_id)}:{name}'
+    value = cache.get(key, MISSING)
+    if value is MISSING:
+        _increment(STATS_KEYS[1])
+        value = compute()
+        cache.set(key, value, TIMEOUT if timeout is None else timeout)
+    else:
+        _increment(STATS_KEYS[0])
+    return value
+
+
+def stats():
+    hits, misses = (_cache().get(key, 0) for key in STATS_KEYS)
+    lookups = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / lookups if lookups else 0.0}
+
+
+def reset_stats():
+    _cache().delete_many(STATS_KEYS)
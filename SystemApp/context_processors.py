@@ -0,0 +1,10 @@
+from .models import Occupancy
+import functools
+
+
+def occupancy(request):
+    """Live parked-car count of the signed in user's customer, read once and only when a template shows it."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated or user.customer_id_id is None:
+        return {}
+    return {'occupancy': functools.cache(lambda: Occupancy.current(user.customer_id_id))}
@@ -0,0 +1,58 @@
+"""
+Camera events already ingested, by the event_id their gate agent gave them.
+
+An agent that loses a response sends the same event again with the same
+event_id. The result of every ingested event with an id is kept in the
+cache for EVENT_DEDUPE_WINDOW seconds, so a retry storm is answered from
+the cache with the original ticket and writes nothing. The cache bounds the
+store: entries expire with the window or are evicted under its size limit.
+Past that, the entry_event and exit_event of the tickets, unique per
+customer, still reject the retry and give back the original result.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+
+from . import caching
+from .models import Parkinglog
+
+WINDOW = getattr(settings, 'EVENT_DEDUPE_WINDOW', 86400)
+MAX_LENGTH = Parkinglog._meta.get_field('entry_event').max_length
+
+
+def _cache():
+    return caches[caching.CACHE_ALIAS]
+
+
+def _key(customer_id, event_id):
+    return f'events:{customer_id}:{event_id}'
+
+
+def cached(keys):
+    """Results of the (customer_id, event_id) `keys` still in the cache."""
+    keys = list(keys)
+    found = _cache().get_many([_key(*key) for key in keys])
+    return {key: found[_key(*key)] for key in keys if _key(*key) in found}
+
+
+def recorded(keys):
+    """Results of the (customer_id, event_id) `keys` written to tickets, put back in the cache."""
+    keys = set(keys)
+    if not keys:
+        return {}
+    found = {}
+    event_ids = {event_id for customer_id, event_id in keys}
+    for ticket_id, customer_id, entry_event, exit_event, cost in Parkinglog.objects.filter(customer_id__in={customer_id for customer_id, event_id in keys}).filter(
+            Q(entry_event__in=event_ids) | Q(exit_event__in=event_ids)).order_by().values_list('ticket_id', 'customer_id', 'entry_event', 'exit_event', 'cost'):
+        if (customer_id, entry_event) in keys:
+            found[(customer_id, entry_event)] = {'flow': 'entry', 'ticket_id': ticket_id}
+        if (customer_id, exit_event) in keys:
+            found[(customer_id, exit_event)] = {'flow': 'exit', 'ticket_id': ticket_id, 'cost': cost}
+    remember(found)
+    return found
+
+
+def remember(results):
+    """Keep the results of ingested events by their (customer_id, event_id) keys for the window."""
+    if results:
+        _cache().set_many({_key(*key): result for key, result in results.items()}, WINDOW)
@@ -0,0 +1,183 @@
+"""
+Streaming CSV and XLSX exports of parking history and subscriptions.
+
+Rows are read in keyset pages and encoded as they go, so an export starts
+downloading at once and uses the same memory whatever its size. XLSX files
+are written as a zip stream of plain SpreadsheetML, no spreadsheet library
+needed.
+"""
+from django.utils import timezone
+from xml.sax.saxutils import escape
+import csv
+import datetime
+import zipfile
+import zlib
+
+from . import pagination
+from . import search
+from .models import Subscriptions
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+def local_time(timestamp, zone):
+    if timestamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(timestamp, zone).strftime('%Y-%m-%d %H:%M:%S')
+
+
+#Cells of a parking log row, given the row and the time zone of the export
+HISTORY_COLUMNS = (
+    ('Ticket', lambda row, zone: row['ticket_id']),
+    ('Date', lambda row, zone: row['date']),
+    ('Plate Number', lambda row, zone: row['plate_number']),
+    ('Entry Gate', lambda row, zone: row['entry_gate__name']),
+    ('Checkin Time', lambda row, zone: local_time(row['checkin_time'], zone)),
+    ('Checkout Time', lambda row, zone: local_time(row['checkout_time'], zone)),
+    ('Exit Gate', lambda row, zone: row['exit_gate__name']),
+    ('Duration (minutes)', lambda row, zone: round(row['duration'] / 60) if row['duration'] is not None else None),
+    ('Cost', lambda row, zone: row['cost']),
+    ('Amount Payed', lambda row, zone: row['amount_payed']),
+    ('Payment Method', lambda row, zone: row['payment_method']),
+    ('Subscription', lambda row, zone: row['subscription']),
+)
+
+SUBSCRIPTION_FIELDS = ('subscription_id', 'date', 'plate_number', 'name', 'phone_number', 'start_date', 'end_date', 'amount', 'user__email', 'comments')
+SUBSCRIPTION_COLUMNS = (
+    ('Subscription', lambda row: row['subscription_id']),
+    ('Date', lambda row: row['date']),
+    ('Plate Number', lambda row: row['plate_number']),
+    ('Name', lambda row: row['name']),
+    ('Phone Number', lambda row: row['phone_number']),
+    ('Start', lambda row: row['start_date']),
+    ('End', lambda row: row['end_date']),
+    ('Amount', lambda row: row['amount']),
+    ('Sold By', lambda row: row['user__email']),
+    ('Comments', lambda row: row['comments']),
+)
+
+
+def history_rows(customer_id, logs):
+    """Header and cell values of the parking logs `logs`, in check-in order."""
+    zone = timezone.get_current_timezone()
+    yield [header for header, value in HISTORY_COLUMNS]
+    for row in pagination.iterate_history(customer_id, logs=logs):
+        yield [value(row, zone) for header, value in HISTORY_COLUMNS]
+
+
+def subscription_rows(customer_id, filters=None):
+    """
+    Header and cell values of a customer's subscriptions, read by subscription
+    id in chunks. Of the history filters only the plate ones apply.
+    """
+    yield [header for header, value in SUBSCRIPTION_COLUMNS]
+    subscriptions = Subscriptions.objects.filter(customer_id=customer_id).order_by('subscription_id')
+    if filters is not None and filters.plate:
+        subscriptions = subscriptions.filter(**search.plate_prefix(filters.plate))
+    if filters is not None and filters.plate_contains:
+        subscriptions = subscriptions.filter(plate_normalized__contains=filters.plate_contains)
+    last = 0
+    while True:
+        rows = list(subscriptions.filter(subscription_id__gt=last).values(*SUBSCRIPTION_FIELDS)[:pagination.HISTORY_MAX_PAGE_SIZE])
+        for row in rows:
+            yield [value(row) for header, value in SUBSCRIPTION_COLUMNS]
+        if len(rows) < pagination.HISTORY_MAX_PAGE_SIZE:
+            return
+        last = rows[-1]['subscription_id']
+
+
+class Echo:
+    """File-like object handing back whatever is written to it."""
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row]).encode()
+
+
+class ZipStream:
+    """Unseekable file collecting what zipfile writes, drained between rows."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    '_rels/.rels': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>',
+    'xl/workbook.xml': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>',
+    'xl/_rels/workbook.xml.rels': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>',
+}
+
+
+def xlsx_cell(value):
+    if isinstance(value, bool) or value is None:
+        value = '' if value is None else str(value)
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+def stream_xlsx(rows, sheet='Export'):
+    output = ZipStream()
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content.replace('{sheet}', escape(sheet, {'"': '&quot;'})))
+        yield output.drain()
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as worksheet:
+            worksheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            for row in rows:
+                worksheet.write(('<row>' + ''.join(xlsx_cell(value) for value in row) + '</row>').encode())
+                data = output.drain()
+                if data:
+                    yield data
+            worksheet.write(b'</sheetData></worksheet>')
+    yield output.drain()
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(rows, format, sheet='Export', compress=False):
+    """Encoded chunks of `rows` in `format` ('csv' or 'xlsx'), gzipped on request."""
+    chunks = stream_csv(rows) if format == 'csv' else stream_xlsx(rows, sheet)
+    return gzipped(chunks) if compress else chunks
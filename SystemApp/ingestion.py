@@ -0,0 +1,342 @@
+"""
+Batches of camera events sent by the gate agents.
+
+A gate agent buffers entry and exit events while the barrier is busy and
+flushes them as one JSON array. The customers, gates and open tickets of the
+whole batch are read up front in a few queries and subscriptions come from
+the cached index. The events are then replayed in order in memory: new
+tickets are written with one bulk_create, the tickets they close with one
+bulk_update, and the rollups are updated once per row they touch, all in a
+single transaction. An invalid event gets an error in its result without
+holding back the rest of the batch. Events sent again under the same
+event_id get their first result back, see SystemApp.dedupe.
+
+Under ASGI, Batcher gathers the single events of concurrent requests into
+such batches, so a burst of camera requests costs a few bulk writes instead
+of one transaction each.
+"""
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+import asyncio
+import datetime
+import math
+import weakref
+
+from . import bookkeeping
+from . import caching
+from . import dedupe
+from . import memberships
+from . import tariffs
+from .models import Customers, Gates, Occupancy, Parkinglog, normalize_plate
+
+MAX_EVENTS = 1000
+BATCH_SIZE = 500
+FLOWS = ('entry', 'exit')
+#Event times up to the last day of year 9999, amounts and ids that fit a BigIntegerField
+MAX_TIME = int(datetime.datetime(9999, 12, 31, tzinfo=datetime.timezone.utc).timestamp())
+MAX_INTEGER = 2 ** 63 - 1
+CLOSE_FIELDS = ['checkout_time', 'exit_gate', 'checkout_method', 'exit_event', 'duration', 'cost', 'amount_payed', 'payment_method', 'subscription', 'parked']
+
+
+class InvalidEvent(ValueError):
+    pass
+
+
+class NotParked(InvalidEvent):
+    def __init__(self):
+        super().__init__('No parked vehicle with this plate number')
+
+
+class ExitBeforeEntry(InvalidEvent):
+    def __init__(self):
+        super().__init__('An exit cannot be before the entry of its ticket')
+
+
+class DuplicateEvent(ValueError):
+    """An event ingested before under the same event_id, with the `result` it had then."""
+    def __init__(self, result):
+        super().__init__('This event was already ingested')
+        self.result = result
+
+
+def parse_event_id(value):
+    """The event_id a gate agent sent with an event, None when it sent none."""
+    if value is None or value == '':
+        return None
+    value = str(value)
+    if len(value) > dedupe.MAX_LENGTH:
+        raise InvalidEvent(f'An event_id has at most {dedupe.MAX_LENGTH} characters')
+    return value
+
+
+def replayed(customer_id, event_id):
+    """Result of the event of a customer with `event_id` already written to a ticket, None otherwise."""
+    return dedupe.recorded({(customer_id, event_id)}).get((customer_id, event_id)) if event_id else None
+
+
+class Event:
+    """One entry or exit of a plate at a gate, at `time` (seconds)."""
+    __slots__ = ('flow', 'customer_id', 'gate_id', 'plate_number', 'plate', 'time', 'amount_payed', 'payment_method', 'event_id')
+
+    def __init__(self, data):
+        if not isinstance(data, dict):
+            raise InvalidEvent('An event must be an object')
+        self.flow = data.get('flow')
+        if self.flow not in FLOWS:
+            raise InvalidEvent(f"The flow of an event must be one of {', '.join(FLOWS)}")
+        try:
+            self.customer_id = int(data['customer_id'])
+            self.gate_id = int(data['gate'])
+            self.time = float(data['time'])
+            self.amount_payed = int(data['amount_payed']) if data.get('amount_payed') is not None else None
+        except (KeyError, TypeError, ValueError):
+            raise InvalidEvent('An event needs a numeric customer_id, gate and time')
+        if not math.isfinite(self.time) or not 0 <= self.customer_id <= MAX_INTEGER or not 0 <= self.gate_id <= MAX_INTEGER:
+            raise InvalidEvent('An event needs a numeric customer_id, gate and time')
+        if not 0 <= self.time <= MAX_TIME:
+            raise InvalidEvent('The time of an event must be a timestamp before the year 10000')
+        if self.amount_payed is not None and not 0 <= self.amount_payed <= MAX_INTEGER:
+            raise InvalidEvent(f'The amount_payed of an event must be between 0 and {MAX_INTEGER}')
+        self.time = int(self.time)
+        self.plate_number = str(data.get('plate_number') or '').upper()
+        self.plate = normalize_plate(self.plate_number)
+        if not self.plate:
+            raise InvalidEvent('An event needs a plate number')
+        self.payment_method = data.get('payment_method')
+        if self.payment_method is not None:
+            self.payment_method = str(self.payment_method)
+        for name in ('plate_number', 'payment_method'):
+            if len(getattr(self, name) or '') > Parkinglog._meta.get_field(name).max_length:
+                raise InvalidEvent(f'The {name} of an event has at most {Parkinglog._meta.get_field(name).max_length} characters')
+        self.event_id = parse_event_id(data.get('event_id'))
+
+
+def close(ticket, checkout_time, gate_id, amount_payed=None, payment_method=None, exit_event=None):
+    """
+    Fill in the exit of `ticket` at `checkout_time` through `gate_id`, priced
+    on the tariff schedule of its customer. A subscribed plate costs nothing.
+    """
+    if ticket.subscription_id is None:
+        ticket.subscription_id = memberships.lookup(ticket.customer_id_id, ticket.plate_number)
+    ticket.checkout_time = int(checkout_time)
+    ticket.exit_gate_id = gate_id
+    ticket.checkout_method = 'Camera'
+    ticket.exit_event = exit_event
+    ticket.duration = ticket.checkout_time - ticket.checkin_time
+    if ticket.subscription_id is not None:
+        ticket.cost, ticket.amount_payed, ticket.payment_method = 0, 0, 'Subscription'
+    else:
+        ticket.cost = tariffs.schedule(ticket.customer_id_id).quote(int(ticket.duration / 60))[0]
+        ticket.amount_payed, ticket.payment_method = amount_payed, payment_method
+    ticket.parked = False
+    return ticket
+
+
+def open_ticket(customer_id, gate_id, plate_number, checkin_time, entry_event=None):
+    """
+    Open the ticket of a camera entry, with its subscription and bookkeeping,
+    in one transaction. Raises DuplicateEvent for an `entry_event` (event_id)
+    that already opened a ticket.
+    """
+    #Dated by the event like a batch, so a late entry lands on the day it happened
+    date = datetime.datetime.fromtimestamp(int(checkin_time), timezone.get_current_timezone()).date()
+    ticket = Parkinglog(customer_id_id=customer_id, date=date, plate_number=plate_number, checkin_time=int(checkin_time), checkin_method='Camera',
+                        entry_gate_id=gate_id, parked=True, subscription_id=memberships.lookup(customer_id, plate_number), entry_event=entry_event)
+    try:
+        with transaction.atomic():
+            ticket.save()
+            bookkeeping.ticket_opened(ticket)
+    except IntegrityError:
+        result = replayed(customer_id, entry_event)
+        if result is None:
+            raise
+        raise DuplicateEvent(result)
+    if entry_event:
+        dedupe.remember({(customer_id, entry_event): {'flow': 'entry', 'ticket_id': ticket.ticket_id}})
+    return ticket
+
+
+def close_ticket(customer_id, gate_id, plate_number, checkout_time, amount_payed=None, payment_method=None, exit_event=None):
+    """
+    Close the latest open ticket of `plate_number` at a camera exit, in one
+    transaction. The ticket is found through the parkinglog_open_plate index
+    and closed with a single UPDATE that only applies while it is still
+    parked, so an exit racing another gate cannot close it twice. Raises
+    DuplicateEvent for an `exit_event` (event_id) that already closed one.
+    """
+    try:
+        with transaction.atomic():
+            ticket = Parkinglog.objects.filter(customer_id=customer_id, plate_normalized=normalize_plate(plate_number), parked=True).order_by('-checkin_time').first()
+            if ticket is None:
+                raise NotParked()
+            if int(checkout_time) < ticket.checkin_time:
+                raise ExitBeforeEntry()
+            close(ticket, checkout_time, gate_id, amount_payed, payment_method, exit_event)
+            fields = {Parkinglog._meta.get_field(field).attname: getattr(ticket, Parkinglog._meta.get_field(field).attname) for field in CLOSE_FIELDS}
+            if not Parkinglog.objects.filter(ticket_id=ticket.ticket_id, parked=True).update(**fields):
+                raise NotParked()
+            bookkeeping.ticket_closed(ticket)
+    except (IntegrityError, NotParked):
+        #The retry of an exit finds its ticket closed already
+        result = replayed(customer_id, exit_event)
+        if result is None:
+            raise
+        raise DuplicateEvent(result)
+    #update() sends no signals
+    caching.invalidate_on_commit(customer_id)
+    if exit_event:
+        dedupe.remember({(customer_id, exit_event): {'flow': 'exit', 'ticket_id': ticket.ticket_id, 'cost': ticket.cost}})
+    return ticket
+
+
+def _write(parsed, results):
+    """
+    Replay the `parsed` (position, Event) pairs, filling in their `results`,
+    and write them in one transaction. Returns the tickets created and closed.
+    """
+    customers = set(Customers.objects.filter(customer_id__in={event.customer_id for position, event in parsed}).values_list('customer_id', flat=True))
+    gates = dict(Gates.objects.filter(gate_id__in={event.gate_id for position, event in parsed}).values_list('gate_id', 'customer_id'))
+    zone = timezone.get_current_timezone()
+    created, closed = [], []
+    with transaction.atomic():
+        exits = [event for position, event in parsed if event.flow == 'exit' and event.customer_id in customers]
+        #Open tickets of every plate leaving, oldest first so the latest entry of a plate is closed first
+        parked = {}
+        if exits:
+            for ticket in Parkinglog.objects.select_for_update().filter(customer_id__in={event.customer_id for event in exits}, parked=True,
+                                                                        plate_normalized__in={event.plate for event in exits}).order_by('checkin_time'):
+                parked.setdefault((ticket.customer_id_id, ticket.plate_normalized), []).append(ticket)
+
+        for position, event in parsed:
+            if event.customer_id not in customers:
+                results[position] = {'error': 'Unknown customer'}
+            elif gates.get(event.gate_id) != event.customer_id:
+                results[position] = {'error': 'Unknown gate'}
+            elif event.flow == 'entry':
+                ticket = Parkinglog(customer_id_id=event.customer_id, date=datetime.datetime.fromtimestamp(event.time, zone).date(), plate_number=event.plate_number,
+                                    plate_normalized=event.plate, checkin_time=event.time, checkin_method='Camera', entry_gate_id=event.gate_id, parked=True,
+                                    subscription_id=memberships.lookup(event.customer_id, event.plate_number), entry_event=event.event_id)
+                created.append(ticket)
+                parked.setdefault((event.customer_id, event.plate), []).append(ticket)
+                results[position] = (event.flow, ticket)
+            elif parked.get((event.customer_id, event.plate)) and event.time < parked[(event.customer_id, event.plate)][-1].checkin_time:
+                results[position] = {'error': str(ExitBeforeEntry())}
+            elif parked.get((event.customer_id, event.plate)):
+                ticket = close(parked[(event.customer_id, event.plate)].pop(), event.time, event.gate_id, event.amount_payed, event.payment_method, event.event_id)
+                if ticket.ticket_id is not None:
+                    closed.append(ticket)
+                results[position] = (event.flow, ticket)
+            else:
+                results[position] = {'error': str(NotParked())}
+
+        #Tickets opened and closed within the batch are inserted closed
+        Parkinglog.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        Parkinglog.objects.bulk_update(closed, CLOSE_FIELDS, batch_size=BATCH_SIZE)
+        bookkeeping.tickets_opened(created)
+        bookkeeping.tickets_closed([ticket for ticket in created if not ticket.parked] + closed)
+    return created, closed
+
+
+def ingest(events, retry=True):
+    """
+    Apply the entry and exit `events` (dicts) in order and return for each
+    the id of the ticket it opened or closed, or the reason it was rejected.
+    An event whose event_id was ingested before gets its first result back,
+    marked as a duplicate, and writes nothing.
+    """
+    results, parsed = [None] * len(events), []
+    for position, data in enumerate(events):
+        try:
+            parsed.append((position, Event(data)))
+        except InvalidEvent as error:
+            results[position] = {'error': str(error)}
+
+    #Retries are answered from the cache, or from the tickets once their entry is gone
+    keys = {(event.customer_id, event.event_id) for position, event in parsed if event.event_id}
+    known = dedupe.cached(keys)
+    known.update(dedupe.recorded(keys - known.keys()))
+    firsts, repeats, fresh = {}, [], []
+    for position, event in parsed:
+        key = (event.customer_id, event.event_id)
+        if key in known:
+            results[position] = dict(known[key], duplicate=True)
+        elif key in firsts:
+            repeats.append((position, firsts[key]))
+        else:
+            if event.event_id:
+                firsts[key] = position
+            fresh.append((position, event))
+    parsed = fresh
+
+    try:
+        created, closed = _write(parsed, results) if parsed else ([], [])
+    except IntegrityError:
+        #Another request wrote one of the event ids after they were looked up, the retry finds it
+        if not retry:
+            raise
+        return ingest(events, retry=False)
+
+    #Bulk writes send no signals
+    for customer_id in {ticket.customer_id_id for ticket in created + closed}:
+        caching.invalidate_on_commit(customer_id)
+    results = [(dict(flow=result[0], ticket_id=result[1].ticket_id, cost=result[1].cost) if result[0] == 'exit' else {'flow': result[0], 'ticket_id': result[1].ticket_id})
+               if isinstance(result, tuple) else result for result in results]
+    for position, first in repeats:
+        results[position] = dict(results[first], duplicate=True) if 'ticket_id' in results[first] else results[first]
+    dedupe.remember({(event.customer_id, event.event_id): results[position] for position, event in parsed if event.event_id and 'ticket_id' in results[position]})
+    return results
+
+
+def flush(events):
+    """Results of ingesting `events`, each ticket with the occupancy of its customer once the batch is written."""
+    results = ingest(events)
+    written = [(int(event['customer_id']), result) for event, result in zip(events, results) if 'ticket_id' in result]
+    occupancy = dict(Occupancy.objects.filter(customer_id__in={customer_id for customer_id, result in written}, gate__isnull=True).values_list('customer_id', 'parked'))
+    for customer_id, result in written:
+        result['occupancy'] = occupancy.get(customer_id, 0)
+    return results
+
+
+class Batcher:
+    """
+    Single events of concurrent coroutines written together. Events that
+    arrive while a batch is being written make up the next one, and every
+    caller awaits the result of its own event.
+    """
+    def __init__(self):
+        self.pending = []
+        self.writer = None
+
+    async def submit(self, event):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((event, future))
+        if self.writer is None:
+            self.writer = asyncio.ensure_future(self.write())
+        return await future
+
+    async def write(self):
+        try:
+            while self.pending:
+                batch, self.pending = self.pending[:MAX_EVENTS], self.pending[MAX_EVENTS:]
+                try:
+                    results = await sync_to_async(flush)([event for event, future in batch])
+                except Exception as error:
+                    results = [error] * len(batch)
+                for (event, future), result in zip(batch, results):
+                    #The caller may have gone away
+                    if not future.done():
+                        future.set_exception(result) if isinstance(result, Exception) else future.set_result(result)
+        finally:
+            self.writer = None
+
+
+_batchers = weakref.WeakKeyDictionary()
+
+
+def batcher():
+    """The Batcher of the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _batchers:
+        _batchers[loop] = Batcher()
+    return _batchers[loop]
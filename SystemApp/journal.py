@@ -0,0 +1,192 @@
+"""
+Write-behind journal of camera events.
+
+POST /api/journal appends a camera event to a local SQLite file in WAL mode
+and acknowledges it as soon as the append is on disk, so the camera never
+waits on the main database, slow or locked as it may be. The drain_journal
+command then replays the journal into Parkinglog with ingestion.ingest, in
+batches of the oldest events. A single drainer holds the journal's lease at
+a time and batches are ingested in arrival order, so the events of a plate
+are applied in the order they came in.
+
+An event leaves the journal only once the batch it was ingested in has
+committed. After a crash the events still journaled are drained again:
+each one got an event_id when it was appended, so one whose batch had
+committed comes back as a duplicate instead of being written twice. Events
+the database rejects (an unknown gate, an exit without an entry) stay in
+the journal with their error, and so does an event that makes its batch
+fail for any reason other than the database being unavailable: the batch
+is then ingested one event at a time, so a single bad event cannot hold
+back the journal. Rejected events can be retried or purged.
+"""
+from django.conf import settings
+from django.db import InterfaceError, OperationalError
+import contextlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from . import ingestion
+
+LEASE_SECONDS = 30
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY AUTOINCREMENT, event TEXT NOT NULL, received REAL NOT NULL, error TEXT)',
+    'CREATE TABLE IF NOT EXISTS metrics (name TEXT PRIMARY KEY, value REAL NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS lease (id INTEGER PRIMARY KEY CHECK (id = 1), owner TEXT NOT NULL, expires REAL NOT NULL)',
+)
+
+_local = threading.local()
+
+
+def path():
+    return str(getattr(settings, 'CAMERA_JOURNAL_PATH', settings.BASE_DIR / 'journal.sqlite3'))
+
+
+def _connection():
+    """This thread's connection to the journal, created with its schema on first use."""
+    connections = _local.__dict__.setdefault('connections', {})
+    if path() not in connections:
+        connection = sqlite3.connect(path(), timeout=10, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        #An acknowledged event survives a power loss, not only a crash of the process
+        connection.execute('PRAGMA synchronous=FULL')
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connections[path()] = connection
+    return connections[path()]
+
+
+def close():
+    """Close this thread's connections to the journal."""
+    for connection in _local.__dict__.pop('connections', {}).values():
+        connection.close()
+
+
+def append(data):
+    """
+    Journal the camera event `data` (a dict of the fields of an event) and
+    return its sequence number and event_id. Raises InvalidEvent for an
+    event that could never be ingested.
+    """
+    event = ingestion.Event(data)
+    data = dict(data, event_id=event.event_id or uuid.uuid4().hex)
+    return _connection().execute('INSERT INTO events (event, received) VALUES (?, ?)', (json.dumps(data), time.time())).lastrowid, data['event_id']
+
+
+def lease(owner, seconds=LEASE_SECONDS):
+    """Take or renew the drainer's lease for `owner`, False while another drainer holds it."""
+    now = time.time()
+    connection = _connection()
+    connection.execute('INSERT OR IGNORE INTO lease (id, owner, expires) VALUES (1, ?, 0)', (owner,))
+    return connection.execute('UPDATE lease SET owner = ?, expires = ? WHERE id = 1 AND (owner = ? OR expires < ?)', (owner, now + seconds, owner, now)).rowcount == 1
+
+
+def release(owner):
+    _connection().execute('UPDATE lease SET expires = 0 WHERE id = 1 AND owner = ?', (owner,))
+
+
+@contextlib.contextmanager
+def holding(owner, seconds=None):
+    """Keep renewing the lease of `owner` from another thread while the block runs, however long the database takes."""
+    seconds = seconds or LEASE_SECONDS
+    stop = threading.Event()
+
+    def renew():
+        try:
+            while not stop.wait(seconds / 3):
+                lease(owner, seconds)
+        finally:
+            close()
+
+    renewing = threading.Thread(target=renew, daemon=True)
+    renewing.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        renewing.join()
+
+
+def _ingest(events):
+    """
+    Results of ingesting `events` as one batch, or one event at a time when
+    the batch fails on something else than the database being unavailable.
+    """
+    try:
+        return ingestion.ingest(events)
+    except (OperationalError, InterfaceError):
+        raise
+    except Exception:
+        results = []
+        for event in events:
+            try:
+                results += ingestion.ingest([event])
+            except (OperationalError, InterfaceError):
+                #Events ingested so far stay journaled and come back as duplicates
+                raise
+            except Exception as error:
+                results.append({'error': f'{type(error).__name__}: {error}'})
+        return results
+
+
+def drain(limit=ingestion.MAX_EVENTS, owner=None):
+    """
+    Ingest the oldest `limit` journaled events as one batch and take them out
+    of the journal, returning how many were drained. The lease of `owner`
+    is renewed meanwhile. When the database is unavailable the batch stays
+    journaled and the error is raised.
+    """
+    connection = _connection()
+    rows = connection.execute('SELECT seq, event, received FROM events WHERE error IS NULL ORDER BY seq LIMIT ?', (limit,)).fetchall()
+    if not rows:
+        return 0
+    with holding(owner) if owner else contextlib.nullcontext():
+        results = _ingest([json.loads(event) for seq, event, received in rows])
+
+    now = time.time()
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        connection.executemany('UPDATE events SET error = ? WHERE seq = ?', [(result['error'], seq) for (seq, event, received), result in zip(rows, results)
+                                                                               if 'error' in result])
+        connection.execute('DELETE FROM events WHERE seq <= ? AND error IS NULL', (rows[-1][0],))
+        connection.execute("INSERT INTO metrics (name, value) VALUES ('drained', ?) ON CONFLICT (name) DO UPDATE SET value = value + excluded.value", (len(rows),))
+        connection.executemany('INSERT OR REPLACE INTO metrics (name, value) VALUES (?, ?)', [('drained_at', now), ('lag_seconds', now - rows[-1][2])])
+        connection.execute('COMMIT')
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    return len(rows)
+
+
+def retry_rejected():
+    """
+    Put the rejected events back in line, to be drained with the next batch
+    as the oldest events. Returns how many there were.
+    """
+    return _connection().execute('UPDATE events SET error = NULL WHERE error IS NOT NULL').rowcount
+
+
+def purge_rejected():
+    """Delete the rejected events, returning how many there were."""
+    return _connection().execute('DELETE FROM events WHERE error IS NOT NULL').rowcount
+
+
+def stats():
+    """
+    Lag of the journal: events waiting to be drained and the age in seconds
+    of the oldest, the events rejected and drained so far, when the last
+    batch was drained and how long its newest event had waited.
+    """
+    connection = _connection()
+    pending, oldest = connection.execute('SELECT COUNT(*), MIN(received) FROM events WHERE error IS NULL').fetchone()
+    metrics = dict(connection.execute('SELECT name, value FROM metrics').fetchall())
+    return {
+        'pending': pending,
+        'oldest_seconds': time.time() - oldest if oldest is not None else 0.0,
+        'rejected': connection.execute('SELECT COUNT(*) FROM events WHERE error IS NOT NULL').fetchone()[0],
+        'drained': int(metrics.get('drained', 0)),
+        'drained_at': metrics.get('drained_at'),
+        'lag_seconds': metrics.get('lag_seconds', 0.0),
+    }
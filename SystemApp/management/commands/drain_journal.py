@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from SystemApp import ingestion
+from SystemApp import journal
+import os
+import socket
+import time
+
+
+class Command(BaseCommand):
+    help = 'Drain the camera event journal into the parking logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=ingestion.MAX_EVENTS, help='Events ingested per batch')
+        parser.add_argument('--interval', type=float, default=0.5, help='Seconds to wait when the journal is empty')
+        parser.add_argument('--once', action='store_true', help='Stop once the journal is empty')
+        parser.add_argument('--retry-rejected', action='store_true', help='Drain the rejected events again first, before the events journaled after them')
+        parser.add_argument('--purge-rejected', action='store_true', help='Delete the rejected events first')
+
+    def handle(self, *args, **options):
+        owner = f'{socket.gethostname()}:{os.getpid()}'
+        if options['purge_rejected']:
+            self.stdout.write(f'Purged {journal.purge_rejected()} rejected camera events')
+        if options['retry_rejected']:
+            self.stdout.write(f'Retrying {journal.retry_rejected()} rejected camera events')
+        drained, delay = 0, options['interval']
+        try:
+            while True:
+                if not journal.lease(owner):
+                    if options['once']:
+                        self.stderr.write('Another drainer holds the journal')
+                        break
+                    time.sleep(journal.LEASE_SECONDS / 2)
+                    continue
+                try:
+                    count = journal.drain(options['batch'], owner)
+                except DatabaseError as error:
+                    #The batch stays journaled, back off until the database answers again
+                    self.stderr.write(f'Draining failed, retrying in {delay:.1f}s: {error}')
+                    connection.close()
+                    time.sleep(delay)
+                    delay = min(delay * 2, journal.LEASE_SECONDS / 2)
+                    continue
+                drained, delay = drained + count, options['interval']
+                if not count:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        finally:
+            journal.release(owner)
+        self.stdout.write(self.style.SUCCESS(f'Drained {drained} camera events'))
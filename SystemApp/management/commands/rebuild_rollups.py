@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from SystemApp.models import DailyActivity, RevenueLedger
+import datetime
+
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the daily activity rollups and revenue ledger from the parking logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customer', type=int, help='Only rebuild the rollups of this customer id')
+        parser.add_argument('--since', type=datetime.date.fromisoformat, help='Only rebuild dates from YYYY-MM-DD onwards')
+        parser.add_argument('--chunk-days', type=int, default=31, help='Number of days aggregated per query')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = DailyActivity.rebuild(customer_id=options['customer'], since=options['since'], chunk_days=options['chunk_days'])
+            ledgers = RevenueLedger.rebuild(customer_id=options['customer'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} daily activity rows and {ledgers} revenue ledgers'))
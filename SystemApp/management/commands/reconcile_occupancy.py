@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from SystemApp.models import Occupancy
+
+
+class Command(BaseCommand):
+    help = 'Repair drift between the live occupancy counters and the parked tickets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customer', type=int, help='Only reconcile the counters of this customer id')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = Occupancy.reconcile(customer_id=options['customer'])
+        for (customer_id, gate_id), (counted, actual) in sorted(drift.items(), key=str):
+            self.stdout.write(f'Customer {customer_id} gate {gate_id or "-"}: counted {counted}, parked {actual}')
+        self.stdout.write(self.style.SUCCESS(f'Repaired {len(drift)} occupancy counters'))
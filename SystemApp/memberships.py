@@ -0,0 +1,91 @@
+"""
+Per-customer index of subscribed plates.
+
+A customer's subscriptions that have not yet expired are kept in the shared
+cache as the validity ranges of each normalized plate, so entry and checkout
+can tell whether a plate is subscribed without a query. The index is stamped
+with a version token replaced whenever a subscription is saved or deleted,
+and with the day it was built on: the first lookup of a new day rebuilds it,
+dropping the subscriptions that ended. Each process keeps the last index it
+read until the token or the day changes.
+
+The token only reaches the processes that share the cache, which the
+default LocMemCache does not. Indexes are therefore also rebuilt once they
+are SUBSCRIPTION_INDEX_TTL seconds old, so with a per-process cache another
+worker sees a changed subscription after that long at most.
+"""
+from django.conf import settings
+from django.core.cache import caches
+import datetime
+import time
+
+from . import caching
+from .models import Subscriptions, normalize_plate
+
+INDEX_TTL = getattr(settings, 'SUBSCRIPTION_INDEX_TTL', 60)
+
+_indexes = {}
+
+
+class Index:
+    """Validity ranges (start_date, end_date, subscription_id) of each normalized plate."""
+    __slots__ = ('day', 'plates')
+
+    def __init__(self, subscriptions, day):
+        self.day = day
+        self.plates = {}
+        for subscription_id, plate_number, start_date, end_date in subscriptions:
+            self.plates.setdefault(normalize_plate(plate_number), []).append((start_date, end_date, subscription_id))
+
+    def lookup(self, plate_number, day=None):
+        """Id of the subscription of `plate_number` valid on `day` that ends last, None when there is none."""
+        day = self.day if day is None else day
+        valid = [(end_date, subscription_id) for start_date, end_date, subscription_id in self.plates.get(normalize_plate(plate_number), ())
+                 if start_date <= day <= end_date]
+        return max(valid)[1] if valid else None
+
+
+def _cache():
+    return caches[caching.CACHE_ALIAS]
+
+
+def version(customer_id):
+    cache = _cache()
+    key = f'subscriptions:{customer_id}:version'
+    current = cache.get(key)
+    if current is None:
+        cache.add(key, time.time_ns(), None)
+        current = cache.get(key)
+    return current
+
+
+def invalidate(customer_id):
+    """Make every process rebuild the index of a customer."""
+    _cache().set(f'subscriptions:{customer_id}:version', time.time_ns(), None)
+    _indexes.pop(customer_id, None)
+
+
+def build(customer_id, day):
+    subscriptions = Subscriptions.objects.filter(customer_id=customer_id, end_date__gte=day).order_by()
+    return Index(subscriptions.values_list('subscription_id', 'plate_number', 'start_date', 'end_date'), day)
+
+
+def index(customer_id):
+    """Index of a customer's subscriptions for today, from this process, the shared cache or the database."""
+    current, today = version(customer_id), datetime.date.today()
+    cached = _indexes.get(customer_id)
+    if cached is not None and cached[0] == current and cached[2].day == today and time.monotonic() - cached[1] <= INDEX_TTL:
+        return cached[2]
+    key = f'subscriptions:{customer_id}:{current}'
+    shared = _cache().get(key)
+    if shared is None or shared.day != today:
+        shared = build(customer_id, today)
+        #Indexes of replaced versions expire on their own
+        _cache().set(key, shared, INDEX_TTL)
+    _indexes[customer_id] = (current, time.monotonic(), shared)
+    return shared
+
+
+def lookup(customer_id, plate_number):
+    """Id of the subscription covering `plate_number` today, None when it is not subscribed."""
+    return index(customer_id).lookup(plate_number)
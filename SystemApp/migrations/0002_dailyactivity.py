@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SystemApp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('activity_id', models.BigAutoField(db_column='ActivityId', primary_key=True, serialize=False)),
+                ('date', models.DateField(db_column='Date')),
+                ('payment_method', models.CharField(blank=True, db_column='PaymentMethod', max_length=50, null=True)),
+                ('entries', models.BigIntegerField(db_column='Entries', default=0)),
+                ('exits', models.BigIntegerField(db_column='Exits', default=0)),
+                ('revenue', models.BigIntegerField(db_column='Revenue', default=0)),
+                ('amount_payed', models.BigIntegerField(db_column='AmountPayed', default=0)),
+                ('duration', models.BigIntegerField(db_column='Duration', default=0)),
+                ('customer_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='SystemApp.customers')),
+                ('gate', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='SystemApp.gates')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily activity',
+                'db_table': 'DailyActivity',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyactivity',
+            constraint=models.UniqueConstraint(fields=('customer_id', 'date', 'gate', 'payment_method'), name='daily_activity_key'),
+        ),
+    ]
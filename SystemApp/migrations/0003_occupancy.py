@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_parked(apps, schema_editor):
+    Parkinglog = apps.get_model('SystemApp', 'Parkinglog')
+    Occupancy = apps.get_model('SystemApp', 'Occupancy')
+    customers = {}
+    rows = []
+    for row in Parkinglog.objects.filter(parked=True).order_by().values('customer_id', 'entry_gate').annotate(total=models.Count('ticket_id')):
+        customers[row['customer_id']] = customers.get(row['customer_id'], 0) + row['total']
+        if row['entry_gate'] is not None:
+            rows.append(Occupancy(customer_id_id=row['customer_id'], gate_id=row['entry_gate'], parked=row['total']))
+    rows += [Occupancy(customer_id_id=customer_id, parked=total) for customer_id, total in customers.items()]
+    Occupancy.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SystemApp', '0002_dailyactivity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Occupancy',
+            fields=[
+                ('occupancy_id', models.BigAutoField(db_column='OccupancyId', primary_key=True, serialize=False)),
+                ('parked', models.BigIntegerField(db_column='Parked', default=0)),
+                ('customer_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='SystemApp.customers')),
+                ('gate', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='SystemApp.gates')),
+            ],
+            options={
+                'verbose_name_plural': 'Occupancy',
+                'db_table': 'Occupancy',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='occupancy',
+            constraint=models.UniqueConstraint(fields=('customer_id', 'gate'), name='occupancy_gate'),
+        ),
+        migrations.AddConstraint(
+            model_name='occupancy',
+            constraint=models.UniqueConstraint(condition=models.Q(('gate__isnull', True)), fields=('customer_id',), name='occupancy_customer'),
+        ),
+        migrations.RunPython(count_parked, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def total_revenue(apps, schema_editor):
+    Parkinglog = apps.get_model('SystemApp', 'Parkinglog')
+    RevenueLedger = apps.get_model('SystemApp', 'RevenueLedger')
+    totals = Parkinglog.objects.exclude(parked=True).order_by().values('customer_id').annotate(
+        tickets=models.Count('ticket_id'), revenue=models.Sum('cost'), amount_payed=models.Sum('amount_payed'))
+    RevenueLedger.objects.bulk_create([
+        RevenueLedger(customer_id_id=row['customer_id'], tickets=row['tickets'], revenue=row['revenue'] or 0, amount_payed=row['amount_payed'] or 0)
+        for row in totals
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SystemApp', '0003_occupancy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueLedger',
+            fields=[
+                ('ledger_id', models.BigAutoField(db_column='LedgerId', primary_key=True, serialize=False)),
+                ('tickets', models.BigIntegerField(db_column='Tickets', default=0)),
+                ('revenue', models.BigIntegerField(db_column='Revenue', default=0)),
+                ('amount_payed', models.BigIntegerField(db_column='AmountPayed', default=0)),
+                ('customer_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='SystemApp.customers')),
+            ],
+            options={
+                'verbose_name_plural': 'Revenue ledger',
+                'db_table': 'RevenueLedger',
+            },
+        ),
+        migrations.RunPython(total_revenue, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SystemApp', '0004_revenueledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parkinglog',
+            index=models.Index(fields=['customer_id', '-checkin_time'], name='parkinglog_checkin'),
+        ),
+        migrations.AddIndex(
+            model_name='parkinglog',
+            index=models.Index(condition=models.Q(('parked', True)), fields=['customer_id', '-checkin_time'], name='parkinglog_parked'),
+        ),
+        migrations.AddIndex(
+            model_name='parkinglog',
+            index=models.Index(fields=['customer_id', 'date'], name='parkinglog_date'),
+        ),
+        migrations.AddIndex(
+            model_name='parkinglog',
+            index=models.Index(fields=['customer_id', 'plate_number', 'parked'], name='parkinglog_plate'),
+        ),
+        migrations.AddIndex(
+            model_name='parkinglog',
+            index=models.Index(fields=['customer_id', 'payment_method', 'date'], name='parkinglog_payment'),
+        ),
+        migrations.AddIndex(
+            model_name='parkinglog',
+            index=models.Index(fields=['customer_id', 'checkout_time'], name='parkinglog_checkout'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SystemApp', '0006_plate_search'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='parkinglog',
+            name='parkinglog_date',
+        ),
+        migrations.AddIndex(
+            model_name='parkinglog',
+            index=models.Index(fields=['customer_id', 'date', 'checkout_time', 'checkin_time', 'exit_gate', 'amount_payed'], name='parkinglog_date'),
+        ),
+    ]
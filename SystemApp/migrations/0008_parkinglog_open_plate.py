@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SystemApp', '0007_parkinglog_date_covering'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parkinglog',
+            index=models.Index(condition=models.Q(('parked', True)), fields=['customer_id', 'plate_normalized', '-checkin_time'], name='parkinglog_open_plate'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SystemApp', '0008_parkinglog_open_plate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkinglog',
+            name='entry_event',
+            field=models.CharField(blank=True, db_column='EntryEventId', editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='parkinglog',
+            name='exit_event',
+            field=models.CharField(blank=True, db_column='ExitEventId', editable=False, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='parkinglog',
+            constraint=models.UniqueConstraint(fields=('customer_id', 'entry_event'), name='parkinglog_entry_event'),
+        ),
+        migrations.AddConstraint(
+            model_name='parkinglog',
+            constraint=models.UniqueConstraint(fields=('customer_id', 'exit_event'), name='parkinglog_exit_event'),
+        ),
+    ]
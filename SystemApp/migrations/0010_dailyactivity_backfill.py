@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:12
+
+from django.db import migrations, models
+
+
+def rebuild_activity(apps, schema_editor):
+    """
+    Recompute the daily rollups from the parking logs: 0002 created the table
+    empty, and rows written since may have been duplicated by concurrent
+    first writes the unique constraint could not catch.
+    """
+    Parkinglog = apps.get_model('SystemApp', 'Parkinglog')
+    DailyActivity = apps.get_model('SystemApp', 'DailyActivity')
+    DailyActivity.objects.all().delete()
+    logs = Parkinglog.objects.order_by()
+    rows = {}
+    for entry in logs.values('customer_id', 'date', 'entry_gate').annotate(count=models.Count('ticket_id')):
+        rows.setdefault((entry['customer_id'], entry['date'], entry['entry_gate'], None), {})['entries'] = entry['count']
+    for checkout in logs.exclude(parked=True).values('customer_id', 'date', 'exit_gate', 'payment_method').annotate(
+            count=models.Count('ticket_id'), revenue=models.Sum('cost'), amount_payed=models.Sum('amount_payed'), duration=models.Sum('duration')):
+        rows.setdefault((checkout['customer_id'], checkout['date'], checkout['exit_gate'], checkout['payment_method']), {}).update(
+            exits=checkout['count'], revenue=checkout['revenue'] or 0, amount_payed=checkout['amount_payed'] or 0, duration=checkout['duration'] or 0)
+    DailyActivity.objects.bulk_create([
+        DailyActivity(customer_id_id=customer, date=date, gate_id=gate, payment_method=payment_method, **totals)
+        for (customer, date, gate, payment_method), totals in rows.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SystemApp', '0009_parkinglog_event_ids'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_activity, migrations.RunPython.noop),
+    ]
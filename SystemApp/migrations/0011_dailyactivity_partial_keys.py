@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SystemApp', '0010_dailyactivity_backfill'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='dailyactivity',
+            constraint=models.UniqueConstraint(condition=models.Q(('gate__isnull', True)), fields=('customer_id', 'date', 'payment_method'), name='daily_activity_no_gate'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyactivity',
+            constraint=models.UniqueConstraint(condition=models.Q(('payment_method__isnull', True)), fields=('customer_id', 'date', 'gate'), name='daily_activity_no_payment'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyactivity',
+            constraint=models.UniqueConstraint(condition=models.Q(('gate__isnull', True), ('payment_method__isnull', True)), fields=('customer_id', 'date'), name='daily_activity_entries'),
+        ),
+    ]
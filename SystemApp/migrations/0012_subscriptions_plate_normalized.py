@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+def normalize_plates(apps, schema_editor):
+    Subscriptions = apps.get_model('SystemApp', 'Subscriptions')
+    subscriptions = [Subscriptions(subscription_id=subscription_id, plate_normalized=''.join(char for char in (plate_number or '').upper() if char.isalnum()))
+                     for subscription_id, plate_number in Subscriptions.objects.order_by().values_list('subscription_id', 'plate_number').iterator()]
+    Subscriptions.objects.bulk_update(subscriptions, ['plate_normalized'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SystemApp', '0011_dailyactivity_partial_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptions',
+            name='plate_normalized',
+            field=models.CharField(db_column='PlateNormalized', default='', editable=False, max_length=50),
+        ),
+        migrations.RunPython(normalize_plates, migrations.RunPython.noop),
+    ]
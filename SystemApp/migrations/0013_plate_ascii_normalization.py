@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:40
+
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+
+def normalize(plate_number):
+    return ''.join(char for char in (plate_number or '') if char.isascii() and char.isalnum()).upper()
+
+
+def normalize_plates(apps, schema_editor):
+    #Plates were normalized keeping any letter or digit, non-ASCII ones included
+    for name in ('Parkinglog', 'Subscriptions'):
+        model = apps.get_model('SystemApp', name)
+        plates = [(plate_number, normalize(plate_number)) for plate_number in model.objects.order_by().values_list('plate_number', flat=True).distinct().iterator()]
+        for start in range(0, len(plates), 500):
+            batch = plates[start:start + 500]
+            model.objects.filter(plate_number__in=[plate_number for plate_number, plate in batch]).update(
+                plate_normalized=Case(*[When(plate_number=plate_number, then=Value(plate)) for plate_number, plate in batch], output_field=models.CharField()))
+
+
+def index_plates(apps, schema_editor):
+    #Tickets saved outside of the camera and manual entry paths never had their plate indexed
+    Parkinglog = apps.get_model('SystemApp', 'Parkinglog')
+    PlateTrigram = apps.get_model('SystemApp', 'PlateTrigram')
+    PlateTrigram.objects.all().delete()
+    rows = []
+    for customer_id, plate in Parkinglog.objects.order_by().values_list('customer_id', 'plate_normalized').distinct().iterator():
+        if plate:
+            rows += [PlateTrigram(customer_id_id=customer_id, trigram=plate[n:n + 3], plate=plate) for n in range(max(len(plate) - 2, 1))]
+        if len(rows) >= 10000:
+            PlateTrigram.objects.bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    PlateTrigram.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SystemApp', '0012_subscriptions_plate_normalized'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_plates, migrations.RunPython.noop),
+        migrations.RunPython(index_plates, migrations.RunPython.noop),
+    ]
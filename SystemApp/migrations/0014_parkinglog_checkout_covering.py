@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SystemApp', '0013_plate_ascii_normalization'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='parkinglog',
+            name='parkinglog_date',
+        ),
+        migrations.AddIndex(
+            model_name='parkinglog',
+            index=models.Index(fields=['customer_id', 'date'], name='parkinglog_date'),
+        ),
+        migrations.RemoveIndex(
+            model_name='parkinglog',
+            name='parkinglog_checkout',
+        ),
+        migrations.AddIndex(
+            model_name='parkinglog',
+            index=models.Index(fields=['customer_id', 'checkout_time', 'checkin_time', 'exit_gate', 'amount_payed'], name='parkinglog_checkout'),
+        ),
+    ]
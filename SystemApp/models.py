@@ -1,7 +1,8 @@
 from django.contrib.auth.models import AbstractUser, User
 from django.contrib.auth.hashers import make_password
-from django.db import models
-from django.db.models import Count, Avg, Sum, Max, Min
+from django.db import models, transaction
+from django.db.models import Count, Avg, Sum, Max, Min, F
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.utils import IntegrityError
@@ -60,11 +61,7 @@ class Customers(models.Model):
 
     @property
     def revenue_total(self):
-        revenue = Parkinglog.objects.filter(customer_id=self.customer_id).aggregate(Sum('cost'))['cost__sum']
-        if revenue is None:
-            return 0
-        else:
-            return "{:,.0f}".format(revenue)
+        return "{:,.0f}".format(RevenueLedger.lifetime(self.customer_id)['revenue'])
 
     @property
     def revenue_this_week(self):
@@ -76,20 +73,12 @@ class Customers(models.Model):
 
     @property
     def cars_parked(self):
-        return Parkinglog.objects.filter(customer_id=self.customer_id, parked=True).count()
+        return Occupancy.current(self.customer_id)
 
     @property
     def payements_summary(self):
-        payements = []
-        for account in list(Parkinglog.objects.filter(customer_id=self.customer_id).order_by().values('payment_method').distinct()):
-            account_summary = {'name': account['payment_method']}
-            account_summary['count'] = Parkinglog.objects.filter(customer_id=self.customer_id, payment_method=account['payment_method']).count()
-            try:
-                account_summary['sum'] = "{:,.0f}".format(sum([int(payment.amount_payed) for payment in Parkinglog.objects.filter(customer_id=self.customer_id, payment_method=account['payment_method'])]))
-            except TypeError:
-                account_summary['sum'] = 0
-            payements.append(account_summary)
-        return payements
+        from .statistics import payment_summary
+        return payment_summary(self.customer_id)
     
 
 class Users(AbstractUser):
@@ -171,7 +160,7 @@ class Users(AbstractUser):
 
     @property
     def total_entries_today(self):
-        return Parkinglog.objects.filter(checkin_user = self.user_id, date_created__date=datetime.date.today()).count()
+        return Parkinglog.objects.filter(checkin_user = self.user_id, date=datetime.date.today()).count()
 
     
     @property
@@ -188,17 +177,17 @@ class Users(AbstractUser):
         if sales is None:
             return 0
         else:
-            return 0
+            return sales
 
     @property
     def todays_sales(self):
         today_datetime = datetime.datetime.now()
         today_date_unix = datetime.datetime(today_datetime.year, today_datetime.month, today_datetime.day).timestamp()
-        sales =  Parkinglog.objects.filter(checkin_user = self.user_id, checkout_time__gte = today_date_unix).aggregate(Sum('cost'))['cost__sum']
+        sales =  Parkinglog.objects.filter(checkout_user = self.user_id, checkout_time__gte = today_date_unix).aggregate(Sum('amount_payed'))['amount_payed__sum']
         if sales is None:
             return 0
         else:
-            return 0
+            return sales
 
     @property
     def format_date_joined(self):
@@ -289,19 +278,8 @@ class Tarrif(models.Model):
 
     @classmethod
     def match_tarrif(self, customer_id, end_time:int,start_time: int):
-        duration = int((end_time - start_time)/60)
-        try:
-            cost =  self.objects.filter(customer_id=customer_id, from_time__lte=duration, to_time__gte=duration)
-            if cost: 
-                if len(cost) > 1:
-                    return int(cost.first().cost), [{'message': 'Multiple tarrifs found for this duration. Consider deleting some overlapping tarrifs', 'type':'warning'},]
-                else:
-                    return int(cost[0].cost), None
-            else:
-                return 0, [{'message': 'No tarrif found for this duration. Please consider adding one', 'type':'error'},]
-
-        except AttributeError:
-            return 0, [{'message': 'No tarrif found for this duration.', 'type':'error'},]
+        from .tariffs import quote
+        return quote(customer_id, end_time, start_time)
 
 
     @classmethod
@@ -328,6 +306,7 @@ class Subscriptions(models.Model):
     date = models.DateField(db_column='Date', default=timezone.now())
     subscription_id = models.BigAutoField(db_column='SubscriptionId', primary_key=True)  
     plate_number = models.CharField(db_column='PlateNumber', max_length=50)  
+    plate_normalized = models.CharField(db_column='PlateNormalized', max_length=50, default='', editable=False)
     start_date = models.DateField(db_column='start')  
     end_date = models.DateField(db_column='end')  
     amount = models.FloatField(db_column='SubscriptionAmount')  
@@ -343,6 +322,10 @@ class Subscriptions(models.Model):
     def __str__(self):
         return self.customer_id.company_name + ' ' + self.plate_number
 
+    def save(self, *args, **kwargs):
+        self.plate_normalized = normalize_plate(self.plate_number)
+        super().save(*args, **kwargs)
+
     @classmethod
     def add_subscription(self, user_id, customer_id, platenum, name, phonenum, office, parklot, amount, start_date, end_date):
         self.objects.create(
@@ -364,12 +347,10 @@ class Subscriptions(models.Model):
 
     @classmethod
     def is_subscribed(self, customer_id, plate_number):
-        try:
-            return self.objects.get(customer_id = customer_id, plate_number=plate_number, end_date__gte=datetime.datetime.now())
-        except self.DoesNotExist:
-            return None
-        except self.MultipleObjectsReturned:
-            return self.objects.filter(customer_id = customer_id, plate_number=plate_number, end_date__gte=datetime.datetime.now()).first()
+        from .memberships import lookup
+        #Plates without a subscription are answered from the index alone
+        subscription_id = lookup(customer_id, plate_number)
+        return self.objects.filter(subscription_id=subscription_id).first() if subscription_id is not None else None
 
     @property
     def format_end_date(self):
@@ -396,6 +377,7 @@ class Parkinglog(models.Model):
     customer_id = models.ForeignKey(Customers, on_delete=models.CASCADE)
     date = models.DateField(db_column='Date', default=timezone.now())  
     plate_number = models.CharField(db_column='PlateNum', max_length=50)  
+    plate_normalized = models.CharField(db_column='PlateNormalized', max_length=50, default='', editable=False)
     entry_gate = models.ForeignKey(Gates, related_name='entry_gate', on_delete=models.CASCADE, blank=True, null=True)  
     checkin_method = models.CharField(db_column='CheckInMethod', max_length=10, default='Manual')
     checkin_time = models.BigIntegerField(db_column='CheckinTime')  
@@ -410,31 +392,49 @@ class Parkinglog(models.Model):
     checkout_method = models.CharField(db_column='CheckoutMethod', max_length=10, blank=True, null=True)
     payment_method = models.CharField(db_column='PaymentMethod', max_length=50, blank=True, null=True)
     checkout_user = models.ForeignKey(Users, related_name='checkout_user', on_delete=models.CASCADE, blank=True, null=True)
+    #event_id of the camera events that opened and closed the ticket, see SystemApp.dedupe
+    entry_event = models.CharField(db_column='EntryEventId', max_length=64, blank=True, null=True, editable=False)
+    exit_event = models.CharField(db_column='ExitEventId', max_length=64, blank=True, null=True, editable=False)
 
     class Meta:
         db_table = 'ParkingLog'
         verbose_name_plural = "Parking logs"
         ordering = ('-checkin_time',)
+        #Every listing and lookup is scoped to one customer, so customer_id leads each index
+        indexes = [
+            models.Index(fields=['customer_id', '-checkin_time'], name='parkinglog_checkin'),
+            models.Index(fields=['customer_id', '-checkin_time'], name='parkinglog_parked', condition=models.Q(parked=True)),
+            models.Index(fields=['customer_id', 'date'], name='parkinglog_date'),
+            models.Index(fields=['customer_id', 'plate_number', 'parked'], name='parkinglog_plate'),
+            models.Index(fields=['customer_id', 'payment_method', 'date'], name='parkinglog_payment'),
+            #Also covers what the tariff simulation reads of the tickets closed in a window. A checkout rewrites
+            #this entry for its checkout_time anyway, so the extra columns cost no additional index write
+            models.Index(fields=['customer_id', 'checkout_time', 'checkin_time', 'exit_gate', 'amount_payed'], name='parkinglog_checkout'),
+            models.Index(fields=['customer_id', 'plate_normalized'], name='parkinglog_plate_search'),
+            #The open ticket of a plate leaving through a gate
+            models.Index(fields=['customer_id', 'plate_normalized', '-checkin_time'], name='parkinglog_open_plate', condition=models.Q(parked=True)),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['customer_id', 'entry_event'], name='parkinglog_entry_event'),
+            models.UniqueConstraint(fields=['customer_id', 'exit_event'], name='parkinglog_exit_event'),
+        ]
+
+    def save(self, *args, **kwargs):
+        plate = normalize_plate(self.plate_number)
+        #A checkout saves the plate the ticket was loaded with, already indexed
+        indexed = not self._state.adding and plate == self.plate_normalized
+        self.plate_normalized = plate
+        super().save(*args, **kwargs)
+        if not indexed:
+            PlateTrigram.record(self)
 
     
 
     
     @classmethod
-    def close(ticket_id, checkin_time, checkout_time, checkout_method, checkout_user, exit_gate, amount_payed, payment_method, *subscription):
-        checkin_unix_time = datetime.datetime.strptime(checkin_time, '%m/%d/%Y %H:%M')
-        checkout_unix_time = datetime.datetime.strptime(checkout_time, '%m/%d/%Y %H:%M')
-        Parkinglog.objects.filter(ticket_id=ticket_id).update(
-            checkin_time = checkin_unix_time.timestamp(),
-            checkout_time = checkout_unix_time.timestamp(),
-            checkout_method = checkout_method,
-            checkout_user = Users.objects.get(user_id=checkout_user),
-            exit_gate = Gates.objects.get(gate_id=exit_gate),
-            cost = Tarrif.match_tarrif((checkout_unix_time - checkin_unix_time).seconds/60),
-            duration = (checkout_unix_time - checkin_unix_time).seconds,
-            amount_payed = int(amount_payed),
-            payment_method = payment_method,
-            parked = False
-        )
+    def close(self, customer_id, exit_gate, plate_number, checkout_time, amount_payed=None, payment_method=None):
+        from .ingestion import close_ticket
+        return close_ticket(customer_id, exit_gate, plate_number, checkout_time, amount_payed, payment_method)
 
     @classmethod
     def delete(self, ticket_id):
@@ -500,14 +500,16 @@ class Parkinglog(models.Model):
 
     @property
     def total_revenue(self):
-        revenue = 0
-        for log in self.objects.all():
-            revenue += log.amount_payed
-        return revenue
+        #Tariff revenue like Customers.revenue_total, what was actually paid is total_amount_payed
+        return RevenueLedger.lifetime(self.customer_id_id)['revenue']
+
+    @property
+    def total_amount_payed(self):
+        return RevenueLedger.lifetime(self.customer_id_id)['amount_payed']
     
     @property
     def total_parked(self):
-        return Parkinglog.objects.filter(parked=True).count()
+        return Occupancy.current(self.customer_id_id)
 
     @property
     def is_subscribed(self):
@@ -517,6 +519,330 @@ class Parkinglog(models.Model):
             return False
 
 
+def normalize_plate(plate_number):
+    """Plate number as it is searched: upper case ASCII letters and digits only, 'rab 123-c' is 'RAB123C'."""
+    return ''.join(char for char in (plate_number or '') if char.isascii() and char.isalnum()).upper()
+
+
+def increment(model, key, deltas):
+    """Add `deltas` to the row of `model` matching `key`, creating it on first use."""
+    rows = model.objects.filter(**key)
+    if not rows.update(**{field: F(field) + value for field, value in deltas.items()}):
+        try:
+            with transaction.atomic():
+                model.objects.create(**key, **deltas)
+        except IntegrityError:
+            #Created concurrently by another request
+            rows.update(**{field: F(field) + value for field, value in deltas.items()})
+
+
+class DailyActivity(models.Model):
+    """
+    Daily rollup of parking activity per customer, date, gate and payment method.
+    Entries are counted on the entry gate; exits, revenue, amount payed and
+    duration on the exit gate and payment method of the ticket. Rows are keyed
+    by the ticket date so they add up to the same figures as the raw logs.
+    """
+    activity_id = models.BigAutoField(db_column='ActivityId', primary_key=True)
+    customer_id = models.ForeignKey(Customers, on_delete=models.CASCADE)
+    date = models.DateField(db_column='Date')
+    gate = models.ForeignKey(Gates, on_delete=models.CASCADE, blank=True, null=True)
+    payment_method = models.CharField(db_column='PaymentMethod', max_length=50, blank=True, null=True)
+    entries = models.BigIntegerField(db_column='Entries', default=0)
+    exits = models.BigIntegerField(db_column='Exits', default=0)
+    revenue = models.BigIntegerField(db_column='Revenue', default=0)
+    amount_payed = models.BigIntegerField(db_column='AmountPayed', default=0)
+    duration = models.BigIntegerField(db_column='Duration', default=0)
+
+    class Meta:
+        db_table = 'DailyActivity'
+        verbose_name_plural = "Daily activity"
+        #NULLs are distinct in a unique constraint, so each combination of a missing gate and payment method gets its own
+        constraints = [
+            models.UniqueConstraint(fields=['customer_id', 'date', 'gate', 'payment_method'], name='daily_activity_key'),
+            models.UniqueConstraint(fields=['customer_id', 'date', 'payment_method'], condition=models.Q(gate__isnull=True), name='daily_activity_no_gate'),
+            models.UniqueConstraint(fields=['customer_id', 'date', 'gate'], condition=models.Q(payment_method__isnull=True), name='daily_activity_no_payment'),
+            models.UniqueConstraint(fields=['customer_id', 'date'], condition=models.Q(gate__isnull=True, payment_method__isnull=True), name='daily_activity_entries'),
+        ]
+
+    @classmethod
+    def record(self, customer_id, date, gate_id=None, payment_method=None, **deltas):
+        date = Parkinglog._meta.get_field('date').to_python(date)
+        increment(self, {'customer_id_id': customer_id, 'date': date, 'gate_id': gate_id, 'payment_method': payment_method}, deltas)
+
+    @classmethod
+    def record_entry(self, ticket, sign=1):
+        self.record(ticket.customer_id_id, ticket.date, ticket.entry_gate_id, entries=sign)
+
+    @classmethod
+    def record_exit(self, ticket, sign=1):
+        self.record(ticket.customer_id_id, ticket.date, ticket.exit_gate_id, ticket.payment_method,
+                    exits = sign,
+                    revenue = sign * (ticket.cost or 0),
+                    amount_payed = sign * (ticket.amount_payed or 0),
+                    duration = sign * (ticket.duration or 0))
+
+    @classmethod
+    def forget(self, ticket):
+        self.record_entry(ticket, sign=-1)
+        if not ticket.parked:
+            self.record_exit(ticket, sign=-1)
+
+    @classmethod
+    def rebuild(self, customer_id=None, since=None, chunk_days=31):
+        """
+        Recompute the rollups from the parking logs, `chunk_days` dates at a
+        time so memory stays bounded on long histories.
+        """
+        logs = Parkinglog.objects.order_by()
+        if customer_id is not None:
+            logs = logs.filter(customer_id=customer_id)
+        bounds = logs.aggregate(first=Min('date'), last=Max('date'))
+        if bounds['first'] is None:
+            return 0
+        start = max(bounds['first'], since) if since else bounds['first']
+        rollups = self.objects.filter(date__gte=start)
+        if customer_id is not None:
+            rollups = rollups.filter(customer_id=customer_id)
+        rollups.delete()
+
+        created = 0
+        while start <= bounds['last']:
+            end = start + datetime.timedelta(days=chunk_days)
+            chunk = logs.filter(date__gte=start, date__lt=end)
+            rows = {}
+            for entry in chunk.values('customer_id', 'date', 'entry_gate').annotate(count=Count('ticket_id')):
+                key = (entry['customer_id'], entry['date'], entry['entry_gate'], None)
+                rows.setdefault(key, {})['entries'] = entry['count']
+            for checkout in chunk.exclude(parked=True).values('customer_id', 'date', 'exit_gate', 'payment_method').annotate(
+                    count = Count('ticket_id'), revenue = Sum('cost'), amount_payed = Sum('amount_payed'), duration = Sum('duration')):
+                key = (checkout['customer_id'], checkout['date'], checkout['exit_gate'], checkout['payment_method'])
+                rows.setdefault(key, {}).update(exits = checkout['count'], revenue = checkout['revenue'] or 0, amount_payed = checkout['amount_payed'] or 0, duration = checkout['duration'] or 0)
+            self.objects.bulk_create([
+                self(customer_id_id=customer, date=date, gate_id=gate, payment_method=payment_method, **totals)
+                for (customer, date, gate, payment_method), totals in rows.items()
+            ], batch_size=1000)
+            created += len(rows)
+            start = end
+        return created
+
+
+class Occupancy(models.Model):
+    """
+    Live number of parked cars of a customer (gate is null) and per entry gate,
+    kept up to date as tickets open and close so reading it is a single row
+    lookup instead of a count over the parking logs.
+    """
+    occupancy_id = models.BigAutoField(db_column='OccupancyId', primary_key=True)
+    customer_id = models.ForeignKey(Customers, on_delete=models.CASCADE)
+    gate = models.ForeignKey(Gates, on_delete=models.CASCADE, blank=True, null=True)
+    parked = models.BigIntegerField(db_column='Parked', default=0)
+
+    class Meta:
+        db_table = 'Occupancy'
+        verbose_name_plural = "Occupancy"
+        constraints = [
+            models.UniqueConstraint(fields=['customer_id', 'gate'], name='occupancy_gate'),
+            models.UniqueConstraint(fields=['customer_id'], condition=models.Q(gate__isnull=True), name='occupancy_customer'),
+        ]
+
+    @classmethod
+    def adjust(self, customer_id, gate_id, delta):
+        gates = [None, gate_id] if gate_id else [None]
+        rows = self.objects.filter(customer_id=customer_id).filter(models.Q(gate__isnull=True) | models.Q(gate=gate_id))
+        if rows.update(parked=F('parked') + delta) < len(gates):
+            existing = set(rows.values_list('gate', flat=True))
+            for gate in gates:
+                if gate not in existing:
+                    increment(self, {'customer_id_id': customer_id, 'gate_id': gate}, {'parked': delta})
+
+    @classmethod
+    def record_entry(self, ticket, sign=1):
+        self.adjust(ticket.customer_id_id, ticket.entry_gate_id, sign)
+
+    @classmethod
+    def record_exit(self, ticket):
+        self.adjust(ticket.customer_id_id, ticket.entry_gate_id, -1)
+
+    @classmethod
+    def current(self, customer_id, gate_id=None):
+        return self.objects.filter(customer_id=customer_id, gate=gate_id).values_list('parked', flat=True).first() or 0
+
+    @classmethod
+    def reconcile(self, customer_id=None):
+        """
+        Reset the counters to the parked tickets and return the drift found as
+        {(customer_id, gate_id): (counted, actual)}.
+        """
+        logs = Parkinglog.objects.filter(parked=True).order_by()
+        counters = self.objects.all()
+        if customer_id is not None:
+            logs = logs.filter(customer_id=customer_id)
+            counters = counters.filter(customer_id=customer_id)
+        actual = {}
+        for row in logs.values('customer_id', 'entry_gate').annotate(total=Count('ticket_id')):
+            actual[(row['customer_id'], None)] = actual.get((row['customer_id'], None), 0) + row['total']
+            if row['entry_gate'] is not None:
+                actual[(row['customer_id'], row['entry_gate'])] = row['total']
+        counted = {(row.customer_id_id, row.gate_id): row for row in counters}
+
+        drift = {}
+        for key in counted.keys() | actual.keys():
+            row = counted.get(key)
+            if row is None:
+                self.objects.create(customer_id_id=key[0], gate_id=key[1], parked=actual[key])
+                drift[key] = (0, actual[key])
+            elif row.parked != actual.get(key, 0):
+                drift[key] = (row.parked, actual.get(key, 0))
+                self.objects.filter(pk=row.pk).update(parked=actual.get(key, 0))
+        return drift
+
+
+class RevenueLedger(models.Model):
+    """
+    Lifetime running totals of a customer's closed tickets, maintained at
+    checkout so lifetime revenue never needs a scan of historical tickets.
+    Period figures come from the daily activity rollups.
+    """
+    ledger_id = models.BigAutoField(db_column='LedgerId', primary_key=True)
+    customer_id = models.OneToOneField(Customers, on_delete=models.CASCADE)
+    tickets = models.BigIntegerField(db_column='Tickets', default=0)
+    revenue = models.BigIntegerField(db_column='Revenue', default=0)
+    amount_payed = models.BigIntegerField(db_column='AmountPayed', default=0)
+
+    class Meta:
+        db_table = 'RevenueLedger'
+        verbose_name_plural = "Revenue ledger"
+
+    @classmethod
+    def record(self, ticket, sign=1):
+        increment(self, {'customer_id_id': ticket.customer_id_id}, {
+            'tickets': sign,
+            'revenue': sign * (ticket.cost or 0),
+            'amount_payed': sign * (ticket.amount_payed or 0),
+        })
+
+    @classmethod
+    def lifetime(self, customer_id):
+        totals = self.objects.filter(customer_id=customer_id).values('tickets', 'revenue', 'amount_payed').first()
+        return totals or {'tickets': 0, 'revenue': 0, 'amount_payed': 0}
+
+    @classmethod
+    def period(self, customer_id, date_from=None, date_to=None):
+        rollups = DailyActivity.objects.filter(customer_id=customer_id)
+        if date_from is not None:
+            rollups = rollups.filter(date__gte=date_from)
+        if date_to is not None:
+            rollups = rollups.filter(date__lte=date_to)
+        return rollups.aggregate(tickets=Coalesce(Sum('exits'), 0), revenue=Coalesce(Sum('revenue'), 0), amount_payed=Coalesce(Sum('amount_payed'), 0))
+
+    @classmethod
+    def running_totals(self, customer_id, date_from, date_to=None):
+        """
+        [(date, revenue, cumulative revenue)] for every date from `date_from`
+        to `date_to` (today by default). The cumulative figures are worked back
+        from the lifetime total, so only the rollups of the range are read.
+        """
+        date_to = date_to or datetime.date.today()
+        daily = dict(DailyActivity.objects.filter(customer_id=customer_id, date__gte=date_from).order_by().values('date').annotate(
+            total=Sum('revenue')).values_list('date', 'total'))
+        cumulative = self.lifetime(customer_id)['revenue'] - sum(total for date, total in daily.items() if date > date_to)
+        totals = []
+        date = date_to
+        while date >= date_from:
+            totals.append((date, daily.get(date, 0), cumulative))
+            cumulative -= daily.get(date, 0)
+            date -= datetime.timedelta(days=1)
+        return totals[::-1]
+
+    @classmethod
+    def rebuild(self, customer_id=None):
+        logs = Parkinglog.objects.exclude(parked=True).order_by()
+        ledgers = self.objects.all()
+        if customer_id is not None:
+            logs = logs.filter(customer_id=customer_id)
+            ledgers = ledgers.filter(customer_id=customer_id)
+        ledgers.delete()
+        rows = [self(customer_id_id=row['customer_id'], tickets=row['tickets'], revenue=row['revenue'] or 0, amount_payed=row['amount_payed'] or 0)
+                for row in logs.values('customer_id').annotate(tickets=Count('ticket_id'), revenue=Sum('cost'), amount_payed=Sum('amount_payed'))]
+        self.objects.bulk_create(rows)
+        return len(rows)
+
+
+PLATE_CHARACTERS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+class PlateTrigram(models.Model):
+    """
+    Every three-character fragment of the normalized plates a customer has
+    seen, so a partial plate is matched against the distinct plates through an
+    index instead of a substring scan over the tickets. Plates shorter than
+    three characters are stored whole. Parkinglog.save records the plate of
+    a ticket, bulk writes record theirs with record_many.
+    """
+    trigram_id = models.BigAutoField(db_column='TrigramId', primary_key=True)
+    customer_id = models.ForeignKey(Customers, on_delete=models.CASCADE)
+    trigram = models.CharField(db_column='Trigram', max_length=3)
+    plate = models.CharField(db_column='Plate', max_length=50)
+
+    class Meta:
+        db_table = 'PlateTrigram'
+        verbose_name_plural = "Plate trigrams"
+        constraints = [
+            models.UniqueConstraint(fields=['customer_id', 'trigram', 'plate'], name='plate_trigram_key'),
+        ]
+
+    @classmethod
+    def trigrams(self, plate):
+        return sorted({plate[n:n + 3] for n in range(max(len(plate) - 2, 1))}) if plate else []
+
+    @classmethod
+    def record(self, ticket):
+        plate = ticket.plate_normalized or normalize_plate(ticket.plate_number)
+        trigrams = self.trigrams(plate)
+        if not trigrams or self.objects.filter(customer_id=ticket.customer_id_id, trigram=trigrams[0], plate=plate).exists():
+            return
+        self.objects.bulk_create([self(customer_id_id=ticket.customer_id_id, trigram=trigram, plate=plate) for trigram in trigrams], ignore_conflicts=True)
+
+    @classmethod
+    def record_many(self, tickets):
+        """Record the plates of `tickets` in a single insert, plates already seen are skipped by the unique constraint."""
+        plates = {(ticket.customer_id_id, ticket.plate_normalized or normalize_plate(ticket.plate_number)) for ticket in tickets}
+        self.objects.bulk_create([self(customer_id_id=customer, trigram=trigram, plate=plate) for customer, plate in sorted(plates) for trigram in self.trigrams(plate)],
+                                 ignore_conflicts=True, batch_size=1000)
+
+    @classmethod
+    def matching(self, customer_id, fragment):
+        """Distinct normalized plates of a customer containing `fragment`, as a subquery."""
+        fragment = normalize_plate(fragment)
+        plates = self.objects.filter(customer_id=customer_id).order_by()
+        if len(fragment) == 2:
+            #Every trigram holding a two-character fragment, plus the fragment as a whole short plate
+            trigrams = [fragment] + [fragment + char for char in PLATE_CHARACTERS] + [char + fragment for char in PLATE_CHARACTERS]
+            return plates.filter(trigram__in=trigrams).values('plate').distinct()
+        if len(fragment) < 3:
+            return plates.filter(plate__contains=fragment).values('plate').distinct()
+        trigrams = self.trigrams(fragment)
+        return plates.filter(trigram__in=trigrams).values('plate').annotate(found=Count('trigram_id')).filter(
+            found=len(trigrams), plate__contains=fragment).values('plate')
+
+    @classmethod
+    def rebuild(self, customer_id=None):
+        logs = Parkinglog.objects.order_by()
+        trigrams = self.objects.all()
+        if customer_id is not None:
+            logs = logs.filter(customer_id=customer_id)
+            trigrams = trigrams.filter(customer_id=customer_id)
+        trigrams.delete()
+        rows = []
+        for customer, plate in logs.values_list('customer_id', 'plate_normalized').distinct().iterator():
+            rows += [self(customer_id_id=customer, trigram=trigram, plate=plate) for trigram in self.trigrams(plate)]
+            if len(rows) >= 10000:
+                self.objects.bulk_create(rows, ignore_conflicts=True)
+                rows = []
+        self.objects.bulk_create(rows, ignore_conflicts=True)
+
+
 def delete_customer(customer_id):
     Parkinglog.objects.filter(customer_id=customer_id).delete()
     Gates.objects.filter(customer_id=customer_id).delete()
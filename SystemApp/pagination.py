@@ -0,0 +1,97 @@
+"""
+Keyset (cursor) pagination of a customer's parking history.
+
+A page is read by seeking past the last row of the previous page on an
+indexed sort key plus the ticket id, instead of counting OFFSET rows, so every
+page costs one index range scan whatever its position in the history.
+"""
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+import base64
+import datetime
+import json
+
+from .models import DailyActivity, Parkinglog
+
+#Sort keys served by the Parkinglog indexes, see migration 0005
+HISTORY_ORDERINGS = ('checkin_time', 'date', 'plate_number')
+HISTORY_PAGE_SIZE = 25
+HISTORY_MAX_PAGE_SIZE = 500
+#Type of the sort key in a cursor, dates as their ISO format
+CURSOR_TYPES = {'checkin_time': int, 'date': str, 'plate_number': str}
+HISTORY_FIELDS = ('ticket_id', 'date', 'plate_number', 'entry_gate__name', 'checkin_time', 'checkout_time',
+                  'exit_gate__name', 'duration', 'cost', 'amount_payed', 'payment_method', 'subscription')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(order, descending, row):
+    value = row[order]
+    if isinstance(value, datetime.date):
+        value = value.isoformat()
+    key = json.dumps([order, descending, value, row['ticket_id']])
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_cursor(cursor, order, descending):
+    """(value, ticket_id) of the row a cursor points at, for the given sort."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor('Malformed cursor')
+    if not isinstance(key, list) or len(key) != 4:
+        raise InvalidCursor('Malformed cursor')
+    cursor_order, cursor_descending, value, ticket_id = key
+    if (cursor_order, cursor_descending) != (order, descending):
+        raise InvalidCursor('The cursor belongs to another sort order')
+    #Exact types, as a bool is an int, and the range of the integer columns
+    if type(value) is not CURSOR_TYPES[order] or type(ticket_id) is not int or not all(-2**63 <= number < 2**63 for number in (ticket_id, value) if type(number) is int):
+        raise InvalidCursor('Malformed cursor')
+    if order == 'date':
+        try:
+            value = datetime.date.fromisoformat(value)
+        except ValueError:
+            raise InvalidCursor('Malformed cursor')
+    return value, ticket_id
+
+
+def history_page(customer_id, order='checkin_time', descending=True, after=None, size=HISTORY_PAGE_SIZE, logs=None):
+    """
+    One page of a customer's parking logs, or of the queryset `logs`, sorted
+    on `order` and starting after the row of the cursor `after`. Returns the
+    rows and the cursor of the next page, None on the last page.
+    """
+    if order not in HISTORY_ORDERINGS:
+        raise ValueError(f'Cannot sort the history on {order}')
+    size = max(1, min(size, HISTORY_MAX_PAGE_SIZE))
+    prefix = '-' if descending else ''
+    if logs is None:
+        logs = Parkinglog.objects.filter(customer_id=customer_id)
+    if after is not None:
+        value, ticket_id = decode_cursor(after, order, descending)
+        beyond = 'lt' if descending else 'gt'
+        #The redundant inclusive bound lets the database seek into the index instead of filtering every row. It
+        #goes ahead of the search filters as SQLite seeks on the first bound it meets for a column
+        seek = Parkinglog.objects.filter(**{f'{order}__{beyond}e': value}).filter(Q(**{f'{order}__{beyond}': value}) | Q(**{f'ticket_id__{beyond}': ticket_id}))
+        logs = seek & logs
+    logs = logs.order_by(prefix + order, prefix + 'ticket_id')
+    rows = list(logs.values(*HISTORY_FIELDS)[:size + 1])
+    cursor = encode_cursor(order, descending, rows[size - 1]) if len(rows) > size else None
+    return rows[:size], cursor
+
+
+def iterate_history(customer_id, order='checkin_time', descending=False, logs=None):
+    """Every row of `logs` one page query at a time, so no read stays open for a whole export."""
+    cursor = None
+    while True:
+        rows, cursor = history_page(customer_id, order, descending, after=cursor, size=HISTORY_MAX_PAGE_SIZE, logs=logs)
+        yield from rows
+        if cursor is None:
+            return
+
+
+def history_estimate(customer_id):
+    """Number of parking logs of a customer, read from the daily rollups instead of counting tickets."""
+    return DailyActivity.objects.filter(customer_id=customer_id).aggregate(total=Coalesce(Sum('entries'), 0))['total']
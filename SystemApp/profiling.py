@@ -0,0 +1,181 @@
+"""
+Sampled per-request SQL profiling.
+
+SQLProfileMiddleware watches a random share of the requests, given by the
+SQL_PROFILE_SAMPLE_RATE setting, and records their queries through a
+connection execute wrapper. The wrapper stays on every connection and finds
+the log of the sampled request in a context variable, which follows the
+request into the threads its ORM calls run in under ASGI. The numbers are
+aggregated in process per view name: requests, queries, SQL and response
+time, the slowest statements and statements repeated within a request (N+1
+patterns), keyed by a fingerprint of the SQL. Queries a streamed response
+runs after the view returns are not counted. A batch of camera events
+written for several coroutines runs its queries once, and they are
+attributed to the request that started the batch. With a rate of 0 the
+middleware removes itself at startup and requests that are not sampled
+only cost a random draw.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+import contextvars
+import random
+import re
+import threading
+import time
+
+SLOWEST = 5
+DUPLICATES = 10
+#Fingerprints kept per view before the rarest are dropped
+MAX_FINGERPRINTS = 200
+
+_lock = threading.Lock()
+_views = {}
+_log = contextvars.ContextVar('sql_profile_log', default=None)
+
+
+def fingerprint(sql):
+    """`sql` with literals and the length of IN lists taken out."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)', '(...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class QueryLog:
+    """Execute wrapper timing the statements of one request."""
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.statements.append((sql, (time.perf_counter() - started) * 1000))
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    log = _log.get()
+    if log is None:
+        return execute(sql, params, many, context)
+    return log(execute, sql, params, many, context)
+
+
+def watch(connection, **kwargs):
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def watch_connections():
+    """Wrap the connections of this thread, the ones opened later are wrapped on connection_created."""
+    for connection in connections.all():
+        watch(connection)
+
+
+def record(view, statements, milliseconds):
+    """Add one request of `view` and its `statements` (sql, ms) to the report."""
+    counts = {}
+    for sql, duration in statements:
+        key = fingerprint(sql)
+        counts[key] = counts.get(key, 0) + 1
+    with _lock:
+        stats = _views.setdefault(view, {'requests': 0, 'queries': 0, 'sql_ms': 0.0, 'total_ms': 0.0, 'max_queries': 0, 'slowest': [], 'duplicates': {}})
+        stats['requests'] += 1
+        stats['queries'] += len(statements)
+        stats['sql_ms'] += sum(duration for sql, duration in statements)
+        stats['total_ms'] += milliseconds
+        stats['max_queries'] = max(stats['max_queries'], len(statements))
+        stats['slowest'] = sorted(stats['slowest'] + [(duration, sql) for sql, duration in statements], reverse=True)[:SLOWEST]
+        duplicates = stats['duplicates']
+        for key, count in counts.items():
+            if count > 1:
+                #Requests repeating the statement and the executions beyond the first
+                entry = duplicates.setdefault(key, [0, 0])
+                entry[0] += 1
+                entry[1] += count - 1
+        if len(duplicates) > MAX_FINGERPRINTS:
+            for key in sorted(duplicates, key=lambda key: duplicates[key][1])[:len(duplicates) - MAX_FINGERPRINTS]:
+                del duplicates[key]
+
+
+def report():
+    """Aggregated views, the ones spending the most time in SQL first."""
+    with _lock:
+        views = [(view, dict(stats, slowest=list(stats['slowest']), duplicates=dict(stats['duplicates']))) for view, stats in _views.items()]
+    rows = []
+    for view, stats in views:
+        requests = stats['requests']
+        rows.append({
+            'view': view,
+            'requests': requests,
+            'queries': stats['queries'],
+            'avg_queries': stats['queries'] / requests,
+            'max_queries': stats['max_queries'],
+            'sql_ms': stats['sql_ms'],
+            'avg_sql_ms': stats['sql_ms'] / requests,
+            'avg_total_ms': stats['total_ms'] / requests,
+            'slowest': [{'sql': sql, 'ms': duration} for duration, sql in stats['slowest']],
+            'duplicates': [{'fingerprint': key, 'requests': seen, 'repeats': repeats}
+                           for key, (seen, repeats) in sorted(stats['duplicates'].items(), key=lambda item: -item[1][1])[:DUPLICATES]],
+        })
+    return sorted(rows, key=lambda row: -row['sql_ms'])
+
+
+def sample_rate():
+    return getattr(settings, 'SQL_PROFILE_SAMPLE_RATE', 0)
+
+
+def reset():
+    with _lock:
+        _views.clear()
+
+
+class SQLProfileMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rate = sample_rate()
+        if not self.rate:
+            raise MiddlewareNotUsed()
+        connection_created.connect(watch)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= self.rate:
+            return self.get_response(request)
+        watch_connections()
+        log, started = QueryLog(), time.perf_counter()
+        token = _log.set(log)
+        try:
+            response = self.get_response(request)
+        finally:
+            _log.reset(token)
+        self.finish(request, log, started)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.rate:
+            return await self.get_response(request)
+        #The thread the request's ORM calls run in, not the event loop's
+        await sync_to_async(watch_connections)()
+        log, started = QueryLog(), time.perf_counter()
+        token = _log.set(log)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _log.reset(token)
+        self.finish(request, log, started)
+        return response
+
+    def finish(self, request, log, started):
+        match = request.resolver_match
+        record(match.view_name if match else '<unresolved>', log.statements, (time.perf_counter() - started) * 1000)
@@ -0,0 +1,105 @@
+"""
+Advanced history search: one parser for the filters accepted by the history
+endpoints and the queryset they translate to.
+
+Every filter maps onto an indexed access path of Parkinglog. Plate prefixes
+are a range over the normalized plate, and plate fragments are matched on
+the PlateTrigram index of distinct plates first.
+"""
+from dataclasses import dataclass
+from django.db.models import Q
+from django.utils import timezone
+import datetime
+
+from .ingestion import MAX_INTEGER, MAX_TIME
+from .models import Parkinglog, PlateTrigram, normalize_plate
+
+BOOLEANS = {'true': True, '1': True, 'yes': True, 'false': False, '0': False, 'no': False}
+
+
+class InvalidSearch(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class HistoryFilters:
+    """Filters of a history search. Times are unix timestamps, bounds are inclusive from and exclusive to."""
+    checkin_from: int = None
+    checkin_to: int = None
+    checkout_from: int = None
+    checkout_to: int = None
+    plate: str = ''
+    plate_contains: str = ''
+    gate: int = None
+    payment_method: str = None
+    parked: bool = None
+
+    def __bool__(self):
+        return self != HistoryFilters()
+
+
+def parse_time(value, name):
+    """A unix timestamp or a local ISO date/datetime such as 2022-02-10T08:30, within the times events can have."""
+    try:
+        moment = float(value)
+    except ValueError:
+        try:
+            moment = datetime.datetime.fromisoformat(value)
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            moment = moment.timestamp()
+        except (ValueError, OverflowError):
+            raise InvalidSearch(f'{name} must be a unix time or an ISO date time')
+    #Infinite and NaN timestamps fail this check too
+    if not 0 <= moment <= MAX_TIME:
+        raise InvalidSearch(f'{name} must be a time between 1970 and the year 10000')
+    return int(moment)
+
+
+def parse_filters(params):
+    """HistoryFilters from request parameters, ignoring empty ones."""
+    values = {name: params.get(name, '').strip() for name in HistoryFilters.__dataclass_fields__}
+    filters = {}
+    for name in ('checkin_from', 'checkin_to', 'checkout_from', 'checkout_to'):
+        if values[name]:
+            filters[name] = parse_time(values[name], name)
+    for name in ('plate', 'plate_contains'):
+        filters[name] = normalize_plate(values[name])
+    if values['gate']:
+        if not values['gate'].isdigit() or int(values['gate']) > MAX_INTEGER:
+            raise InvalidSearch('gate must be a gate id')
+        filters['gate'] = int(values['gate'])
+    if values['payment_method']:
+        filters['payment_method'] = values['payment_method']
+    if values['parked']:
+        if values['parked'].lower() not in BOOLEANS:
+            raise InvalidSearch('parked must be true or false')
+        filters['parked'] = BOOLEANS[values['parked'].lower()]
+    return HistoryFilters(**filters)
+
+
+def plate_prefix(prefix):
+    """Range lookups matching normalized plates starting with `prefix`, usable on a plain index."""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return {'plate_normalized__gte': prefix, 'plate_normalized__lt': upper}
+
+
+def search_logs(customer_id, filters):
+    """Parking logs of a customer matching `filters`."""
+    logs = Parkinglog.objects.filter(customer_id=customer_id)
+    for name, lookup in (('checkin_from', 'checkin_time__gte'), ('checkin_to', 'checkin_time__lt'),
+                         ('checkout_from', 'checkout_time__gte'), ('checkout_to', 'checkout_time__lt'),
+                         ('payment_method', 'payment_method')):
+        if getattr(filters, name) is not None:
+            logs = logs.filter(**{lookup: getattr(filters, name)})
+    if filters.plate:
+        logs = logs.filter(**plate_prefix(filters.plate))
+    if filters.plate_contains:
+        logs = logs.filter(plate_normalized__in=PlateTrigram.matching(customer_id, filters.plate_contains))
+    if filters.gate is not None:
+        logs = logs.filter(Q(entry_gate=filters.gate) | Q(exit_gate=filters.gate))
+    if filters.parked is True:
+        logs = logs.filter(parked=True)
+    elif filters.parked is False:
+        logs = logs.exclude(parked=True)
+    return logs
@@ -0,0 +1,38 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from . import caching
+from . import memberships
+from . import tariffs
+from .models import Customers, Parkinglog, Gates, Subscriptions, Tarrif
+
+
+@receiver(post_save, sender=Parkinglog)
+@receiver(post_delete, sender=Parkinglog)
+@receiver(post_save, sender=Gates)
+@receiver(post_delete, sender=Gates)
+@receiver(post_save, sender=Subscriptions)
+@receiver(post_delete, sender=Subscriptions)
+@receiver(post_save, sender=Tarrif)
+@receiver(post_delete, sender=Tarrif)
+def invalidate_customer_cache(sender, instance, **kwargs):
+    caching.invalidate_on_commit(instance.customer_id_id)
+
+
+@receiver(post_save, sender=Tarrif)
+@receiver(post_delete, sender=Tarrif)
+def invalidate_tariff_schedule(sender, instance, **kwargs):
+    caching.invalidate_on_commit(instance.customer_id_id, tariffs.invalidate)
+
+
+@receiver(post_save, sender=Subscriptions)
+@receiver(post_delete, sender=Subscriptions)
+def invalidate_subscription_index(sender, instance, **kwargs):
+    caching.invalidate_on_commit(instance.customer_id_id, memberships.invalidate)
+
+
+@receiver(post_save, sender=Customers)
+def reset_customer_indexes(sender, instance, created, **kwargs):
+    #A new customer may reuse the id of a deleted one, whose schedule and index are still cached
+    if created:
+        caching.invalidate_on_commit(instance.customer_id, tariffs.invalidate)
+        caching.invalidate_on_commit(instance.customer_id, memberships.invalidate)
@@ -0,0 +1,104 @@
+"""
+What-if revenue of a proposed tariff table over historical tickets.
+
+The tickets closed in a window are found through the parkinglog_checkout
+index and read into NumPy arrays straight from the database cursor. They
+are re-priced with `searchsorted` over the proposed interval boundaries and
+compared with what was actually paid, per day of checkout, per exit gate
+and per duration bucket.
+"""
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+import datetime
+import numpy
+
+from . import tariffs
+from .models import Gates, Parkinglog
+
+#Upper bounds in minutes of the duration buckets of a simulation
+DURATION_BUCKETS = (30, 60, 120, 180, 360, 720, 1440)
+TICKET_FIELDS = [('checkout', 'i8'), ('gate', 'i8'), ('duration', 'i8'), ('payed', 'f8')]
+
+
+def bucket_labels():
+    bounds = (0,) + DURATION_BUCKETS
+    labels = [f'{low}-{high} min' for low, high in zip(bounds, bounds[1:])]
+    return labels + [f'over {DURATION_BUCKETS[-1]} min']
+
+
+def midnights(start, end):
+    """Timestamps of the local midnights from the date `start` to the day after `end`."""
+    zone = timezone.get_current_timezone()
+    return numpy.array([int(timezone.make_aware(datetime.datetime.combine(start + datetime.timedelta(days=day), datetime.time()), zone).timestamp())
+                        for day in range((end - start).days + 2)], dtype=numpy.int64)
+
+
+def load_tickets(customer_id, start, end):
+    """
+    Checkout time, exit gate, duration in minutes and amount payed of the
+    tickets closed between the dates `start` and `end`, as arrays.
+    """
+    bounds = midnights(start, end)
+    tickets = (Parkinglog.objects.filter(customer_id=customer_id, checkout_time__gte=int(bounds[0]), checkout_time__lt=int(bounds[-1])).order_by()
+               .values_list('checkout_time', Coalesce('exit_gate', 0), F('checkout_time') - F('checkin_time'), Coalesce('amount_payed', 0)))
+    sql, params = tickets.query.sql_with_params()
+    with connection.cursor() as cursor:
+        #Rows go from the cursor straight into one array, the ORM would build and convert a tuple per ticket
+        cursor.execute(sql, params)
+        rows = numpy.fromiter(cursor, dtype=TICKET_FIELDS)
+    return rows['checkout'], rows['gate'], rows['duration'] // 60, rows['payed']
+
+
+def price(proposal, minutes):
+    """Costs of `minutes` under the (from_time, to_time, cost) `proposal`, NaN where no tariff applies."""
+    schedule = tariffs.Schedule(proposal)
+    starts, ends, costs = (numpy.array(values, dtype=numpy.float64) for values in (schedule.starts, schedule.ends, schedule.costs))
+    index = numpy.searchsorted(starts, minutes, side='right') - 1
+    clipped = numpy.clip(index, 0, None)
+    priced = (index >= 0) & (minutes <= ends[clipped]) if len(starts) else numpy.zeros(len(minutes), dtype=bool)
+    return numpy.where(priced, costs[clipped] if len(costs) else 0, numpy.nan)
+
+
+def totals(keys, size, projected, actual):
+    """Tickets, projected and actual revenue per key in range(size)."""
+    return (numpy.bincount(keys, minlength=size), numpy.bincount(keys, weights=projected, minlength=size),
+            numpy.bincount(keys, weights=actual, minlength=size))
+
+
+def breakdown(labels, counts, projected, actual):
+    return [{'key': label, 'tickets': int(count), 'projected': float(new), 'actual': float(old), 'difference': float(new - old)}
+            for label, count, new, old in zip(labels, counts, projected, actual) if count]
+
+
+def simulate(customer_id, proposal, start, end):
+    """
+    Revenue of the tickets closed from `start` to `end` (dates) under the
+    (from_time, to_time, cost) tariffs of `proposal`, against what they paid.
+    Raises tariffs.InvalidTariff when the proposal overlaps or has gaps.
+    """
+    proposal = [(int(from_time), int(to_time), float(cost or 0)) for from_time, to_time, cost in proposal]
+    tariffs.check([(from_time, to_time) for from_time, to_time, cost in proposal])
+    checkouts, gates, minutes, actual = load_tickets(customer_id, start, end)
+    costs = price(proposal, minutes)
+    projected = numpy.nan_to_num(costs)
+
+    days = numpy.searchsorted(midnights(start, end), checkouts, side='right') - 1
+    day_count = (end - start).days + 1
+    gate_ids, gate_keys = numpy.unique(gates, return_inverse=True)
+    buckets = numpy.searchsorted(numpy.array(DURATION_BUCKETS), minutes, side='left')
+    names = dict(Gates.objects.filter(customer_id=customer_id, gate_id__in=[int(gate) for gate in gate_ids]).values_list('gate_id', 'name'))
+
+    return {
+        'start': start,
+        'end': end,
+        'tickets': len(minutes),
+        'unpriced': int(numpy.isnan(costs).sum()),
+        'projected': float(projected.sum()),
+        'actual': float(actual.sum()),
+        'difference': float(projected.sum() - actual.sum()),
+        'by_day': breakdown([start + datetime.timedelta(days=day) for day in range(day_count)], *totals(days, day_count, projected, actual)),
+        'by_gate': breakdown([names.get(int(gate), 'Unknown gate') for gate in gate_ids], *totals(gate_keys.ravel(), len(gate_ids), projected, actual)),
+        'by_duration': breakdown(bucket_labels(), *totals(buckets, len(DURATION_BUCKETS) + 1, projected, actual)),
+    }
@@ -0,0 +1,34 @@
+"""
+WhiteNoise middleware that also runs natively under ASGI.
+
+WhiteNoise's middleware is synchronous only, and a single synchronous
+middleware makes Django run every request of the ASGI application through a
+thread, async views included. This one serves static files the same way and
+hands every other request straight to the next coroutine. It relies on
+attributes WhiteNoise does not document (files, find_file, serve), which is
+why requirements.txt pins the WhiteNoise release it was tested with.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        static_file = self.find_file(request.path_info) if self.autorefresh else self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,215 @@
+from dataclasses import dataclass
+from django.db.models import Count, Sum, Q, F, OuterRef, Subquery, Case, When, ExpressionWrapper, FloatField, IntegerField, BigIntegerField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+import datetime
+
+from .models import DailyActivity, Gates, Parkinglog, Subscriptions, Users
+
+
+def format_amount(amount):
+    return "{:,.0f}".format(amount or 0)
+
+
+@dataclass(frozen=True)
+class DashboardStats:
+    """Headline KPIs of a customer, computed in a single aggregate query."""
+    cars_today: int = 0
+    cars_total: int = 0
+    cars_parked: int = 0
+    revenue_today: int = 0
+    revenue_this_week: int = 0
+    revenue_total: int = 0
+
+    @property
+    def format_revenue_today(self):
+        return format_amount(self.revenue_today)
+
+    @property
+    def format_revenue_this_week(self):
+        return format_amount(self.revenue_this_week)
+
+    @property
+    def format_revenue_total(self):
+        return format_amount(self.revenue_total)
+
+
+def dashboard_stats(customer_id, today=None):
+    """
+    Compute every dashboard KPI of a customer with one conditional aggregation
+    over its daily activity rollups, so the cost grows with days, not tickets.
+    """
+    today = today or datetime.date.today()
+    week_start = today - datetime.timedelta(days=7)
+    totals = DailyActivity.objects.filter(customer_id=customer_id).order_by().aggregate(
+        cars_today = Coalesce(Sum('entries', filter=Q(date=today)), 0),
+        cars_total = Coalesce(Sum('entries'), 0),
+        exits = Coalesce(Sum('exits'), 0),
+        revenue_today = Coalesce(Sum('revenue', filter=Q(date=today)), 0),
+        revenue_this_week = Coalesce(Sum('revenue', filter=Q(date__gte=week_start)), 0),
+        revenue_total = Coalesce(Sum('revenue'), 0),
+    )
+    totals['cars_parked'] = totals['cars_total'] - totals.pop('exits')
+    return DashboardStats(**totals)
+
+
+@dataclass(frozen=True)
+class PaymentSummary:
+    """Number of tickets and amount collected for one payment method."""
+    name: str
+    count: int
+    total: int
+
+    @property
+    def sum(self):
+        return format_amount(self.total)
+
+
+def payment_summary(customer_id, date_from=None, date_to=None, gate=None):
+    """
+    Tickets and amounts payed per payment method, read from the daily activity
+    rollups. `date_from`/`date_to` bound the ticket date (inclusive) and `gate`
+    limits the summary to tickets that left through that exit gate. Tickets
+    without a payment method yet are reported under None.
+    """
+    rollups = DailyActivity.objects.filter(customer_id=customer_id)
+    if date_from is not None:
+        rollups = rollups.filter(date__gte=date_from)
+    if date_to is not None:
+        rollups = rollups.filter(date__lte=date_to)
+    if gate is not None:
+        rollups = rollups.filter(gate=gate)
+    rows = list(rollups.order_by('payment_method').values('payment_method').annotate(
+        entries = Coalesce(Sum('entries'), 0),
+        exits = Coalesce(Sum('exits'), 0),
+        total = Coalesce(Sum('amount_payed'), 0),
+    ))
+    #Every ticket enters once, so whatever has no payment method yet is still unpaid
+    unpaid = sum(row['entries'] for row in rows) - sum(row['exits'] for row in rows if row['payment_method'] is not None)
+    summary = []
+    for row in rows:
+        count = row['exits']
+        if row['payment_method'] is None and gate is None:
+            count = unpaid
+        if count:
+            summary.append(PaymentSummary(name=row['payment_method'], count=count, total=row['total']))
+    return summary
+
+
+GATE_WINDOWS = {
+    'today': 0,
+    'week': 7,
+}
+
+
+def gate_statistics(customer_id, window=None, today=None):
+    """
+    Gates of a customer annotated with `entries`, `exits` and `ratio` (exits
+    per 100 entries) in a single query over the daily activity rollups.
+    `window` restricts the counts to tickets dated 'today', within the last
+    'week' or since a given date.
+    """
+    rollups = DailyActivity.objects.order_by()
+    if window in GATE_WINDOWS:
+        today = today or datetime.date.today()
+        rollups = rollups.filter(date__gte=today - datetime.timedelta(days=GATE_WINDOWS[window]))
+    elif isinstance(window, datetime.date):
+        rollups = rollups.filter(date__gte=window)
+
+    entries = rollups.filter(gate=OuterRef('pk')).values('gate').annotate(total=Sum('entries')).values('total')
+    exits = rollups.filter(gate=OuterRef('pk')).values('gate').annotate(total=Sum('exits')).values('total')
+    return Gates.objects.filter(customer_id=customer_id).order_by('gate_id').annotate(
+        entries = Coalesce(Subquery(entries, output_field=IntegerField()), 0),
+        exits = Coalesce(Subquery(exits, output_field=IntegerField()), 0),
+    ).annotate(
+        ratio = Case(
+            When(entries=0, then=0.0),
+            default=F('exits') * 100.0 / F('entries'),
+            output_field=FloatField(),
+        ),
+    )
+
+
+SERIES_BUCKETS = {
+    'hour': 3600,
+    'day': 86400,
+}
+#Bucket widths tried, in order, when a range holds more than SERIES_MAX_POINTS buckets
+SERIES_WIDTHS = (3600, 3 * 3600, 6 * 3600, 86400, 7 * 86400, 30 * 86400)
+SERIES_MAX_POINTS = 366
+
+
+def series_width(start, end, bucket=None, max_points=SERIES_MAX_POINTS):
+    """Width in seconds of the buckets used for [start, end), widened until it fits `max_points`."""
+    width = SERIES_BUCKETS.get(bucket, SERIES_WIDTHS[0])
+    for candidate in SERIES_WIDTHS:
+        if candidate >= width and (end - start) / candidate <= max_points:
+            return candidate
+    return SERIES_WIDTHS[-1]
+
+
+def activity_series(customer_id, start, end, bucket=None, max_points=SERIES_MAX_POINTS):
+    """
+    Entries, exits, occupancy and revenue of a customer per time bucket between
+    the unix times `start` and `end`. Tickets are bucketed in the database by
+    check-in time (entries) and checkout time (exits, revenue) in local time.
+    Empty buckets are zero-filled and large ranges fall back to wider buckets.
+    """
+    width = series_width(start, end, bucket, max_points)
+    offset = int(timezone.localtime(datetime.datetime.fromtimestamp(start, datetime.timezone.utc)).utcoffset().total_seconds())
+    logs = Parkinglog.objects.filter(customer_id=customer_id).order_by()
+
+    def bucketed(field):
+        return ExpressionWrapper((F(field) + offset) / width, output_field=BigIntegerField())
+
+    entries = dict(logs.filter(checkin_time__gte=start, checkin_time__lt=end).annotate(
+        bucket=bucketed('checkin_time')).values('bucket').annotate(total=Count('ticket_id')).values_list('bucket', 'total'))
+    exits = {row['bucket']: row for row in logs.filter(checkout_time__gte=start, checkout_time__lt=end).annotate(
+        bucket=bucketed('checkout_time')).values('bucket').annotate(total=Count('ticket_id'), revenue=Coalesce(Sum('cost'), 0))}
+    occupancy = logs.filter(checkin_time__lt=start).filter(Q(checkout_time__gte=start) | Q(checkout_time__isnull=True, parked=True)).count()
+
+    series = {'width': width, 'labels': [], 'entries': [], 'exits': [], 'occupancy': [], 'revenue': []}
+    for index in range((start + offset) // width, (end - 1 + offset) // width + 1):
+        checkout = exits.get(index, {})
+        occupancy += entries.get(index, 0) - checkout.get('total', 0)
+        series['labels'].append(timezone.localtime(datetime.datetime.fromtimestamp(max(index * width - offset, start), datetime.timezone.utc)).isoformat())
+        series['entries'].append(entries.get(index, 0))
+        series['exits'].append(checkout.get('total', 0))
+        series['occupancy'].append(occupancy)
+        series['revenue'].append(checkout.get('revenue', 0))
+    return series
+
+
+def _subquery_total(queryset, field, aggregate):
+    return Coalesce(Subquery(queryset.values(field).annotate(total=aggregate).values('total'), output_field=BigIntegerField()), 0)
+
+
+def cashier_statistics(customer_id, start=None, end=None, today=None):
+    """
+    Users of a customer annotated in one query with the tickets they opened
+    (`entries`, `entries_today`) and closed (`exits`), what they collected at
+    checkout (`sales`, `sales_today`) and the subscriptions they sold
+    (`subscriptions_sold`, `subscription_sales`). `start`/`end` are unix times
+    that restrict every figure except the *_today ones to a shift or date range.
+    """
+    today = today or datetime.date.today()
+    midnight = int(timezone.make_aware(datetime.datetime.combine(today, datetime.time())).timestamp())
+    logs = Parkinglog.objects.filter(customer_id=customer_id).order_by()
+    subscriptions = Subscriptions.objects.filter(customer_id=customer_id).order_by()
+    checkins, checkouts = logs, logs
+    if start is not None:
+        checkins, checkouts = checkins.filter(checkin_time__gte=start), checkouts.filter(checkout_time__gte=start)
+        subscriptions = subscriptions.filter(date__gte=timezone.localtime(datetime.datetime.fromtimestamp(start, datetime.timezone.utc)).date())
+    if end is not None:
+        checkins, checkouts = checkins.filter(checkin_time__lt=end), checkouts.filter(checkout_time__lt=end)
+        subscriptions = subscriptions.filter(date__lte=timezone.localtime(datetime.datetime.fromtimestamp(end, datetime.timezone.utc)).date())
+
+    return Users.objects.filter(customer_id=customer_id).order_by('user_id').annotate(
+        entries = _subquery_total(checkins.filter(checkin_user=OuterRef('pk')), 'checkin_user', Count('ticket_id')),
+        entries_today = _subquery_total(logs.filter(checkin_user=OuterRef('pk'), date=today), 'checkin_user', Count('ticket_id')),
+        exits = _subquery_total(checkouts.filter(checkout_user=OuterRef('pk')), 'checkout_user', Count('ticket_id')),
+        sales = _subquery_total(checkouts.filter(checkout_user=OuterRef('pk')), 'checkout_user', Sum('amount_payed')),
+        sales_today = _subquery_total(logs.filter(checkout_user=OuterRef('pk'), checkout_time__gte=midnight), 'checkout_user', Sum('amount_payed')),
+        subscriptions_sold = _subquery_total(subscriptions.filter(user=OuterRef('pk')), 'user', Count('subscription_id')),
+        subscription_sales = _subquery_total(subscriptions.filter(user=OuterRef('pk')), 'user', Sum('amount')),
+    )
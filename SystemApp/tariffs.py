@@ -0,0 +1,209 @@
+"""
+Compiled per-customer tariff schedules.
+
+A customer's tariffs are compiled into sorted, non-overlapping minute
+intervals and kept in process, so quoting a parking duration is a bisection
+over a few lists. Each schedule is stamped with a version token kept in the
+cache and replaced whenever a tariff is saved or deleted, which makes every
+process sharing that cache recompile on its next quote. The default
+LocMemCache is not shared between processes though, so a schedule is also
+recompiled once it is TARIFF_SCHEDULE_TTL seconds old: with a per-process
+cache, another worker quotes a changed tariff after that long at most.
+
+Intervals are inclusive and two tariffs may share their boundary minute,
+which is charged at the earlier one. Writes that would make tariffs overlap
+beyond that, or leave more minutes between two tariffs uncovered, are
+rejected, so tariffs saved before these checks can still be edited towards
+a clean schedule. Deleting a tariff may leave a gap, which is reported.
+"""
+from django.conf import settings
+from django.core.cache import caches
+import bisect
+import time
+
+from . import caching
+from . import memberships
+from .listings import format_elapsed
+from .models import Parkinglog, Tarrif
+
+NO_TARIFF = [{'message': 'No tarrif found for this duration. Please consider adding one', 'type': 'error'},]
+OVERLAPPING = [{'message': 'Multiple tarrifs found for this duration. Consider deleting some overlapping tarrifs', 'type': 'warning'},]
+
+SCHEDULE_TTL = getattr(settings, 'TARIFF_SCHEDULE_TTL', 60)
+
+_schedules = {}
+
+
+class InvalidTariff(ValueError):
+    pass
+
+
+class Schedule:
+    """Sorted tariff intervals of a customer, searched by bisection."""
+    __slots__ = ('starts', 'ends', 'costs', 'overlapping')
+
+    def __init__(self, tariffs):
+        self.starts, self.ends, self.costs = [], [], []
+        self.overlapping = False
+        for from_time, to_time, cost in sorted(tariffs):
+            if self.ends and from_time <= self.ends[-1]:
+                #Tariffs saved before overlaps were rejected keep only their uncovered part
+                self.overlapping = self.overlapping or from_time < self.ends[-1]
+                from_time = self.ends[-1] + 1
+            if from_time <= to_time:
+                self.starts.append(from_time)
+                self.ends.append(to_time)
+                self.costs.append(int(cost or 0))
+
+    def quote(self, minutes):
+        """Cost of parking `minutes` minutes and alerts about the schedule, like Tarrif.match_tarrif."""
+        index = bisect.bisect_right(self.starts, minutes) - 1
+        if index < 0 or minutes > self.ends[index]:
+            return 0, NO_TARIFF
+        return self.costs[index], OVERLAPPING if self.overlapping else None
+
+    def quote_many(self, minutes):
+        """
+        Costs of parking each of `minutes`, None where no tariff applies. The
+        durations are sorted and swept through the intervals in one pass.
+        """
+        costs = [None] * len(minutes)
+        index, count = 0, len(self.starts)
+        for position in sorted(range(len(minutes)), key=minutes.__getitem__):
+            value = minutes[position]
+            while index < count and self.ends[index] < value:
+                index += 1
+            if index < count and self.starts[index] <= value:
+                costs[position] = self.costs[index]
+        return costs
+
+
+def _cache():
+    return caches[caching.CACHE_ALIAS]
+
+
+def version(customer_id):
+    cache = _cache()
+    key = f'tariffs:{customer_id}:version'
+    current = cache.get(key)
+    if current is None:
+        #A fresh token when the version was evicted, so no process keeps a stale schedule
+        cache.add(key, time.time_ns(), None)
+        current = cache.get(key)
+    return current
+
+
+def invalidate(customer_id):
+    """Make every process recompile the schedule of a customer."""
+    _cache().set(f'tariffs:{customer_id}:version', time.time_ns(), None)
+    _schedules.pop(customer_id, None)
+
+
+def schedule(customer_id):
+    current = version(customer_id)
+    cached = _schedules.get(customer_id)
+    if cached is None or cached[0] != current or time.monotonic() - cached[1] > SCHEDULE_TTL:
+        cached = (current, time.monotonic(), Schedule(Tarrif.objects.filter(customer_id=customer_id).values_list('from_time', 'to_time', 'cost')))
+        _schedules[customer_id] = cached
+    return cached[2]
+
+
+def quote(customer_id, end_time, start_time):
+    """
+    Cost and alerts for parking from `start_time` to `end_time` (seconds).
+    Raises ValueError unless both are timestamps events can have.
+    """
+    from .ingestion import MAX_TIME
+    end_time, start_time = float(end_time), float(start_time)
+    #Infinite and NaN times fail this check too
+    if not (0 <= start_time <= MAX_TIME and 0 <= end_time <= MAX_TIME):
+        raise ValueError('Times must be timestamps before the year 10000')
+    return schedule(customer_id).quote(int((end_time - start_time) / 60))
+
+
+def quote_tickets(customer_id, ticket_ids=None, now=None):
+    """
+    Current cost, elapsed time and subscription status of a customer's parked
+    tickets, or of the tickets `ticket_ids`, with the alerts of the schedule.
+    Tickets are read in one query and the parked ones priced in one pass.
+    Closed tickets keep the cost and duration they were checked out with.
+    """
+    now = time.time() if now is None else now
+    tickets = Parkinglog.objects.filter(customer_id=customer_id)
+    tickets = tickets.filter(parked=True) if ticket_ids is None else tickets.filter(ticket_id__in=ticket_ids)
+    rows = list(tickets.order_by('-checkin_time').values('ticket_id', 'plate_number', 'checkin_time', 'checkout_time', 'parked', 'duration', 'cost', 'subscription'))
+    for row in rows:
+        if row['parked']:
+            row['elapsed'] = int(now - row['checkin_time'])
+        else:
+            row['elapsed'] = row['duration'] if row['duration'] is not None else int((row['checkout_time'] or now) - row['checkin_time'])
+    subscriptions = memberships.index(customer_id)
+    current = schedule(customer_id)
+    parked = [row for row in rows if row['parked']]
+    for row, cost in zip(parked, current.quote_many([int(row['elapsed'] / 60) for row in parked])):
+        row['cost'] = cost
+    quotes = [{
+        'ticket_id': row['ticket_id'],
+        'plate_number': row['plate_number'],
+        'parked': row['parked'],
+        'elapsed': row['elapsed'],
+        'format_elapsed': format_elapsed(row['elapsed']),
+        'cost': row['cost'] or 0,
+        'priced': row['cost'] is not None,
+        'subscribed': row['subscription'] is not None or subscriptions.lookup(row['plate_number']) is not None,
+    } for row in rows]
+    alerts = (OVERLAPPING if current.overlapping else []) + (NO_TARIFF if any(row['cost'] is None for row in parked) else [])
+    return quotes, alerts or None
+
+
+def coverage(intervals):
+    """
+    Overlaps and gaps of the (from_time, to_time) `intervals`, as lists of
+    (minutes, description). A boundary minute shared by two tariffs is no overlap.
+    """
+    overlaps, gaps = [], []
+    last = None
+    for from_time, to_time in sorted(intervals):
+        if last is not None:
+            if from_time < last[1]:
+                overlaps.append((min(to_time, last[1]) - from_time, f'Tarrifs {last[0]}-{last[1]} and {from_time}-{to_time} minutes overlap'))
+            elif from_time > last[1] + 1:
+                gaps.append((from_time - last[1] - 1, f'No tarrif would cover {last[1] + 1}-{from_time - 1} minutes'))
+        if last is None or to_time > last[1]:
+            last = (from_time, to_time)
+    return overlaps, gaps
+
+
+def check_bounds(from_time, to_time):
+    if from_time < 0 or to_time < from_time:
+        raise InvalidTariff(f'A tarrif must end after it starts, got {from_time} to {to_time} minutes')
+
+
+def check(intervals):
+    """Raise InvalidTariff unless the (from_time, to_time) `intervals` neither overlap nor leave gaps."""
+    for from_time, to_time in intervals:
+        check_bounds(from_time, to_time)
+    overlaps, gaps = coverage(intervals)
+    if overlaps or gaps:
+        raise InvalidTariff((overlaps + gaps)[0][1])
+
+
+def validate(customer_id, from_time, to_time, exclude=None):
+    """
+    Check a customer's tariffs once `exclude` is replaced with from_time-to_time:
+    the write must not add minutes charged twice or left uncovered.
+    """
+    check_bounds(from_time, to_time)
+    current = list(Tarrif.objects.filter(customer_id=customer_id).values_list('tarrif_id', 'from_time', 'to_time'))
+    before = coverage([(start, end) for tarrif_id, start, end in current])
+    after = coverage([(start, end) for tarrif_id, start, end in current if str(tarrif_id) != str(exclude)] + [(from_time, to_time)])
+    for previous, problems in zip(before, after):
+        if sum(minutes for minutes, description in problems) > sum(minutes for minutes, description in previous):
+            raise InvalidTariff(next(description for minutes, description in problems if (minutes, description) not in previous))
+
+
+def removal_alerts(customer_id, tarrif_id):
+    """Warnings about the minutes left uncovered once `tarrif_id` is deleted, None without any."""
+    remaining = Tarrif.objects.filter(customer_id=customer_id).exclude(tarrif_id=tarrif_id).values_list('from_time', 'to_time')
+    gaps = coverage(remaining)[1]
+    return [{'message': description, 'title': 'Tarrif deleted', 'type': 'warning'} for minutes, description in gaps] or None
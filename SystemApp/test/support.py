@@ -0,0 +1,162 @@
+"""
+Query and wall-time budgets for view tests.
+
+A suite subclasses QueryBudgetTestCase, points `urlconf` at a urls module and
+lists, for every named URL of it, the requests to make with the most queries
+and milliseconds each may take. Every request is made for a small and for a
+five times bigger tenant, so a view whose query count grows with the data
+(an N+1 pattern) fails on the bigger one even when it fits the budget on the
+small one. A URL added without a budget fails the suite as well, and so does
+a request not answered with a 2xx or 3xx status, or with the status its call
+expects.
+
+Wall time depends on the machine running the suite, so the milliseconds are
+only checked with the TIME_BUDGETS environment variable set, e.g.
+TIME_BUDGETS=1 python manage.py test. Query counts are always checked.
+"""
+from collections import namedtuple
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.urls import URLPattern, URLResolver
+import datetime
+import json
+import os
+import time
+
+from SystemApp import bookkeeping
+from SystemApp.models import *
+
+TIMED = os.environ.get('TIME_BUDGETS', '') not in ('', '0')
+
+#Most queries and milliseconds a request may take
+Budget = namedtuple('Budget', 'queries milliseconds')
+#A request made by the suite: method, path (formatted with the tenant's ids), data, its budget, whether data is sent as JSON
+#and the status it must be answered with, any 2xx or 3xx one when None
+Call = namedtuple('Call', 'method path data budget json status')
+
+
+def call(path, queries, milliseconds=500, method='get', data=None, json=False, status=None):
+    return Call(method, path, data or {}, Budget(queries, milliseconds), json, status)
+
+
+def fill(data, ids):
+    """`data` with the tenant's `ids` formatted into its strings, nested lists and dicts included."""
+    if isinstance(data, str):
+        return data.format(**ids)
+    if isinstance(data, dict):
+        return {key: fill(value, ids) for key, value in data.items()}
+    if isinstance(data, list):
+        return [fill(value, ids) for value in data]
+    return data
+
+
+class Tenant:
+    """
+    A seeded customer with its admin, cashiers, gates, tariffs, subscriptions
+    and tickets, all of them `scale` times as many for a bigger tenant.
+    """
+    def __init__(self, name, scale=1):
+        tickets, gates, cashiers, subscriptions = 20 * scale, 2 * scale, 2 * scale, 5 * scale
+        self.customer = Customers.objects.create(company_name=name, address='Kigali, Rwanda')
+        self.admin = Users.objects.create(customer_id=self.customer, email=f'admin@{name}.rw', mail_verified='True', role='Admin', is_staff=True)
+        self.cashiers = [Users.objects.create(customer_id=self.customer, email=f'cashier{n}@{name}.rw', mail_verified='True') for n in range(cashiers)]
+        self.gates = [Gates.objects.create(customer_id=self.customer, name=f'Gate {n}', status='Active') for n in range(gates)]
+        for from_time, to_time, cost in ((0, 60, 200), (60, 180, 500), (180, 1440, 1000)):
+            Tarrif.objects.create(customer_id=self.customer, from_time=from_time, to_time=to_time, cost=cost, datetime=datetime.datetime.now(datetime.timezone.utc))
+        for n in range(subscriptions):
+            Subscriptions.objects.create(customer_id=self.customer, user=self.admin, plate_number=f'RAS{n:03d}S', name=f'Subscriber {n}', phone_number='0788000000',
+                                         start_date=datetime.date.today(), end_date=datetime.date.today() + datetime.timedelta(days=30), amount=20000)
+        now = int(time.time())
+        self.tickets = []
+        for n in range(tickets):
+            parked = n % 5 == 0
+            checkin_time = now - 600 * (n + 1)
+            ticket = Parkinglog(customer_id=self.customer, date=datetime.date.today(), plate_number=f'RA{"BCDEFGH"[n % 7]}{n:03d}C', checkin_time=checkin_time,
+                                entry_gate=self.gates[n % gates], checkin_user=self.cashiers[n % cashiers], parked=parked)
+            ticket.save()
+            bookkeeping.ticket_opened(ticket)
+            if not parked:
+                ticket.checkout_time, ticket.duration = checkin_time + 300, 300
+                ticket.exit_gate, ticket.checkout_user = self.gates[(n + 1) % gates], self.cashiers[(n + 1) % cashiers]
+                ticket.cost = ticket.amount_payed = 200
+                ticket.payment_method, ticket.parked = 'Cash', False
+                ticket.save()
+                bookkeeping.ticket_closed(ticket, was_parked=True)
+            self.tickets.append(ticket)
+
+    @property
+    def ids(self):
+        """Values the paths of a Call are formatted with."""
+        return {'customer_id': self.customer.customer_id, 'user_id': self.cashiers[0].user_id, 'gate_id': self.gates[0].gate_id,
+                'ticket_id': self.tickets[0].ticket_id, 'parked_ticket_id': next(ticket.ticket_id for ticket in self.tickets if ticket.parked)}
+
+
+def url_names(patterns):
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= url_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+#Templates render without collected static files, new accounts hash their passwords quickly and camera events are journaled in memory
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage', PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+                   CAMERA_JOURNAL_PATH=':memory:')
+class QueryBudgetTestCase(TestCase):
+    urlconf = None
+    #URL name -> Calls made with a client logged in as the tenant's admin
+    budgets = {}
+
+    def setUp(self):
+        cache.clear()
+        self.small = Tenant('small')
+        self.large = Tenant('large', scale=5)
+
+    def request(self, tenant, call):
+        """Make `call` for `tenant`, returning its response, query count and milliseconds."""
+        client = Client()
+        client.force_login(tenant.admin)
+        data = fill(call.data, tenant.ids)
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            if call.json:
+                response = getattr(client, call.method)(call.path.format(**tenant.ids), json.dumps(data), content_type='application/json')
+            else:
+                response = getattr(client, call.method)(call.path.format(**tenant.ids), data)
+            #Streamed responses run their queries while the content is read
+            b''.join(response.streaming_content) if response.streaming else response.content
+            milliseconds = (time.perf_counter() - started) * 1000
+        return response, queries, milliseconds
+
+    def assertWithinBudget(self, name, call):
+        for tenant in (self.small, self.large):
+            cache.clear()
+            response, queries, milliseconds = self.request(tenant, call)
+            label = f'{call.method.upper()} {call.path} ({name}, {tenant.customer.company_name} tenant)'
+            if call.status is None:
+                self.assertTrue(200 <= response.status_code < 400, f'{label} answered {response.status_code}')
+            else:
+                self.assertEqual(response.status_code, call.status, label)
+            self.assertLessEqual(len(queries), call.budget.queries, f'{label} ran {len(queries)} queries:\n' + '\n'.join(queries))
+            if TIMED:
+                self.assertLessEqual(milliseconds, call.budget.milliseconds, f'{label} took {milliseconds:.0f}ms')
+
+    def test_every_url_has_a_budget(self):
+        if self.urlconf is None:
+            return
+        self.assertEqual(url_names(self.urlconf.urlpatterns) - set(self.budgets), set(), 'URLs without a query budget')
+
+    def test_query_budgets(self):
+        for name, calls in self.budgets.items():
+            for call in calls:
+                with self.subTest(name=name, path=call.path, method=call.method):
+                    self.assertWithinBudget(name, call)
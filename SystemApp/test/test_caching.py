@@ -0,0 +1,64 @@
+from django.test import TestCase, Client, override_settings
+from django.core.cache import cache
+from SystemApp.models import *
+from SystemApp import caching
+import tempfile
+
+
+class DashboardCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.other = Customers.objects.create(company_name='Makuza Peace Plaza', address='Downtown, Kigali, Rwanda')
+        self.calls = []
+
+    def compute(self, customer):
+        return lambda: self.calls.append(customer) or len(self.calls)
+
+    def test_hits_and_misses(self):
+        first = caching.get_or_set(self.customer.customer_id, 'context', self.compute(self.customer))
+        second = caching.get_or_set(self.customer.customer_id, 'context', self.compute(self.customer))
+
+        self.assertEqual((first, second), (1, 1))
+        self.assertEqual(caching.stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_writes_invalidate_only_their_customer(self):
+        caching.get_or_set(self.customer.customer_id, 'context', self.compute(self.customer))
+        caching.get_or_set(self.other.customer_id, 'context', self.compute(self.other))
+
+        gate = Gates.objects.create(customer_id=self.customer, name='Main', status='Active')
+        caching.get_or_set(self.customer.customer_id, 'context', self.compute(self.customer))
+        caching.get_or_set(self.other.customer_id, 'context', self.compute(self.other))
+        gate.delete()
+        caching.get_or_set(self.customer.customer_id, 'context', self.compute(self.customer))
+
+        self.assertEqual(self.calls, [self.customer, self.other, self.customer, self.customer])
+
+    def test_writes_invalidate_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Gates.objects.create(customer_id=self.customer, name='Main', status='Active')
+            #Read before the commit, as another request could
+            caching.get_or_set(self.customer.customer_id, 'context', self.compute(self.customer))
+        caching.get_or_set(self.customer.customer_id, 'context', self.compute(self.customer))
+
+        self.assertEqual(self.calls, [self.customer, self.customer])
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_unknown_gate_windows_share_an_entry(self):
+        client = Client()
+        client.force_login(Users.objects.create(customer_id=self.customer, email='admin@leapr.rw', mail_verified='True'))
+        for window in ('', 'today', 'forever', 'x' * 1000, 'today'):
+            self.assertEqual(client.get('/dashboard', {'gates': window} if window else {}).status_code, 200)
+
+        self.assertEqual(caching.stats()['misses'], 2)
+
+    def test_file_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}):
+                caching.get_or_set(self.customer.customer_id, 'context', self.compute(self.customer))
+                Parkinglog.objects.create(customer_id=self.customer, plate_number='RAB123C', checkin_time=1, parked=True)
+                caching.get_or_set(self.customer.customer_id, 'context', self.compute(self.customer))
+                caching.get_or_set(self.customer.customer_id, 'context', self.compute(self.customer))
+
+                self.assertEqual(len(self.calls), 2)
+                self.assertEqual(caching.stats()['hits'], 1)
@@ -0,0 +1,76 @@
+from django.test import TestCase, Client
+from unittest import mock
+from SystemApp.models import *
+from SystemApp import exports, pagination, search
+from xml.etree import ElementTree
+import csv
+import datetime
+import gzip
+import io
+import zipfile
+
+SHEET = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+def read_xlsx(content):
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+    return [[cell.findtext(f'{SHEET}v') or cell.findtext(f'.//{SHEET}t') for cell in row] for row in sheet.iter(f'{SHEET}row')]
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.other = Customers.objects.create(company_name='Makuza Peace Plaza', address='Downtown, Kigali, Rwanda')
+        self.gate = Gates.objects.create(customer_id=self.customer, name='Main & Side', status='Active')
+        self.user = Users.objects.create(customer_id=self.customer, email='cashier@leapr.rw', mail_verified='True')
+        for n in range(7):
+            Parkinglog.objects.create(customer_id=self.customer, date=datetime.date.today(), plate_number=f'RAB12{n}C', checkin_time=1000 + n,
+                                      entry_gate=self.gate, parked=n == 0, cost=None if n == 0 else 500, amount_payed=None if n == 0 else 500)
+        Parkinglog.objects.create(customer_id=self.other, date=datetime.date.today(), plate_number='RAB120C', checkin_time=1000, parked=True)
+        PlateTrigram.rebuild()
+        Subscriptions.objects.create(customer_id=self.customer, user=self.user, plate_number='RAC456D', start_date=datetime.date.today(),
+                                     end_date=datetime.date.today(), amount=20000, phone_number='0788000000', name='Peace, "Plaza"')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_history_rows_are_read_in_pages(self):
+        logs = search.search_logs(self.customer.customer_id, search.HistoryFilters())
+        with mock.patch.object(pagination, 'HISTORY_MAX_PAGE_SIZE', 3), self.assertNumQueries(3):
+            rows = list(exports.history_rows(self.customer.customer_id, logs))
+
+        self.assertEqual(rows[0][:3], ['Ticket', 'Date', 'Plate Number'])
+        self.assertEqual([row[2] for row in rows[1:]], [f'RAB12{n}C' for n in range(7)])
+
+    def test_csv(self):
+        response = self.client.get('/history/export.csv', {'parked': 'false'})
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment; filename="parking-history-', response['Content-Disposition'])
+        self.assertEqual(len(rows), 7)
+        self.assertEqual((rows[1][2], rows[1][3], rows[1][9]), ('RAB121C', 'Main & Side', '500'))
+
+    def test_gzipped_xlsx(self):
+        response = self.client.get('/history/export.xlsx', {'plate_contains': 'B123', 'gzip': '1'})
+        rows = read_xlsx(gzip.decompress(b''.join(response.streaming_content)))
+
+        self.assertTrue(response['Content-Disposition'].endswith('.xlsx.gz"'))
+        self.assertEqual([row[2] for row in rows], ['Plate Number', 'RAB123C'])
+        self.assertEqual(rows[1][3], 'Main & Side')
+
+    def test_subscriptions(self):
+        rows = read_xlsx(b''.join(self.client.get('/subscription/export.xlsx').streaming_content))
+        text = b''.join(self.client.get('/subscription/export.csv', {'plate': 'rac'}).streaming_content).decode()
+
+        self.assertEqual(rows[1][2:4], ['RAC456D', 'Peace, "Plaza"'])
+        self.assertEqual(list(csv.reader(io.StringIO(text)))[1][3], 'Peace, "Plaza"')
+        self.assertEqual(self.client.get('/subscription/export.pdf').status_code, 404)
+
+    def test_subscriptions_match_normalized_plates(self):
+        Subscriptions.objects.create(customer_id=self.customer, user=self.user, plate_number='rac 456-e', start_date=datetime.date.today(),
+                                     end_date=datetime.date.today(), amount=20000, phone_number='0788000000')
+        for params in ({'plate': 'RAC4'}, {'plate': 'rac-45'}, {'plate_contains': 'c45'}, {'plate_contains': 'C 456'}):
+            rows = list(exports.subscription_rows(self.customer.customer_id, search.parse_filters(params)))
+            self.assertEqual([row[2] for row in rows[1:]], ['RAC456D', 'rac 456-e'])
+        self.assertEqual(self.client.get('/history/export.csv', {'gate': 'Main'}).status_code, 400)
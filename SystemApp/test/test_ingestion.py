@@ -0,0 +1,195 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.test import TestCase, AsyncClient, Client
+from SystemApp.models import *
+from SystemApp import bookkeeping
+from SystemApp import ingestion
+from SystemApp.staticfiles import AsyncWhiteNoiseMiddleware
+from SystemApp.test.test_rollups import rollup_rows
+import datetime
+import json
+
+
+class BatchIngestionTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.other = Customers.objects.create(company_name='Makuza Peace Plaza', address='Downtown, Kigali, Rwanda')
+        self.user = Users.objects.create(customer_id=self.customer, email='admin@leapr.rw', mail_verified='True')
+        self.gates = [Gates.objects.create(customer_id=customer, name=name, status='Active') for customer, name in ((self.customer, 'Main'), (self.other, 'Plaza'))]
+        for from_time, to_time, cost in ((0, 60, 200), (60, 180, 500)):
+            Tarrif.objects.create(customer_id=self.customer, from_time=from_time, to_time=to_time, cost=cost)
+        self.subscription = Subscriptions.objects.create(customer_id=self.customer, user=self.user, plate_number='RAC456D', start_date=datetime.date.today(),
+                                                         end_date=datetime.date.today(), amount=20000, phone_number='0788000000')
+        self.now = int(datetime.datetime.now().timestamp())
+        self.parked = Parkinglog.objects.create(customer_id=self.customer, date=datetime.date.today(), plate_number='RAB123C', checkin_time=self.now - 7200,
+                                                entry_gate=self.gates[0], parked=True)
+        bookkeeping.ticket_opened(self.parked)
+
+    def event(self, flow, plate_number, minutes=0, customer=None, gate=None, **fields):
+        return dict(flow=flow, plate_number=plate_number, customer_id=(customer or self.customer).customer_id, gate=(gate or self.gates[0]).gate_id,
+                    time=self.now + minutes * 60, **fields)
+
+    def test_batch(self):
+        results = ingestion.ingest([
+            self.event('entry', 'rad 789-e', -30),
+            self.event('exit', 'RAB123C', amount_payed=500, payment_method='Cash'),
+            self.event('entry', 'RAC456D', -20),
+            self.event('exit', 'RAD789E'),
+            self.event('exit', 'RAC456D'),
+            self.event('exit', 'RAE012F'),
+            self.event('entry', 'RAF345G', gate=self.gates[1]),
+            self.event('entry', 'RAF345G', customer=self.other, gate=self.gates[1]),
+            self.event('park', 'RAF345G'),
+            {'flow': 'entry', 'plate_number': 'RAF345G', 'customer_id': 0, 'gate': self.gates[0].gate_id, 'time': self.now},
+        ])
+        tickets = {ticket.plate_normalized: ticket for ticket in Parkinglog.objects.filter(customer_id=self.customer)}
+
+        self.assertEqual(results[:5], [{'flow': 'entry', 'ticket_id': tickets['RAD789E'].ticket_id}, {'flow': 'exit', 'ticket_id': self.parked.ticket_id, 'cost': 500},
+                                       {'flow': 'entry', 'ticket_id': tickets['RAC456D'].ticket_id}, {'flow': 'exit', 'ticket_id': tickets['RAD789E'].ticket_id, 'cost': 200},
+                                       {'flow': 'exit', 'ticket_id': tickets['RAC456D'].ticket_id, 'cost': 0}])
+        self.assertEqual([result.get('error') for result in results[5:]], ['No parked vehicle with this plate number', 'Unknown gate', None,
+                                                                          'The flow of an event must be one of entry, exit', 'Unknown customer'])
+        self.assertEqual([(ticket.plate_number, ticket.parked, ticket.duration, ticket.cost, ticket.amount_payed, ticket.payment_method, ticket.subscription_id)
+                          for ticket in (tickets['RAB123C'], tickets['RAD789E'], tickets['RAC456D'])],
+                         [('RAB123C', False, 7200, 500, 500, 'Cash', None), ('RAD 789-E', False, 1800, 200, None, None, None),
+                          ('RAC456D', False, 1200, 0, 0, 'Subscription', self.subscription.subscription_id)])
+        self.assertEqual(list(PlateTrigram.matching(self.customer.customer_id, '789').values_list('plate', flat=True)), ['RAD789E'])
+
+    def test_out_of_range_events(self):
+        response = Client().post('/api/events', json.dumps([
+            self.event('entry', 'RAD789E'),
+            dict(self.event('entry', 'RAE012F'), time=1e30),
+            self.event('exit', 'RAB123C', amount_payed=2 ** 70),
+            self.event('entry', 'R' * 51),
+            self.event('exit', 'RAB123C', payment_method='M' * 51),
+            self.event('exit', 'RAB123C', -180),
+        ]), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result.get('error') for result in response.json()['results']],
+                         [None, 'The time of an event must be a timestamp before the year 10000', f'The amount_payed of an event must be between 0 and {2 ** 63 - 1}',
+                          'The plate_number of an event has at most 50 characters', 'The payment_method of an event has at most 50 characters',
+                          'An exit cannot be before the entry of its ticket'])
+        self.assertTrue(Parkinglog.objects.filter(plate_normalized='RAD789E').exists())
+        self.assertEqual(Client().post('/api/post', self.event('exit', 'RAB123C', -180)).status_code, 400)
+        self.parked.refresh_from_db()
+        self.assertTrue(self.parked.parked)
+
+    def test_bookkeeping_matches_rebuild(self):
+        ingestion.ingest([self.event('entry', f'RAZ{n:03d}Z', -n) for n in range(30)] + [self.event('exit', f'RAZ{n:03d}Z') for n in range(0, 30, 3)] +
+                         [self.event('exit', 'RAB123C', amount_payed=500, payment_method='Cash')])
+
+        self.assertEqual((Occupancy.current(self.customer.customer_id), Occupancy.current(self.customer.customer_id, self.gates[0].gate_id)), (20, 20))
+        self.assertEqual(Occupancy.reconcile(), {})
+        self.assertEqual(RevenueLedger.lifetime(self.customer.customer_id), {'tickets': 11, 'revenue': 2500, 'amount_payed': 500})
+        incremental = rollup_rows(self.customer)
+        DailyActivity.rebuild(customer_id=self.customer.customer_id)
+        self.assertEqual(incremental, rollup_rows(self.customer))
+
+    def test_exit(self):
+        client = Client()
+        exit = self.event('exit', 'rab 123-c', amount_payed=500, payment_method='Cash')
+        response = client.post('/api/post', exit)
+        self.parked.refresh_from_db()
+
+        self.assertEqual((response['TicketId'], response['Cost'], response['Occupancy']), (str(self.parked.ticket_id), '500', '0'))
+        self.assertEqual((self.parked.parked, self.parked.duration, self.parked.cost, self.parked.amount_payed, self.parked.exit_gate_id),
+                         (False, 7200, 500, 500, self.gates[0].gate_id))
+        self.assertEqual(client.post('/api/post', exit).status_code, 404)
+        self.assertEqual(client.post('/api/post', dict(exit, gate=self.gates[1].gate_id)).status_code, 400)
+
+        ingestion.open_ticket(self.customer.customer_id, self.gates[0].gate_id, 'RAC456D', self.now - 600)
+        ticket = Parkinglog.close(self.customer.customer_id, self.gates[0].gate_id, 'RAC456D', self.now)
+        self.assertEqual((ticket.duration, ticket.cost, ticket.payment_method, ticket.subscription_id), (600, 0, 'Subscription', self.subscription.subscription_id))
+        self.assertEqual(Occupancy.reconcile(), {})
+        self.assertEqual(RevenueLedger.lifetime(self.customer.customer_id), {'tickets': 2, 'revenue': 500, 'amount_payed': 500})
+
+    def test_entry(self):
+        client = Client()
+        response = client.post('/api/post', self.event('entry', 'rad 789-e', -3 * 1440))
+        ticket = Parkinglog.objects.get(ticket_id=response['TicketId'])
+
+        self.assertEqual((ticket.plate_number, ticket.entry_gate_id, ticket.date), ('RAD 789-E', self.gates[0].gate_id, datetime.date.today() - datetime.timedelta(days=3)))
+        for entry in (self.event('entry', 'RAE012F', gate=self.gates[1]), self.event('entry', 'RAE012F', customer=self.other), dict(self.event('entry', 'RAE012F'), gate=999)):
+            self.assertEqual(client.post('/api/post', entry).status_code, 400)
+        self.assertEqual(Occupancy.reconcile(), {})
+
+    def test_retries(self):
+        cache.clear()
+        events = [self.event('entry', 'RAD789E', -30, event_id='gate-1:41'), self.event('exit', 'RAB123C', event_id='gate-1:42'),
+                  self.event('entry', 'RAD789E', -30, event_id='gate-1:41')]
+        first = ingestion.ingest(events)
+        with self.assertNumQueries(0):
+            retried = ingestion.ingest(events)
+
+        self.assertEqual(first[2], dict(first[0], duplicate=True))
+        self.assertEqual(retried, [dict(result, duplicate=True) for result in first])
+        self.assertEqual(Parkinglog.objects.filter(customer_id=self.customer, plate_normalized='RAD789E').count(), 1)
+
+        #Past the dedupe window the tickets still answer the retry
+        cache.clear()
+        self.assertEqual(ingestion.ingest(events[:2]), retried[:2])
+        cache.clear()
+        with self.assertRaises(ingestion.DuplicateEvent) as raised:
+            ingestion.open_ticket(self.customer.customer_id, self.gates[0].gate_id, 'RAD789E', self.now, 'gate-1:41')
+        self.assertEqual(raised.exception.result, first[0])
+        self.assertEqual(Occupancy.reconcile(), {})
+
+        client = Client()
+        exit = self.event('exit', 'RAD789E', event_id='gate-1:43')
+        response = client.post('/api/post', exit)
+        with self.assertNumQueries(0):
+            retry = client.post('/api/post', exit)
+        self.assertEqual((retry['TicketId'], retry['Cost'], retry['Duplicate']), (response['TicketId'], response['Cost'], 'true'))
+        cache.clear()
+        self.assertEqual(client.post('/api/post', exit)['TicketId'], response['TicketId'])
+        self.assertEqual(client.post('/api/post', dict(exit, event_id='x' * 65)).status_code, 400)
+
+    def test_endpoint(self):
+        client = Client()
+        response = client.post('/api/events', json.dumps([self.event('entry', 'RAD789E'), self.event('exit', 'RAD789E', 5)]), content_type='application/json')
+
+        self.assertEqual([result['flow'] for result in response.json()['results']], ['entry', 'exit'])
+        self.assertEqual(client.post('/api/events', 'not json', content_type='application/json').status_code, 400)
+        self.assertEqual(client.post('/api/events', json.dumps({'events': 'RAD789E'}), content_type='application/json').status_code, 400)
+        self.assertEqual(client.post('/api/events', json.dumps([{}] * (ingestion.MAX_EVENTS + 1)), content_type='application/json').status_code, 400)
+        self.assertEqual(client.get('/api/events').status_code, 405)
+
+
+class AsyncIngestionTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.other = Customers.objects.create(company_name='Makuza Peace Plaza', address='Downtown, Kigali, Rwanda')
+        self.gates = [Gates.objects.create(customer_id=customer, name='Main', status='Active') for customer in (self.customer, self.other)]
+
+    async def test_entry(self):
+        client = AsyncClient()
+        entry = {'flow': 'entry', 'plate_number': 'RAB123C', 'customer_id': self.customer.customer_id, 'gate': self.gates[0].gate_id, 'time': '1644480000'}
+        response = await client.post('/api/async/post', entry)
+        ticket = await Parkinglog.objects.aget(ticket_id=response['TicketId'])
+
+        self.assertEqual((ticket.plate_number, ticket.checkin_method, ticket.parked, response['Occupancy']), ('RAB123C', 'Camera', True, '1'))
+        self.assertEqual((await client.post('/api/async/post', dict(entry, gate=self.gates[1].gate_id))).status_code, 400)
+        self.assertEqual((await client.post('/api/async/post', dict(entry, time='now'))).status_code, 400)
+
+        response = await client.post('/api/async/post', dict(entry, flow='exit', time='1644483600'))
+        self.assertEqual((response['TicketId'], response['Cost'], response['Occupancy']), (str(ticket.ticket_id), '0', '0'))
+        self.assertEqual((await client.post('/api/async/post', dict(entry, flow='exit'))).status_code, 404)
+
+        responses = [await client.post('/api/async/post', dict(entry, plate_number='RAD789E', event_id='gate-1:7')) for attempt in range(2)]
+        self.assertEqual((responses[1]['TicketId'], responses[1]['Duplicate']), (responses[0]['TicketId'], 'true'))
+
+    async def test_events(self):
+        events = [{'flow': flow, 'plate_number': 'RAB123C', 'customer_id': self.customer.customer_id, 'gate': self.gates[0].gate_id, 'time': time}
+                  for flow, time in (('entry', 1644480000), ('exit', 1644483600))]
+        response = await AsyncClient().post('/api/async/events', json.dumps(events), content_type='application/json')
+
+        self.assertEqual([result['flow'] for result in response.json()['results']], ['entry', 'exit'])
+        self.assertEqual(await sync_to_async(Occupancy.current)(self.customer.customer_id), 0)
+
+    def test_static_files_middleware_stays_async(self):
+        async def view(request):
+            pass
+
+        self.assertTrue(iscoroutinefunction(AsyncWhiteNoiseMiddleware(view)))
+        self.assertFalse(iscoroutinefunction(AsyncWhiteNoiseMiddleware(lambda request: None)))
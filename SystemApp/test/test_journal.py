@@ -0,0 +1,119 @@
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from SystemApp.models import *
+from SystemApp import ingestion
+from SystemApp import journal
+from unittest import mock
+import io
+import os
+import tempfile
+import time
+
+
+class JournalTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CAMERA_JOURNAL_PATH=os.path.join(directory.name, 'journal.sqlite3'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(journal.close)
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.gate = Gates.objects.create(customer_id=self.customer, name='Main', status='Active')
+
+    def event(self, flow, plate_number, minutes=0, **fields):
+        return dict(flow=flow, plate_number=plate_number, customer_id=str(self.customer.customer_id), gate=str(self.gate.gate_id), time=str(1644480000 + minutes * 60), **fields)
+
+    def test_acknowledged_before_written(self):
+        client = Client()
+        with self.assertNumQueries(0):
+            response = client.post('/api/journal', self.event('entry', 'RAB123C'))
+
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Parkinglog.objects.exists())
+        self.assertEqual(client.post('/api/journal', self.event('entry', '')).status_code, 400)
+        self.assertEqual(journal.stats()['pending'], 1)
+
+        self.assertEqual(journal.drain(), 1)
+        self.assertEqual(Parkinglog.objects.get().entry_event, response['EventId'])
+        self.assertEqual({key: value for key, value in journal.stats().items() if key in ('pending', 'rejected', 'drained')}, {'pending': 0, 'rejected': 0, 'drained': 1})
+
+    def test_plate_order(self):
+        for event in (self.event('entry', 'RAB123C'), self.event('exit', 'RAB123C', 30), self.event('entry', 'RAB123C', 40), self.event('exit', 'RAZ999Z', 45)):
+            journal.append(event)
+        drained = [journal.drain(limit=2), journal.drain(limit=2), journal.drain(limit=2)]
+
+        self.assertEqual(drained, [2, 2, 0])
+        self.assertEqual(list(Parkinglog.objects.order_by('checkin_time').values_list('checkin_time', 'duration', 'parked')),
+                         [(1644480000, 1800, False), (1644482400, None, True)])
+        self.assertEqual((journal.stats()['pending'], journal.stats()['rejected']), (0, 1))
+
+    def test_crash_recovery(self):
+        for minutes in range(3):
+            journal.append(self.event('entry', f'RAB12{minutes}C', minutes))
+        #The drainer dies after its batch committed, before the events left the journal
+        with mock.patch('SystemApp.journal.time') as clock:
+            clock.time.side_effect = RuntimeError('crash')
+            with self.assertRaises(RuntimeError):
+                journal.drain()
+        journal.close()
+        cache.clear()
+
+        self.assertEqual(journal.stats()['pending'], 3)
+        self.assertEqual(journal.drain(), 3)
+        self.assertEqual(Parkinglog.objects.count(), 3)
+        self.assertEqual(Occupancy.reconcile(), {})
+
+    def test_bad_event_does_not_hold_back_the_journal(self):
+        ingest = ingestion.ingest
+
+        def failing(events):
+            if any(event['plate_number'] == 'RAZ999Z' for event in events):
+                raise OverflowError('date value out of range')
+            return ingest(events)
+
+        for plate_number in ('RAB123C', 'RAZ999Z', 'RAC456D'):
+            journal.append(self.event('entry', plate_number))
+        with mock.patch('SystemApp.journal.ingestion.ingest', failing):
+            self.assertEqual(journal.drain(), 3)
+
+        self.assertEqual(sorted(Parkinglog.objects.values_list('plate_number', flat=True)), ['RAB123C', 'RAC456D'])
+        self.assertEqual((journal.stats()['pending'], journal.stats()['rejected']), (0, 1))
+
+        output = io.StringIO()
+        call_command('drain_journal', '--once', '--retry-rejected', stdout=output)
+        self.assertEqual(output.getvalue().splitlines(), ['Retrying 1 rejected camera events', 'Drained 1 camera events'])
+        self.assertEqual(Parkinglog.objects.count(), 3)
+        journal.append(self.event('exit', 'RAD789E'))
+        journal.drain()
+        self.assertEqual((journal.purge_rejected(), journal.stats()['rejected']), (1, 0))
+
+    def test_lease_renewed_while_ingesting(self):
+        journal.append(self.event('entry', 'RAB123C'))
+        ingest = ingestion.ingest
+        taken = []
+
+        def slow(events):
+            time.sleep(0.3)
+            taken.append(journal.lease('gate-server-2'))
+            return ingest(events)
+
+        self.assertTrue(journal.lease('gate-server-1', 0.15))
+        with mock.patch.object(journal, 'LEASE_SECONDS', 0.15), mock.patch('SystemApp.journal.ingestion.ingest', slow):
+            self.assertEqual(journal.drain(owner='gate-server-1'), 1)
+        self.assertEqual(taken, [False])
+
+    def test_single_drainer(self):
+        journal.append(self.event('entry', 'RAB123C'))
+        self.assertTrue(journal.lease('gate-server-1'))
+        self.assertFalse(journal.lease('gate-server-2'))
+
+        output = io.StringIO()
+        call_command('drain_journal', '--once', stdout=output, stderr=io.StringIO())
+        self.assertEqual((output.getvalue(), Parkinglog.objects.count()), ('Drained 0 camera events\n', 0))
+
+        journal.release('gate-server-1')
+        call_command('drain_journal', '--once', stdout=output)
+        self.assertEqual((output.getvalue().splitlines()[-1], Parkinglog.objects.count()), ('Drained 1 camera events', 1))
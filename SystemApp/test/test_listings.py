@@ -0,0 +1,34 @@
+from django.test import TestCase
+from SystemApp.models import *
+from SystemApp import listings
+from SystemApp.pagination import HISTORY_FIELDS
+import datetime
+
+
+class TicketListingTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.gate = Gates.objects.create(customer_id=self.customer, name='Main', status='Active')
+        self.now = 1644480000
+        for n, elapsed in enumerate((30, 3600, 2 * 86400 + 5, 3 * 604800)):
+            Parkinglog.objects.create(customer_id=self.customer, date=datetime.date.today(), plate_number=f'RAB12{n}C', checkin_time=self.now - elapsed,
+                                      entry_gate=self.gate, parked=True)
+        Parkinglog.objects.create(customer_id=self.customer, date=datetime.date.today(), plate_number='RAC456D', checkin_time=self.now - 7200,
+                                  checkout_time=self.now - 3600, duration=3600, exit_gate=self.gate, parked=False)
+
+    def test_rows_match_the_model_properties(self):
+        with self.assertNumQueries(1):
+            rows = listings.ticket_rows(Parkinglog.objects.filter(customer_id=self.customer).values(*HISTORY_FIELDS), now=self.now)
+        tickets = {ticket.ticket_id: ticket for ticket in Parkinglog.objects.all()}
+
+        for row in rows:
+            ticket = tickets[row.ticket_id]
+            self.assertEqual((row.plate_number, row.entry_gate, row.checkin_datetime, row.format_duration),
+                             (ticket.plate_number, ticket.entry_gate and ticket.entry_gate.name, ticket.checkin_datetime, ticket.format_duration))
+        self.assertEqual([row.format_elapsed for row in rows], ['30 seconds ago ', '1 hour ago ', '2 hours ago ', '2 days ago ', '3 weeks ago '])
+        self.assertEqual((rows[2].checkout_datetime, rows[2].exit_gate), (tickets[rows[2].ticket_id].checkout_datetime, 'Main'))
+        self.assertFalse(hasattr(rows[0], '__dict__'))
+
+    def test_parked_vehicles(self):
+        self.assertEqual([row.plate_number for row in listings.parked_vehicles(self.customer.customer_id)], ['RAB120C', 'RAB121C', 'RAB122C', 'RAB123C'])
+        self.assertEqual(listings.format_elapsed(0), '0 seconds ago ')
@@ -0,0 +1,83 @@
+from django.test import TestCase, Client, override_settings
+from unittest import mock
+from SystemApp.models import *
+from SystemApp import memberships
+import datetime
+
+
+class SubscriptionIndexTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.other = Customers.objects.create(company_name='Makuza Peace Plaza', address='Downtown, Kigali, Rwanda')
+        self.user = Users.objects.create(customer_id=self.customer, email='admin@leapr.rw', mail_verified='True')
+        self.gate, self.plaza = [Gates.objects.create(customer_id=customer, name='Main Gate', status='Active') for customer in (self.customer, self.other)]
+        today = datetime.date.today()
+        self.subscriptions = [Subscriptions.objects.create(customer_id=customer, user=self.user, plate_number=plate_number, start_date=today + datetime.timedelta(days=start),
+                                                           end_date=today + datetime.timedelta(days=end), amount=20000, phone_number='0788000000')
+                              for customer, plate_number, start, end in ((self.customer, 'RAC 456-D', -30, 0), (self.customer, 'RAC456D', -5, 30),
+                                                                         (self.customer, 'RAB123C', -60, -1), (self.customer, 'RAE012F', 1, 30),
+                                                                         (self.other, 'RAB123C', 0, 30))]
+
+    def test_lookup(self):
+        self.assertEqual(memberships.lookup(self.customer.customer_id, 'rac456d'), self.subscriptions[1].subscription_id)
+        self.assertIsNone(memberships.lookup(self.customer.customer_id, 'RAB123C'))
+        self.assertIsNone(memberships.lookup(self.customer.customer_id, 'RAE012F'))
+        self.assertEqual(memberships.lookup(self.other.customer_id, 'RAB123C'), self.subscriptions[4].subscription_id)
+        self.assertEqual(Subscriptions.is_subscribed(self.customer.customer_id, 'RAC456D'), self.subscriptions[1])
+
+    def test_lookups_are_read_from_the_cache(self):
+        memberships.lookup(self.customer.customer_id, 'RAC456D')
+        with self.assertNumQueries(0):
+            self.assertIsNone(memberships.lookup(self.customer.customer_id, 'RAZ999Z'))
+            self.assertIsNone(Subscriptions.is_subscribed(self.customer.customer_id, 'RAZ999Z'))
+
+        memberships._indexes.clear()
+        with self.assertNumQueries(0):
+            self.assertIsNone(memberships.lookup(self.customer.customer_id, 'RAZ999Z'))
+
+        added = Subscriptions.objects.create(customer_id=self.customer, user=self.user, plate_number='RAZ999Z', start_date=datetime.date.today(),
+                                             end_date=datetime.date.today(), amount=20000, phone_number='0788000000')
+        self.assertEqual(memberships.lookup(self.customer.customer_id, 'RAZ999Z'), added.subscription_id)
+        added.delete()
+        self.assertIsNone(memberships.lookup(self.customer.customer_id, 'RAZ999Z'))
+
+    def test_indexes_expire(self):
+        memberships.lookup(self.customer.customer_id, 'RAC456D')
+        #Added through another worker, whose cache this process does not share
+        added = Subscriptions.objects.bulk_create([Subscriptions(customer_id=self.customer, user=self.user, plate_number='RAZ999Z', start_date=datetime.date.today(),
+                                                                 end_date=datetime.date.today(), amount=20000, phone_number='0788000000')])[0]
+        self.assertIsNone(memberships.lookup(self.customer.customer_id, 'RAZ999Z'))
+
+        later = memberships.time.monotonic() + memberships.INDEX_TTL + 1
+        with mock.patch('SystemApp.memberships.time.monotonic', return_value=later):
+            #Its copy in the cache expired meanwhile, with the same timeout
+            memberships._cache().delete(f'subscriptions:{self.customer.customer_id}:{memberships.version(self.customer.customer_id)}')
+            self.assertEqual(memberships.lookup(self.customer.customer_id, 'RAZ999Z'), added.subscription_id)
+
+    def test_invalidated_after_commit(self):
+        with mock.patch('SystemApp.memberships.invalidate') as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.subscriptions[1].save()
+                self.assertEqual(invalidate.call_count, 1)
+        self.assertEqual(invalidate.call_args_list, [mock.call(self.customer.customer_id)] * 2)
+
+    def test_day_rollover(self):
+        today = datetime.date.today()
+        self.assertEqual(memberships.lookup(self.customer.customer_id, 'RAC 456-D'), self.subscriptions[1].subscription_id)
+        with mock.patch('SystemApp.memberships.datetime') as clock, self.assertNumQueries(1):
+            clock.date.today.return_value = today + datetime.timedelta(days=1)
+            self.assertEqual(memberships.lookup(self.customer.customer_id, 'RAE012F'), self.subscriptions[3].subscription_id)
+            self.assertEqual(memberships.index(self.customer.customer_id).plates['RAC456D'],
+                             [(today - datetime.timedelta(days=5), today + datetime.timedelta(days=30), self.subscriptions[1].subscription_id)])
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_entries_are_matched_to_subscriptions(self):
+        client = Client()
+        for customer, gate in ((self.customer, self.gate), (self.other, self.plaza)):
+            client.post('/api/post', {'flow': 'entry', 'plate_number': 'RAB123C', 'customer_id': customer.customer_id, 'gate': gate.gate_id, 'time': '1644480000'})
+        client.force_login(self.user)
+        client.post('/parking', {'action': 'add', 'date': datetime.date.today(), 'entry_time': '08:30', 'gate': self.gate.gate_id, 'plate_number': 'RAC456D'})
+
+        self.assertEqual(list(Parkinglog.objects.order_by('ticket_id').values_list('customer_id', 'plate_number', 'subscription')),
+                         [(self.customer.customer_id, 'RAB123C', None), (self.other.customer_id, 'RAB123C', self.subscriptions[4].subscription_id),
+                          (self.customer.customer_id, 'RAC456D', self.subscriptions[1].subscription_id)])
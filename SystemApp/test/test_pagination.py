@@ -0,0 +1,76 @@
+from django.test import TestCase, Client
+from SystemApp.models import *
+from SystemApp import pagination
+import base64
+import datetime
+import json
+
+
+class HistoryPaginationTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.other = Customers.objects.create(company_name='Makuza Peace Plaza', address='Downtown, Kigali, Rwanda')
+        self.user = Users.objects.create(customer_id=self.customer, email='cashier@leapr.rw', mail_verified='True')
+        today = datetime.date.today()
+        #Several tickets share a check-in time and a plate so ties are broken by the ticket id
+        for n in range(11):
+            Parkinglog.objects.create(customer_id=self.customer, date=today - datetime.timedelta(days=n % 4), plate_number=f'RA{n % 3}123C',
+                                      checkin_time=1000 + n // 2, parked=n % 2 == 0)
+        Parkinglog.objects.create(customer_id=self.other, date=today, plate_number='RAB123C', checkin_time=5000, parked=True)
+        DailyActivity.rebuild()
+
+    def walk(self, order, descending, size=3):
+        pages, cursor = [], None
+        while True:
+            rows, cursor = pagination.history_page(self.customer.customer_id, order, descending, after=cursor, size=size)
+            pages.append([row['ticket_id'] for row in rows])
+            if cursor is None:
+                return pages
+
+    def test_pages_cover_the_history_once(self):
+        for order in pagination.HISTORY_ORDERINGS:
+            for descending in (True, False):
+                prefix = '-' if descending else ''
+                expected = list(Parkinglog.objects.filter(customer_id=self.customer).order_by(prefix + order, prefix + 'ticket_id').values_list('ticket_id', flat=True))
+                pages = self.walk(order, descending)
+
+                self.assertEqual(sum(pages, []), expected, (order, descending))
+                self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+
+    def test_deep_page_is_one_query(self):
+        rows, cursor = pagination.history_page(self.customer.customer_id, size=9)
+        with self.assertNumQueries(1):
+            rows, cursor = pagination.history_page(self.customer.customer_id, after=cursor, size=9)
+
+        self.assertEqual((len(rows), cursor), (2, None))
+
+    def test_cursor_of_another_order(self):
+        rows, cursor = pagination.history_page(self.customer.customer_id, 'plate_number', size=3)
+
+        with self.assertRaises(pagination.InvalidCursor):
+            pagination.history_page(self.customer.customer_id, 'date', after=cursor)
+        with self.assertRaises(pagination.InvalidCursor):
+            pagination.history_page(self.customer.customer_id, after='not a cursor')
+
+    def test_forged_cursors(self):
+        def forge(*key):
+            return base64.urlsafe_b64encode(json.dumps(key if len(key) != 1 else key[0]).encode()).decode()
+
+        for order, cursor in (('checkin_time', forge({'ticket_id': 1})), ('checkin_time', forge(['checkin_time', True, 1])),
+                              ('checkin_time', forge('checkin_time', True, '1644480000', 1)), ('checkin_time', forge('checkin_time', True, 1644480000, [1])),
+                              ('checkin_time', forge('checkin_time', True, 1644480000, True)), ('checkin_time', forge('checkin_time', True, 2**64, 1)),
+                              ('plate_number', forge('plate_number', True, 7, 1)), ('date', forge('date', True, '2022-13-01', 1))):
+            with self.assertRaises(pagination.InvalidCursor):
+                pagination.history_page(self.customer.customer_id, order, after=cursor)
+        self.assertEqual(len(pagination.history_page(self.customer.customer_id, after=forge('checkin_time', True, 2**62, 1))[0]), 11)
+
+    def test_datatables_endpoint(self):
+        client = Client()
+        client.force_login(self.user)
+        params = {'draw': 3, 'start': 0, 'length': 5, 'order[0][column]': 2, 'order[0][dir]': 'asc', 'columns[2][data]': 'plate_number'}
+        first = client.get('/history/data', params).json()
+        second = client.get('/history/data', dict(params, start=5, after=first['next'])).json()
+
+        self.assertEqual((first['draw'], first['recordsTotal'], len(first['data'])), (3, 11, 5))
+        self.assertEqual([row['plate_number'] for row in first['data'] + second['data']], ['RA0123C'] * 4 + ['RA1123C'] * 4 + ['RA2123C'] * 2)
+        self.assertEqual(client.get('/history/data', dict(params, after='not a cursor')).status_code, 400)
@@ -0,0 +1,70 @@
+from asgiref.sync import iscoroutinefunction
+from django.test import TestCase, AsyncClient, Client, override_settings
+from SystemApp.models import *
+from SystemApp import profiling
+import datetime
+import json
+
+
+class SQLProfileTestCase(TestCase):
+    def setUp(self):
+        profiling.reset()
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.gate = Gates.objects.create(customer_id=self.customer, name='Main', status='Active')
+        self.user = Users.objects.create(customer_id=self.customer, email='admin@leapr.rw', mail_verified='True', is_staff=True)
+        Parkinglog.objects.create(customer_id=self.customer, date=datetime.date.today(), plate_number='RAB123C', checkin_time=1000, entry_gate=self.gate, parked=True)
+
+    def tearDown(self):
+        profiling.reset()
+
+    def test_fingerprint(self):
+        self.assertEqual(profiling.fingerprint('SELECT * FROM "Gates" WHERE "GateId" IN (%s, %s, %s) AND "Name" = \'North\' LIMIT 21'),
+                         'SELECT * FROM "Gates" WHERE "GateId" IN (...) AND "Name" = ? LIMIT ?')
+
+    def test_record(self):
+        for n in range(2):
+            profiling.record('parking', [('SELECT 1', 2.0), ('SELECT "Name" FROM "Gates" WHERE "GateId" = %s', 1.0),
+                                         ('SELECT "Name" FROM "Gates" WHERE "GateId" = %s', 3.0)], 10.0)
+        view, = profiling.report()
+
+        self.assertEqual((view['requests'], view['queries'], view['max_queries'], view['sql_ms'], view['avg_total_ms']), (2, 6, 3, 12.0, 10.0))
+        self.assertEqual([statement['ms'] for statement in view['slowest']], [3.0, 3.0, 2.0, 2.0, 1.0])
+        self.assertEqual(view['duplicates'], [{'fingerprint': 'SELECT "Name" FROM "Gates" WHERE "GateId" = %s', 'requests': 2, 'repeats': 2}])
+
+    @override_settings(SQL_PROFILE_SAMPLE_RATE=1.0, STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_sampled_requests(self):
+        client = Client()
+        client.force_login(self.user)
+        client.get('/history/data')
+        client.get('/history/data')
+        views = {view['view']: view for view in client.get('/dashboard/sql', {'format': 'json'}).json()['views']}
+
+        self.assertEqual(views['history_data']['requests'], 2)
+        self.assertGreater(views['history_data']['queries'], 0)
+        self.assertEqual(client.get('/dashboard/sql').status_code, 200)
+        client.post('/dashboard/sql', {'action': 'reset'})
+        self.assertEqual([view['view'] for view in profiling.report()], ['dashboard_sql_profile'])
+
+    @override_settings(SQL_PROFILE_SAMPLE_RATE=1.0, STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    async def test_async_requests(self):
+        events = [{'flow': 'entry', 'plate_number': 'RAC456D', 'customer_id': self.customer.customer_id, 'gate': self.gate.gate_id, 'time': 1644480000}]
+        response = await AsyncClient().post('/api/async/events', json.dumps(events), content_type='application/json')
+        view, = profiling.report()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((view['view'], view['requests']), ('AsyncParkingLogs_Events', 1))
+        self.assertGreater(view['queries'], 0)
+
+    @override_settings(SQL_PROFILE_SAMPLE_RATE=1.0)
+    def test_middleware_stays_async(self):
+        async def view(request):
+            pass
+
+        self.assertTrue(iscoroutinefunction(profiling.SQLProfileMiddleware(view)))
+        self.assertFalse(iscoroutinefunction(profiling.SQLProfileMiddleware(lambda request: None)))
+
+    def test_off_by_default(self):
+        client = Client()
+        client.force_login(self.user)
+        client.get('/history/data')
+        self.assertEqual(profiling.report(), [])
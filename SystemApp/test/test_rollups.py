@@ -0,0 +1,157 @@
+from django.db.models import QuerySet
+from django.test import TestCase, Client, override_settings
+from DashboardApp import forms
+from SystemApp import statistics
+from SystemApp.models import *
+from unittest import mock
+import datetime
+import time
+
+
+def rollup_rows(customer):
+    return sorted(DailyActivity.objects.filter(customer_id=customer).exclude(entries=0, exits=0).values_list(
+        'date', 'gate', 'payment_method', 'entries', 'exits', 'revenue', 'amount_payed', 'duration'), key=str)
+
+
+class DailyActivityTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.gate = Gates.objects.create(customer_id=self.customer, name='Main', status='Active')
+        self.user = Users.objects.create(customer_id=self.customer, email='cashier@leapr.rw', mail_verified='True')
+
+    def checkin(self, plate_number):
+        form = forms.TicketForm.CheckinForm({'date': datetime.date.today(), 'entry_time': '08:00', 'gate': self.gate.gate_id, 'plate_number': plate_number})
+        self.assertTrue(form.is_valid(), form.errors)
+        form.cleaned_data['user'] = self.user
+        return form.create()
+
+    def checkout(self, ticket, payed, method, gate=None):
+        form = forms.TicketForm.CheckoutForm({'ticket_id': ticket.ticket_id, 'entry_date': datetime.date.today(), 'entry_time': '08:00', 'entry_gate': self.gate.gate_id,
+                                              'exit_date': datetime.date.today(), 'exit_time': '09:30', 'exit_gate': (gate or self.gate).gate_id, 'payed': payed, 'method': method})
+        self.assertTrue(form.is_valid(), form.errors)
+        form.cleaned_data['user'] = self.user
+        return form.update()
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_occupancy_badge(self):
+        self.checkin('RAB123C')
+        client = Client()
+        client.force_login(self.user)
+        with mock.patch.object(Occupancy, 'current', wraps=Occupancy.current) as current:
+            response = client.get('/parking')
+
+        self.assertIn('<span class="right badge badge-info">1</span>', response.content.decode())
+        self.assertEqual(current.call_count, 1)
+
+    def test_write_paths_match_rebuild(self):
+        first = self.checkin('RAB123C')
+        second = self.checkin('RAC456D')
+        self.checkout(first, 500, 'Cash')
+        self.checkout(second, 700, 'Mobile Money')
+        #A second checkout of the same ticket replaces the first one
+        self.checkout(second, 1000, 'Cash')
+        response = Client().post('/api/post', {'flow': 'entry', 'plate_number': 'RAD789E', 'customer_id': self.customer.customer_id, 'gate': self.gate.gate_id, 'time': time.time()})
+        self.assertTrue(Parkinglog.objects.filter(ticket_id=response['TicketId'], checkin_method='Camera').exists())
+
+        self.assertEqual((Occupancy.current(self.customer.customer_id), Occupancy.current(self.customer.customer_id, self.gate.gate_id)), (1, 1))
+        self.assertEqual(Occupancy.reconcile(), {})
+        self.assertEqual(RevenueLedger.lifetime(self.customer.customer_id)['amount_payed'], 1500)
+
+        incremental = rollup_rows(self.customer)
+        DailyActivity.rebuild(customer_id=self.customer.customer_id)
+
+        self.assertEqual(incremental, rollup_rows(self.customer))
+        self.assertEqual(DailyActivity.objects.filter(customer_id=self.customer).aggregate(Sum('entries'), Sum('exits'), Sum('amount_payed')),
+                         {'entries__sum': 3, 'exits__sum': 2, 'amount_payed__sum': 1500})
+
+    def test_manual_checkout_gate(self):
+        north = Gates.objects.create(customer_id=self.customer, name='North', status='Active')
+        ticket = self.checkout(self.checkin('RAB123C'), 500, 'Cash', gate=north)
+
+        self.assertEqual(Parkinglog.objects.get(ticket_id=ticket.ticket_id).exit_gate_id, north.gate_id)
+        self.assertEqual([(gate.name, gate.entries, gate.exits) for gate in statistics.gate_statistics(self.customer.customer_id)],
+                         [('Main', 1, 0), ('North', 0, 1)])
+        incremental = rollup_rows(self.customer)
+        DailyActivity.rebuild(customer_id=self.customer.customer_id)
+        self.assertEqual(incremental, rollup_rows(self.customer))
+
+    def test_concurrent_first_writes(self):
+        update = QuerySet.update
+        for gate, payment_method in ((None, None), (None, 'Cash'), (self.gate, None), (self.gate, 'Cash')):
+            key = {'customer_id': self.customer, 'date': datetime.date.today(), 'gate': gate, 'payment_method': payment_method}
+            #Another request creates the row between the update finding nothing and the insert
+            DailyActivity.objects.create(**key, entries=1)
+            updates = []
+
+            def racing(queryset, **fields):
+                updates.append(fields)
+                return 0 if len(updates) == 1 else update(queryset, **fields)
+
+            with mock.patch.object(QuerySet, 'update', racing):
+                DailyActivity.record(self.customer.customer_id, datetime.date.today(), gate and gate.gate_id, payment_method, entries=1)
+            self.assertEqual(list(DailyActivity.objects.filter(**key).values_list('entries', flat=True)), [2])
+
+    def test_rebuild_in_chunks(self):
+        today = datetime.date.today()
+        for days in range(10):
+            Parkinglog.objects.create(customer_id=self.customer, date=today - datetime.timedelta(days=days), plate_number='RAB123C', checkin_time=1, entry_gate=self.gate, parked=days % 2 == 0)
+
+        created = DailyActivity.rebuild(chunk_days=3)
+
+        self.assertEqual(created, 15)
+        self.assertEqual(DailyActivity.objects.aggregate(Sum('entries'), Sum('exits')), {'entries__sum': 10, 'exits__sum': 5})
+
+
+class RevenueLedgerTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.today = datetime.date.today()
+        #Unpaid, partly paid and discounted tickets: what was paid differs from the tariff revenue
+        for days, cost, amount_payed in ((0, 500, 500), (0, None, None), (1, 1000, 0), (3, 2000, 1500), (3, 700, 1000)):
+            Parkinglog.objects.create(customer_id=self.customer, date=self.today - datetime.timedelta(days=days), plate_number='RAB123C',
+                                      checkin_time=1, parked=False, cost=cost, amount_payed=amount_payed)
+        Parkinglog.objects.create(customer_id=self.customer, date=self.today, plate_number='RAC456D', checkin_time=1, parked=True)
+        DailyActivity.rebuild()
+        RevenueLedger.rebuild()
+
+    def test_lifetime(self):
+        ticket = Parkinglog.objects.filter(customer_id=self.customer).first()
+        self.assertEqual(RevenueLedger.lifetime(self.customer.customer_id), {'tickets': 5, 'revenue': 4200, 'amount_payed': 3000})
+        self.assertEqual((self.customer.revenue_total, ticket.total_revenue, ticket.total_amount_payed), ('4,200', 4200, 3000))
+        self.assertEqual(RevenueLedger.period(self.customer.customer_id, self.today - datetime.timedelta(days=1))['revenue'], 1500)
+
+    def test_running_totals(self):
+        with self.assertNumQueries(2):
+            totals = RevenueLedger.running_totals(self.customer.customer_id, self.today - datetime.timedelta(days=2), self.today - datetime.timedelta(days=1))
+
+        self.assertEqual(totals, [(self.today - datetime.timedelta(days=2), 0, 2700), (self.today - datetime.timedelta(days=1), 1000, 3700)])
+
+
+class OccupancyTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.north = Gates.objects.create(customer_id=self.customer, name='North', status='Active')
+        self.south = Gates.objects.create(customer_id=self.customer, name='South', status='Active')
+
+    def test_counters(self):
+        Occupancy.adjust(self.customer.customer_id, self.north.gate_id, 1)
+        Occupancy.adjust(self.customer.customer_id, self.south.gate_id, 1)
+        Occupancy.adjust(self.customer.customer_id, self.north.gate_id, 1)
+        Occupancy.adjust(self.customer.customer_id, self.north.gate_id, -1)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.customer.cars_parked, 2)
+        self.assertEqual(Occupancy.current(self.customer.customer_id, self.north.gate_id), 1)
+        self.assertEqual(Occupancy.current(self.customer.customer_id, self.south.gate_id), 1)
+
+    def test_reconcile(self):
+        Parkinglog.objects.create(customer_id=self.customer, plate_number='RAB123C', checkin_time=1, entry_gate=self.north, parked=True)
+        Parkinglog.objects.create(customer_id=self.customer, plate_number='RAC456D', checkin_time=1, entry_gate=self.north, parked=True)
+        Parkinglog.objects.create(customer_id=self.customer, plate_number='RAD789E', checkin_time=1, entry_gate=self.south, parked=False)
+        Occupancy.adjust(self.customer.customer_id, self.south.gate_id, 1)
+
+        drift = Occupancy.reconcile()
+
+        self.assertEqual(drift, {(self.customer.customer_id, None): (1, 2), (self.customer.customer_id, self.north.gate_id): (0, 2), (self.customer.customer_id, self.south.gate_id): (1, 0)})
+        self.assertEqual(Occupancy.current(self.customer.customer_id), 2)
+        self.assertEqual(Occupancy.reconcile(), {})
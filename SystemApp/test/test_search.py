@@ -0,0 +1,77 @@
+from django.test import TestCase, Client
+from django.utils import timezone
+from SystemApp.models import *
+from SystemApp import search
+import datetime
+
+
+class HistorySearchTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.other = Customers.objects.create(company_name='Makuza Peace Plaza', address='Downtown, Kigali, Rwanda')
+        self.north = Gates.objects.create(customer_id=self.customer, name='North', status='Active')
+        self.south = Gates.objects.create(customer_id=self.customer, name='South', status='Active')
+        self.user = Users.objects.create(customer_id=self.customer, email='cashier@leapr.rw', mail_verified='True')
+        self.tickets = {}
+        for plate_number, checkin_time, gate, method in (('RAB123C', 1000, self.north, 'Cash'), ('rab 124-d', 2000, self.south, None),
+                                                         ('RAC812B', 3000, self.north, 'Mobile Money'), ('RB', 4000, self.south, 'Cash')):
+            self.tickets[plate_number] = Parkinglog.objects.create(customer_id=self.customer, date=datetime.date.today(), plate_number=plate_number, checkin_time=checkin_time,
+                                                                   entry_gate=self.north, exit_gate=gate if method else None, checkout_time=checkin_time + 600 if method else None,
+                                                                   parked=method is None, payment_method=method)
+        Parkinglog.objects.create(customer_id=self.other, date=datetime.date.today(), plate_number='RAB123C', checkin_time=1000, parked=True)
+        PlateTrigram.rebuild()
+
+    def found(self, **params):
+        logs = search.search_logs(self.customer.customer_id, search.parse_filters(params))
+        return sorted(logs.values_list('plate_number', flat=True))
+
+    def test_normalized_plates(self):
+        self.assertEqual(self.tickets['rab 124-d'].plate_normalized, 'RAB124D')
+        self.assertEqual(PlateTrigram.trigrams('RAB12'), ['AB1', 'B12', 'RAB'])
+        self.assertEqual(PlateTrigram.trigrams('RB'), ['RB'])
+        self.assertEqual((normalize_plate('rÅb-12 3'), normalize_plate('R٣B1²')), ('RB123', 'RB1'))
+
+    def test_saved_tickets_are_indexed(self):
+        ticket = Parkinglog.objects.create(customer_id=self.customer, date=datetime.date.today(), plate_number='RAE 555-Q', checkin_time=5000, parked=True)
+        self.assertEqual(self.found(plate_contains='E555'), ['RAE 555-Q'])
+
+        ticket.plate_number = 'RAF666Q'
+        ticket.save()
+        self.assertEqual(self.found(plate_contains='F66'), ['RAF666Q'])
+        with self.assertNumQueries(1):
+            ticket.save()
+
+    def test_plate_prefix_and_substring(self):
+        self.assertEqual(self.found(plate='rab-12'), ['RAB123C', 'rab 124-d'])
+        self.assertEqual(self.found(plate_contains='B12'), ['RAB123C', 'rab 124-d'])
+        self.assertEqual(self.found(plate_contains='12'), ['RAB123C', 'RAC812B', 'rab 124-d'])
+        self.assertEqual(self.found(plate_contains='AB124'), ['rab 124-d'])
+        self.assertEqual(self.found(plate_contains='rb'), ['RB'])
+        self.assertEqual(self.found(plate_contains='B1C'), [])
+
+    def test_times_gate_method_and_state(self):
+        self.assertEqual(self.found(checkin_from='2000', checkin_to='4000'), ['RAC812B', 'rab 124-d'])
+        self.assertEqual(self.found(checkout_from='2000'), ['RAC812B', 'RB'])
+        self.assertEqual(self.found(gate=str(self.south.gate_id)), ['RB'])
+        self.assertEqual(self.found(payment_method='Cash', parked='false'), ['RAB123C', 'RB'])
+        self.assertEqual(self.found(parked='true'), ['rab 124-d'])
+
+    def test_parse_filters(self):
+        moment = timezone.make_aware(datetime.datetime(2022, 2, 10, 8, 30))
+
+        self.assertEqual(search.parse_filters({'checkin_from': '2022-02-10T08:30', 'plate': ' rab '}),
+                         search.HistoryFilters(checkin_from=int(moment.timestamp()), plate='RAB'))
+        self.assertFalse(search.parse_filters({'plate': '-'}))
+        for params in ({'checkin_to': 'yesterday'}, {'gate': 'North'}, {'parked': 'maybe'}, {'checkin_from': 'inf'}, {'checkin_from': 'nan'},
+                       {'checkout_to': '-1'}, {'checkout_to': '1e20'}, {'checkin_to': '0001-01-01'}, {'gate': str(2 ** 63)}):
+            with self.assertRaises(search.InvalidSearch):
+                search.parse_filters(params)
+
+    def test_new_tickets_are_searchable(self):
+        client = Client()
+        client.force_login(self.user)
+        client.post('/api/post', {'flow': 'entry', 'plate_number': 'RAD912X', 'customer_id': self.customer.customer_id, 'gate': self.north.gate_id, 'time': 5000})
+
+        results = client.get('/history/search', {'plate_contains': 'D91'}).json()
+        self.assertEqual([row['plate_number'] for row in results['results']], ['RAD912X'])
+        self.assertEqual(client.get('/history/search', {'parked': 'maybe'}).status_code, 400)
@@ -0,0 +1,51 @@
+from django.test import TestCase, Client
+from django.utils import timezone
+from SystemApp.models import *
+from SystemApp import simulation, tariffs
+import datetime
+import json
+
+
+class TariffSimulationTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.north = Gates.objects.create(customer_id=self.customer, name='North', status='Active')
+        self.south = Gates.objects.create(customer_id=self.customer, name='South', status='Active')
+        self.user = Users.objects.create(customer_id=self.customer, email='admin@leapr.rw', mail_verified='True')
+        Tarrif.objects.create(customer_id=self.customer, from_time=0, to_time=1440, cost=500)
+        self.today = datetime.date.today()
+        #Entered at 8:00, the 2000 minute stay leaves the day after it came in
+        for days, minutes, gate, payed in ((0, 20, self.north, 500), (0, 90, self.south, 500), (1, 45, self.north, 400), (2, 2000, self.south, 500), (40, 20, self.north, 500)):
+            date = self.today - datetime.timedelta(days=days)
+            checkin_time = int(timezone.make_aware(datetime.datetime.combine(date, datetime.time(8))).timestamp())
+            Parkinglog.objects.create(customer_id=self.customer, date=date, plate_number='RAB123C', checkin_time=checkin_time,
+                                      checkout_time=checkin_time + minutes * 60, duration=minutes * 60, exit_gate=gate, amount_payed=payed, parked=False)
+        Parkinglog.objects.create(customer_id=self.customer, date=self.today, plate_number='RAC456D', checkin_time=1000, parked=True)
+
+    def test_price(self):
+        costs = simulation.price([(0, 60, 200), (61, 180, 500)], simulation.numpy.array([0, 60, 61, 180, 181]))
+        self.assertEqual(list(costs[:4]), [200, 200, 500, 500])
+        self.assertTrue(simulation.numpy.isnan(costs[4]))
+
+    def test_simulate(self):
+        result = simulation.simulate(self.customer.customer_id, [(0, 60, 200), (61, 180, 800)], self.today - datetime.timedelta(days=6), self.today)
+
+        self.assertEqual((result['tickets'], result['unpriced'], result['projected'], result['actual']), (4, 1, 1200, 1900))
+        self.assertEqual([(day['key'], day['projected'], day['actual']) for day in result['by_day']],
+                         [(self.today - datetime.timedelta(days=1), 200, 900), (self.today, 1000, 1000)])
+        self.assertEqual([(gate['key'], gate['tickets'], gate['difference']) for gate in result['by_gate']], [('North', 2, -500), ('South', 2, -200)])
+        self.assertEqual([(bucket['key'], bucket['tickets']) for bucket in result['by_duration']], [('0-30 min', 1), ('30-60 min', 1), ('60-120 min', 1), ('over 1440 min', 1)])
+        self.assertEqual(simulation.simulate(self.customer.customer_id, [(0, 2880, 100)], self.today - datetime.timedelta(days=2), self.today - datetime.timedelta(days=2))['tickets'], 0)
+        with self.assertRaises(tariffs.InvalidTariff):
+            simulation.simulate(self.customer.customer_id, [(0, 60, 200), (30, 180, 800)], self.today, self.today)
+
+    def test_endpoint(self):
+        client = Client()
+        client.force_login(self.user)
+        current = client.get('/pricing/simulate', {'start': str(self.today - datetime.timedelta(days=60))}).json()
+        proposed = client.post('/pricing/simulate', json.dumps({'tariffs': [[0, 2880, 1000]]}), content_type='application/json').json()
+
+        self.assertEqual((current['tickets'], current['projected'], current['unpriced']), (5, 2000, 1))
+        self.assertEqual((proposed['tickets'], proposed['projected']), (4, 4000))
+        self.assertEqual(client.post('/pricing/simulate', json.dumps({'tariffs': [[0, 60, 200], [90, 120, 300]]}), content_type='application/json').status_code, 400)
+        self.assertEqual(client.get('/pricing/simulate', {'end': 'today'}).status_code, 400)
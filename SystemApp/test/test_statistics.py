@@ -0,0 +1,170 @@
+from django.test import TestCase
+from django.utils import timezone
+from SystemApp.models import *
+from SystemApp import statistics
+from unittest import mock
+import datetime
+import os
+import time
+
+
+class DashboardStatsTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        other = Customers.objects.create(company_name='Makuza Peace Plaza', address='Downtown, Kigali, Rwanda')
+        today = datetime.date.today()
+        for customer in (self.customer, other):
+            Parkinglog.objects.create(customer_id=customer, date=today, plate_number='RAB123C', checkin_time=1, parked=True)
+            Parkinglog.objects.create(customer_id=customer, date=today, plate_number='RAC456D', checkin_time=1, parked=False, cost=500, amount_payed=500)
+            Parkinglog.objects.create(customer_id=customer, date=today - datetime.timedelta(days=3), plate_number='RAD789E', checkin_time=1, parked=False, cost=1000)
+            Parkinglog.objects.create(customer_id=customer, date=today - datetime.timedelta(days=30), plate_number='RAE012F', checkin_time=1, parked=False, cost=2000)
+        DailyActivity.rebuild()
+        Occupancy.reconcile()
+
+    def test_dashboard_stats(self):
+        with self.assertNumQueries(1):
+            stats = statistics.dashboard_stats(self.customer.customer_id)
+
+        self.assertEqual(stats, statistics.DashboardStats(cars_today=2, cars_total=4, cars_parked=1, revenue_today=500, revenue_this_week=1500, revenue_total=3500))
+        self.assertEqual(stats.format_revenue_total, '3,500')
+
+    def test_dashboard_stats_matches_customer_properties(self):
+        stats = statistics.dashboard_stats(self.customer.customer_id)
+
+        self.assertEqual(stats.cars_today, self.customer.cars_today)
+        self.assertEqual(stats.cars_parked, self.customer.cars_parked)
+        self.assertEqual(stats.format_revenue_today, self.customer.revenue_today)
+        self.assertEqual(stats.format_revenue_this_week, self.customer.revenue_this_week)
+
+    def test_dashboard_stats_empty_customer(self):
+        customer = Customers.objects.create(company_name='Empty', address='Kigali')
+
+        self.assertEqual(statistics.dashboard_stats(customer.customer_id), statistics.DashboardStats())
+
+
+class PaymentSummaryTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.gate = Gates.objects.create(customer_id=self.customer, name='Main', status='Active')
+        today = datetime.date.today()
+        Parkinglog.objects.create(customer_id=self.customer, date=today, plate_number='RAB123C', checkin_time=1, parked=True)
+        Parkinglog.objects.create(customer_id=self.customer, date=today, plate_number='RAC456D', checkin_time=1, payment_method='Cash', amount_payed=500, exit_gate=self.gate)
+        Parkinglog.objects.create(customer_id=self.customer, date=today, plate_number='RAD789E', checkin_time=1, payment_method='Cash', amount_payed=None)
+        Parkinglog.objects.create(customer_id=self.customer, date=today - datetime.timedelta(days=2), plate_number='RAE012F', checkin_time=1, payment_method='Mobile Money', amount_payed=1500)
+        DailyActivity.rebuild()
+
+    def test_payment_summary(self):
+        with self.assertNumQueries(1):
+            summary = statistics.payment_summary(self.customer.customer_id)
+
+        self.assertEqual([(row.name, row.count, row.total) for row in summary], [(None, 1, 0), ('Cash', 2, 500), ('Mobile Money', 1, 1500)])
+        self.assertEqual(summary[2].sum, '1,500')
+
+    def test_payment_summary_filters(self):
+        today = datetime.date.today()
+
+        daily = statistics.payment_summary(self.customer.customer_id, date_from=today, date_to=today)
+        by_gate = statistics.payment_summary(self.customer.customer_id, gate=self.gate)
+
+        self.assertEqual([row.name for row in daily], [None, 'Cash'])
+        self.assertEqual([(row.name, row.count, row.total) for row in by_gate], [('Cash', 1, 500)])
+
+
+class GateStatisticsTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.north = Gates.objects.create(customer_id=self.customer, name='North', status='Active')
+        self.south = Gates.objects.create(customer_id=self.customer, name='South', status='Active')
+        Gates.objects.create(customer_id=self.customer, name='Service', status='Inactive')
+        today = datetime.date.today()
+        Parkinglog.objects.create(customer_id=self.customer, date=today, plate_number='RAB123C', checkin_time=1, entry_gate=self.north, exit_gate=self.south)
+        Parkinglog.objects.create(customer_id=self.customer, date=today, plate_number='RAC456D', checkin_time=1, entry_gate=self.north, exit_gate=self.north)
+        Parkinglog.objects.create(customer_id=self.customer, date=today - datetime.timedelta(days=10), plate_number='RAD789E', checkin_time=1, entry_gate=self.north)
+        Parkinglog.objects.create(customer_id=self.customer, date=today - datetime.timedelta(days=3), plate_number='RAE012F', checkin_time=1, entry_gate=self.south, exit_gate=self.south)
+        DailyActivity.rebuild()
+
+    def test_gate_statistics(self):
+        with self.assertNumQueries(1):
+            gates = [(gate.name, gate.entries, gate.exits, round(gate.ratio)) for gate in statistics.gate_statistics(self.customer.customer_id)]
+
+        self.assertEqual(gates, [('North', 3, 1, 33), ('South', 1, 2, 200), ('Service', 0, 0, 0)])
+        self.assertEqual(round(self.north.traffic_ratio), 33)
+
+    def test_gate_statistics_window(self):
+        today = [(gate.entries, gate.exits) for gate in statistics.gate_statistics(self.customer.customer_id, window='today')]
+        week = [(gate.entries, gate.exits) for gate in statistics.gate_statistics(self.customer.customer_id, window='week')]
+
+        self.assertEqual(today, [(2, 1), (0, 1), (0, 0)])
+        self.assertEqual(week, [(2, 1), (1, 2), (0, 0)])
+
+
+class ActivitySeriesTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        #Midnight in Kigali (UTC+2)
+        self.start = int(datetime.datetime(2022, 3, 1, tzinfo=datetime.timezone(datetime.timedelta(hours=2))).timestamp())
+        hour = 3600
+        Parkinglog.objects.create(customer_id=self.customer, plate_number='RAA001A', checkin_time=self.start - hour, checkout_time=self.start + 2 * hour + 5, cost=500, parked=False)
+        Parkinglog.objects.create(customer_id=self.customer, plate_number='RAB123C', checkin_time=self.start + 10, checkout_time=self.start + 3 * hour, cost=1000, parked=False)
+        Parkinglog.objects.create(customer_id=self.customer, plate_number='RAC456D', checkin_time=self.start + hour + 30, parked=True)
+
+    def test_hourly_series(self):
+        with self.assertNumQueries(3):
+            series = statistics.activity_series(self.customer.customer_id, self.start, self.start + 4 * 3600, bucket='hour')
+
+        self.assertEqual(series['width'], 3600)
+        self.assertEqual(series['labels'][0], '2022-03-01T00:00:00+02:00')
+        self.assertEqual(series['entries'], [1, 1, 0, 0])
+        self.assertEqual(series['exits'], [0, 0, 1, 1])
+        self.assertEqual(series['occupancy'], [2, 3, 2, 1])
+        self.assertEqual(series['revenue'], [0, 0, 500, 1000])
+
+    def test_large_ranges_are_downsampled(self):
+        series = statistics.activity_series(self.customer.customer_id, self.start, self.start + 365 * 86400, bucket='hour')
+
+        self.assertEqual(series['width'], 86400)
+        self.assertEqual(len(series['labels']), 365)
+        self.assertEqual(series['entries'][0], 2)
+        self.assertEqual(series['occupancy'][-1], 1)
+
+
+class CashierStatisticsTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.cashiers = [Users.objects.create(customer_id=self.customer, email=f'cashier{n}@leapr.rw', mail_verified='True') for n in range(3)]
+        now = int(time.time())
+        first, second, _ = self.cashiers
+        Parkinglog.objects.create(customer_id=self.customer, date=datetime.date.today(), plate_number='RAB123C', checkin_time=now - 3600, checkin_user=first, checkout_time=now, checkout_user=second, amount_payed=500)
+        Parkinglog.objects.create(customer_id=self.customer, date=datetime.date.today(), plate_number='RAC456D', checkin_time=now - 60, checkin_user=first, parked=True)
+        Parkinglog.objects.create(customer_id=self.customer, date=datetime.date.today() - datetime.timedelta(days=3), plate_number='RAD789E', checkin_time=now - 3 * 86400, checkin_user=second, checkout_time=now - 3 * 86400 + 600, checkout_user=second, amount_payed=200)
+        Subscriptions.objects.create(customer_id=self.customer, plate_number='RAE012F', start_date=datetime.date.today(), end_date=datetime.date.today(), amount=20000, phone_number='0788', user=first)
+
+    def test_cashier_statistics(self):
+        with self.assertNumQueries(1):
+            cashiers = list(statistics.cashier_statistics(self.customer.customer_id))
+
+        self.assertEqual([(user.entries, user.entries_today, user.exits, user.sales, user.sales_today, user.subscriptions_sold, user.subscription_sales) for user in cashiers],
+                         [(2, 2, 0, 0, 0, 1, 20000), (1, 0, 2, 700, 500, 0, 0), (0, 0, 0, 0, 0, 0, 0)])
+        for user in cashiers:
+            self.assertEqual((user.entries, user.entries_today, user.exits, user.sales_today, user.subscriptions_sold, user.subscription_sales),
+                             (user.total_entries, user.total_entries_today, user.total_exits, user.todays_sales, user.total_subscriptions, user.subscriptions_sales))
+
+    def test_cashier_statistics_shift(self):
+        now = int(time.time())
+        shift = statistics.cashier_statistics(self.customer.customer_id, start=now - 2 * 3600, end=now + 1)
+
+        self.assertEqual([(user.entries, user.exits, user.sales) for user in shift], [(2, 0, 0), (0, 1, 500), (0, 0, 0)])
+
+    def test_subscriptions_of_a_local_day(self):
+        day = datetime.date(2022, 3, 1)
+        for date, amount in ((day - datetime.timedelta(days=1), 10000), (day, 20000)):
+            Subscriptions.objects.create(customer_id=self.customer, plate_number='RAF345G', start_date=date, end_date=date, amount=amount, phone_number='0788',
+                                         user=self.cashiers[2], date=date)
+        #Kigali midnight is still the previous day in UTC, the zone of a process Django could not set TZ for
+        start = int(timezone.make_aware(datetime.datetime.combine(day, datetime.time())).timestamp())
+        with mock.patch.dict(os.environ, {'TZ': 'UTC'}):
+            time.tzset()
+            shift = list(statistics.cashier_statistics(self.customer.customer_id, start=start, end=start + 12 * 3600))
+        time.tzset()
+
+        self.assertEqual((shift[2].subscriptions_sold, shift[2].subscription_sales), (1, 20000))
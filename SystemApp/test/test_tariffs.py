@@ -0,0 +1,148 @@
+from django.test import TestCase, Client, override_settings
+from SystemApp.models import *
+from SystemApp import tariffs
+from unittest import mock
+import datetime
+import time
+
+
+class TariffScheduleTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.other = Customers.objects.create(company_name='Makuza Peace Plaza', address='Downtown, Kigali, Rwanda')
+        self.user = Users.objects.create(customer_id=self.customer, email='admin@leapr.rw', mail_verified='True')
+        self.tariffs = [Tarrif.objects.create(customer_id=self.customer, from_time=from_time, to_time=to_time, cost=cost)
+                        for from_time, to_time, cost in ((0, 60, 200), (60, 180, 500), (181, 1440, 1000))]
+        Tarrif.objects.create(customer_id=self.other, from_time=0, to_time=1440, cost=300)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_quotes(self):
+        schedule = tariffs.schedule(self.customer.customer_id)
+
+        self.assertEqual([schedule.quote(minutes)[0] for minutes in (0, 59, 60, 61, 180, 181, 1440)], [200, 200, 200, 500, 500, 1000, 1000])
+        self.assertEqual(schedule.quote(1441), (0, tariffs.NO_TARIFF))
+        self.assertEqual(Tarrif.match_tarrif(self.other.customer_id, 7200, 0), (300, None))
+
+    def test_quotes_are_read_from_memory(self):
+        Tarrif.match_tarrif(self.customer.customer_id, 3600, 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(Tarrif.match_tarrif(self.customer.customer_id, 7200, 0), (500, None))
+
+        Tarrif.objects.filter(pk=self.tariffs[1].pk).update(cost=700)
+        self.tariffs[1].save()
+        self.assertEqual(Tarrif.match_tarrif(self.customer.customer_id, 7200, 0), (500, None))
+
+    def test_schedules_expire(self):
+        #A change made through another worker, whose cache this process does not share
+        Tarrif.match_tarrif(self.customer.customer_id, 7200, 0)
+        Tarrif.objects.filter(pk=self.tariffs[1].pk).update(cost=700)
+        self.assertEqual(Tarrif.match_tarrif(self.customer.customer_id, 7200, 0), (500, None))
+
+        later = time.monotonic() + tariffs.SCHEDULE_TTL + 1
+        with mock.patch('SystemApp.tariffs.time.monotonic', return_value=later):
+            self.assertEqual(Tarrif.match_tarrif(self.customer.customer_id, 7200, 0), (700, None))
+
+    def test_invalidated_after_commit(self):
+        with mock.patch('SystemApp.tariffs.invalidate') as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.tariffs[1].save()
+                self.assertEqual(invalidate.call_count, 1)
+        self.assertEqual(invalidate.call_args_list, [mock.call(self.customer.customer_id)] * 2)
+
+    def test_overlapping_tariffs_saved_earlier(self):
+        schedule = tariffs.Schedule([(0, 60, 200), (30, 120, 500), (40, 50, 800)])
+
+        self.assertEqual(schedule.quote(60), (200, tariffs.OVERLAPPING))
+        self.assertEqual(schedule.quote(61), (500, tariffs.OVERLAPPING))
+        self.assertEqual(schedule.starts, [0, 61])
+
+    def test_check(self):
+        tariffs.check([(60, 120), (0, 60), (121, 200)])
+        for intervals in ([(0, 60), (59, 120)], [(0, 60), (62, 120)], [(10, 5)]):
+            with self.assertRaises(tariffs.InvalidTariff):
+                tariffs.check(intervals)
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_pricing_writes(self):
+        self.assertEqual(Tarrif.match_tarrif(self.customer.customer_id, 3000 * 60, 0)[0], 0)
+        self.client.post('/pricing', {'action': 'add', 'from_time': 1440, 'to_time': 2880, 'cost': 2000})
+        self.assertEqual(Tarrif.match_tarrif(self.customer.customer_id, 2000 * 60, 0)[0], 2000)
+
+        response = self.client.post('/pricing', {'action': 'add', 'from_time': 100, 'to_time': 200, 'cost': 2000})
+        self.assertIn('Tarrif rejected', response.content.decode())
+        self.client.post('/pricing', {'action': 'update', 'tarrif_id': self.tariffs[1].tarrif_id, 'from_time': 60, 'to_time': 100, 'cost': 600})
+        self.assertEqual(list(Tarrif.objects.filter(customer_id=self.customer).values_list('from_time', 'to_time', 'cost')),
+                         [(0, 60, 200), (60, 180, 500), (181, 1440, 1000), (1440, 2880, 2000)])
+
+        response = self.client.post('/pricing', {'action': 'delete', 'tarrif_id': self.tariffs[1].tarrif_id})
+        self.assertIn('No tarrif would cover 61-180 minutes', response.content.decode())
+        self.assertEqual(Tarrif.match_tarrif(self.customer.customer_id, 7200, 0), (0, tariffs.NO_TARIFF))
+        self.client.post('/pricing', {'action': 'add', 'from_time': 60, 'to_time': 180, 'cost': 600})
+        self.assertEqual(Tarrif.match_tarrif(self.customer.customer_id, 7200, 0), (600, None))
+
+    def test_edits_of_overlapping_tariffs(self):
+        #Saved before overlaps were rejected
+        legacy = Tarrif.objects.create(customer_id=self.customer, from_time=100, to_time=300, cost=800)
+        tariffs.validate(self.customer.customer_id, 100, 200, exclude=legacy.tarrif_id)
+        tariffs.validate(self.customer.customer_id, 0, 60, exclude=self.tariffs[0].tarrif_id)
+        for from_time, to_time, exclude in ((100, 400, legacy.tarrif_id), (1000, 1500, None), (1500, 1600, None)):
+            with self.assertRaises(tariffs.InvalidTariff):
+                tariffs.validate(self.customer.customer_id, from_time, to_time, exclude)
+
+    def test_quotes_need_bounded_times(self):
+        for end_time in ('inf', 'nan', '1e30', '-1'):
+            with self.assertRaises(ValueError):
+                Tarrif.match_tarrif(self.customer.customer_id, end_time, 0)
+        response = self.client.get('/parking', {'format': 'json', 'ticket_id': 1, 'cost': 1, 'checkin_time': 0, 'checkout_time': 'inf'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_checkout_quote(self):
+        ticket = Parkinglog.objects.create(customer_id=self.customer, date=datetime.date.today(), plate_number='RAB123C', checkin_time=int(time.time()) - 7000, parked=True)
+        response = self.client.get('/parking', {'format': 'json', 'ticket_id': ticket.ticket_id}).json()
+        self.assertEqual((response['fields']['cost'], response['alerts']), (500, None))
+
+
+class BatchQuoteTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customers.objects.create(company_name='Leapr Labs', address='Rugando, Kigali, Rwanda')
+        self.user = Users.objects.create(customer_id=self.customer, email='admin@leapr.rw', mail_verified='True')
+        for from_time, to_time, cost in ((0, 60, 200), (61, 180, 500)):
+            Tarrif.objects.create(customer_id=self.customer, from_time=from_time, to_time=to_time, cost=cost)
+        Subscriptions.objects.create(customer_id=self.customer, user=self.user, plate_number='RAC456D', start_date=datetime.date.today(),
+                                     end_date=datetime.date.today(), amount=20000, phone_number='0788000000')
+        self.now = 1644480000
+        self.tickets = [Parkinglog.objects.create(customer_id=self.customer, date=datetime.date.today(), plate_number=plate_number, checkin_time=self.now - minutes * 60,
+                                                  parked=parked) for plate_number, minutes, parked in
+                        (('RAB123C', 30, True), ('RAC456D', 120, True), ('RAD789E', 600, True), ('RAE012F', 90, False))]
+
+    def test_quote_many(self):
+        schedule = tariffs.Schedule([(0, 60, 200), (61, 180, 500), (200, 300, 900)])
+        minutes = [250, 0, 181, 61, 60, 400, 180]
+        self.assertEqual(schedule.quote_many(minutes), [schedule.quote(value)[0] if value <= 180 or 200 <= value <= 300 else None for value in minutes])
+
+    def test_parked_vehicles(self):
+        with self.assertNumQueries(3):
+            quotes, alerts = tariffs.quote_tickets(self.customer.customer_id, now=self.now)
+
+        self.assertEqual([(quote['plate_number'], quote['cost'], quote['priced'], quote['subscribed']) for quote in quotes],
+                         [('RAB123C', 200, True, False), ('RAC456D', 500, True, True), ('RAD789E', 0, False, False)])
+        self.assertEqual((quotes[0]['elapsed'], quotes[0]['format_elapsed']), (1800, '30 minutes ago '))
+        self.assertEqual(alerts, tariffs.NO_TARIFF)
+
+    def test_closed_tickets_keep_their_checkout(self):
+        closed = Parkinglog.objects.create(customer_id=self.customer, date=datetime.date.today(), plate_number='RAF345G', checkin_time=self.now - 86400,
+                                           checkout_time=self.now - 82800, duration=3600, cost=700, parked=False)
+        quotes, alerts = tariffs.quote_tickets(self.customer.customer_id, [closed.ticket_id, self.tickets[0].ticket_id], now=self.now)
+
+        self.assertEqual([(quote['plate_number'], quote['cost'], quote['elapsed'], quote['priced']) for quote in quotes],
+                         [('RAB123C', 200, 1800, True), ('RAF345G', 700, 3600, True)])
+        self.assertIsNone(alerts)
+
+    def test_endpoint(self):
+        client = Client()
+        client.force_login(self.user)
+        response = client.get('/parking/quotes', {'ticket_id': f'{self.tickets[0].ticket_id},{self.tickets[3].ticket_id}'}).json()
+
+        self.assertEqual(sorted(quote['plate_number'] for quote in response['quotes']), ['RAB123C', 'RAE012F'])
+        self.assertEqual(client.get('/parking/quotes', {'ticket_id': 'one'}).status_code, 400)
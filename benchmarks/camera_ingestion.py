@@ -0,0 +1,56 @@
+"""
+Flushing a gate agent's buffer of camera entries: one POST /api/post per
+event against a single POST /api/events batch of SystemApp.ingestion, and
+the agent retrying a batch it already flushed, answered by SystemApp.dedupe.
+Every run is rolled back so each one writes into the same tenant.
+"""
+import json
+import time
+
+import harness
+
+
+def main():
+    parser = harness.arguments(__doc__, rows=100000)
+    parser.add_argument('--events', type=int, default=500, help='Entry events flushed per run')
+    args = parser.parse_args()
+    harness.setup('camera_ingestion')
+    from django.db import transaction
+    from django.test import Client
+    from SystemApp.models import Gates
+    customer = harness.seed_tenant(args.rows)
+    gate = Gates.objects.filter(customer_id=customer).first()
+    client = Client()
+    now = int(time.time())
+    events = [{'flow': 'entry', 'plate_number': f'RZZ{n:04d}Z', 'customer_id': customer.customer_id, 'gate': gate.gate_id, 'time': now + n} for n in range(args.events)]
+
+    def rolled_back(function):
+        def run():
+            with transaction.atomic():
+                function()
+                transaction.set_rollback(True)
+        return run
+
+    def one_by_one():
+        for event in events:
+            client.post('/api/post', event)
+
+    def batch(events=events):
+        client.post('/api/events', json.dumps(events), content_type='application/json')
+
+    #Ids unique to this run, the dedupe cache outlives the rollback
+    retried = [dict(event, event_id=f'{now}:{n}') for n, event in enumerate(events)]
+    with transaction.atomic():
+        batch(retried)
+        retries = harness.measure(lambda: batch(retried), args.repeat)
+        transaction.set_rollback(True)
+
+    harness.report(f'Ingesting {args.events:,} entries for a tenant with {args.rows:,} parking logs', {
+        'one request per event': harness.measure(rolled_back(one_by_one), args.repeat),
+        'one batch request': harness.measure(rolled_back(batch), args.repeat),
+        'the batch retried': retries,
+    })
+
+
+if __name__ == '__main__':
+    main()
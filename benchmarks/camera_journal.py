@@ -0,0 +1,88 @@
+"""
+Acknowledging camera entries while the main database is briefly locked by
+another writer: POST /api/post, which writes the ticket before answering,
+against POST /api/journal, which answers once the event is in the
+write-behind journal. The journal is then drained with the database free
+again, reporting its throughput and lag.
+"""
+import datetime
+import sqlite3
+import statistics
+import threading
+import time
+
+import harness
+
+
+def main():
+    parser = harness.arguments(__doc__, rows=10000)
+    parser.add_argument('--events', type=int, default=200, help='Entries acknowledged through each endpoint')
+    parser.add_argument('--lock', type=float, default=1.0, help='Seconds the database stays locked at a time')
+    parser.add_argument('--gap', type=float, default=1.0, help='Seconds between two locks')
+    args = parser.parse_args()
+    harness.setup('camera_journal')
+    from django.conf import settings
+    settings.CAMERA_JOURNAL_PATH = harness.BASE_DIR / 'benchmarks' / 'camera_journal.journal.sqlite3'
+    from django.test import Client
+    from SystemApp import journal
+    from SystemApp.models import DailyActivity, Gates, Occupancy, Parkinglog, PlateTrigram
+    customer = harness.seed_tenant(args.rows)
+    gate = Gates.objects.filter(customer_id=customer).first().gate_id
+    client = Client()
+
+    def clean():
+        Parkinglog.objects.filter(customer_id=customer, plate_number__startswith='JRN').delete()
+        PlateTrigram.objects.filter(customer_id=customer, plate__startswith='JRN').delete()
+        Occupancy.reconcile(customer.customer_id)
+        DailyActivity.rebuild(customer_id=customer.customer_id, since=datetime.date.today())
+
+    def locking(stop):
+        connection = sqlite3.connect(str(settings.DATABASES['default']['NAME']), isolation_level=None)
+        while not stop.is_set():
+            connection.execute('BEGIN IMMEDIATE')
+            stop.wait(args.lock)
+            connection.execute('ROLLBACK')
+            stop.wait(args.gap)
+        connection.close()
+
+    def acknowledge(path):
+        latencies, errors = [], 0
+        stop = threading.Event()
+        locker = threading.Thread(target=locking, args=(stop,))
+        locker.start()
+        try:
+            for n in range(args.events):
+                started = time.perf_counter()
+                response = client.post(path, {'flow': 'entry', 'plate_number': f'JRN{n:04d}', 'customer_id': customer.customer_id, 'gate': gate, 'time': int(time.time())})
+                latencies.append((time.perf_counter() - started) * 1000)
+                errors += response.status_code >= 400
+        finally:
+            stop.set()
+            locker.join()
+        percentiles = statistics.quantiles(latencies, n=100)
+        return {'p50_ms': percentiles[49], 'p99_ms': percentiles[98], 'max_ms': max(latencies), 'errors': errors}
+
+    clean()
+    results = {'write then answer (/api/post)': acknowledge('/api/post')}
+    clean()
+    results['journal then answer (/api/journal)'] = acknowledge('/api/journal')
+    lag = journal.stats()['oldest_seconds']
+    started = time.perf_counter()
+    drained = 0
+    while True:
+        count = journal.drain()
+        if not count:
+            break
+        drained += count
+    elapsed = time.perf_counter() - started
+    clean()
+
+    print(f'\n{args.events} entries while the database is locked {args.lock}s out of every {args.lock + args.gap}s')
+    print(f"{'acknowledged by':<40}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for name, result in results.items():
+        print(f"{name:<40}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['max_ms']:>10.1f}{result['errors']:>8}")
+    print(f'Drained {drained} journaled entries in {elapsed * 1000:.0f}ms, the oldest had waited {lag:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
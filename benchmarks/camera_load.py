@@ -0,0 +1,114 @@
+"""
+Sustained camera entries per second and latency percentiles with 1k
+concurrent connections: the WSGI ParkingLogs.Post served by a fixed pool of
+sync workers, as gunicorn runs it, against AsyncParkingLogs.Post on the ASGI
+application in a single event loop. Both applications are driven in
+process, so the numbers leave out the HTTP server and the network.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+import asyncio
+import datetime
+import io
+import os
+import statistics
+import sys
+import time
+
+import harness
+
+
+def wsgi_post(application, path, body):
+    statuses = []
+    environ = {
+        'REQUEST_METHOD': 'POST', 'PATH_INFO': path, 'SCRIPT_NAME': '', 'QUERY_STRING': '', 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'CONTENT_TYPE': 'application/x-www-form-urlencoded', 'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    chunks = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    b''.join(chunks)
+    getattr(chunks, 'close', lambda: None)()
+    return int(statuses[0].split()[0])
+
+
+async def asgi_post(application, path, body):
+    statuses = []
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'root_path': '', 'query_string': b'', 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        'headers': [(b'host', b'localhost'), (b'content-type', b'application/x-www-form-urlencoded'), (b'content-length', str(len(body)).encode())],
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+    async def receive():
+        return messages.pop() if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await application(scope, receive, send)
+    return statuses[0]
+
+
+async def load(post, customer, gate, connections, requests):
+    """Open `connections` clients each sending `requests` entries back to back."""
+    latencies, errors = [], []
+
+    async def client(n):
+        for r in range(requests):
+            body = urlencode({'flow': 'entry', 'plate_number': f'LOAD{n:04d}{r:02d}', 'customer_id': customer, 'gate': gate, 'time': int(time.time())}).encode()
+            started = time.perf_counter()
+            status = await post(body)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                errors.append(status)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(connections)))
+    elapsed = time.perf_counter() - started
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {'events_per_second': len(latencies) / elapsed, 'p50_ms': percentiles[49], 'p99_ms': percentiles[98], 'errors': len(errors)}
+
+
+def main():
+    parser = harness.arguments(__doc__, rows=10000)
+    parser.add_argument('--connections', type=int, default=1000, help='Concurrent client connections')
+    parser.add_argument('--requests', type=int, default=5, help='Entries sent by each connection')
+    parser.add_argument('--workers', type=int, default=2 * (os.cpu_count() or 1) + 1, help='Sync workers of the WSGI server')
+    args = parser.parse_args()
+    harness.setup('camera_load')
+    from django.core.asgi import get_asgi_application
+    from django.core.wsgi import get_wsgi_application
+    from SystemApp.models import DailyActivity, Gates, Occupancy, Parkinglog, PlateTrigram
+    customer = harness.seed_tenant(args.rows)
+    gate = Gates.objects.filter(customer_id=customer).first().gate_id
+    wsgi, asgi = get_wsgi_application(), get_asgi_application()
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+
+    def clean():
+        Parkinglog.objects.filter(customer_id=customer, plate_number__startswith='LOAD').delete()
+        PlateTrigram.objects.filter(customer_id=customer, plate__startswith='LOAD').delete()
+        Occupancy.reconcile(customer.customer_id)
+        DailyActivity.rebuild(customer_id=customer.customer_id, since=datetime.date.today())
+
+    async def through_wsgi(body):
+        return await asyncio.get_running_loop().run_in_executor(pool, wsgi_post, wsgi, '/api/post', body)
+
+    async def through_asgi(body):
+        return await asgi_post(asgi, '/api/async/post', body)
+
+    results = {}
+    for name, post in ((f'WSGI, {args.workers} sync workers', through_wsgi), ('ASGI, one event loop', through_asgi)):
+        clean()
+        results[name] = asyncio.run(load(post, customer.customer_id, gate, args.connections, args.requests))
+    clean()
+
+    print(f'\n{args.connections:,} connections sending {args.requests} entries each')
+    print(f"{'server':<40}{'events/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, result in results.items():
+        print(f"{name:<40}{result['events_per_second']:>10.0f}{result['p50_ms']:>10.0f}{result['p99_ms']:>10.0f}{result['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+"""
+Dashboard KPIs: the per-property Customers queries over the raw parking logs
+against the single rollup query of SystemApp.statistics.dashboard_stats.
+"""
+import harness
+
+
+def main():
+    args = harness.arguments(__doc__).parse_args()
+    harness.setup('dashboard_stats')
+    from SystemApp import statistics
+    customer = harness.seed_tenant(args.rows)
+
+    def per_property():
+        return (customer.cars_today, customer.cars_total, customer.revenue_today,
+                customer.revenue_this_week, customer.revenue_total, customer.cars_parked)
+
+    harness.report(f'Dashboard KPIs, {args.rows:,} parking logs', {
+        'Customers properties': harness.measure(per_property, args.repeat),
+        'statistics.dashboard_stats': harness.measure(lambda: statistics.dashboard_stats(customer.customer_id), args.repeat),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Shared helpers for the benchmark scripts in this folder.
+
+Every script runs against its own SQLite file under benchmarks/ so a large
+seeded tenant is built once and reused between runs, e.g.
+
+    python benchmarks/dashboard_stats.py --rows 1000000
+"""
+from pathlib import Path
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import time
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+PAYMENT_METHODS = ('Cash', 'Mobile Money', 'Visa Card', 'Ewawe Card', 'Subscription', None)
+
+
+def arguments(description, rows=1000000):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--rows', type=int, default=rows, help='Parking logs seeded for the benchmark tenant')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per measurement')
+    return parser
+
+
+def setup(name):
+    """Point Django at benchmarks/<name>.sqlite3 and bring its schema up to date."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'System.settings')
+    import django
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = BASE_DIR / 'benchmarks' / f'{name}.sqlite3'
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed_tenant(rows, gates=4, cashiers=5, days=365, seed=0):
+    """
+    Create (or reuse) a customer owning `rows` parking logs spread over the
+    last `days` days. About 2% of the tickets are still parked.
+    """
+    from django.db import connection
+    from SystemApp import models
+    company_name = f'Benchmark tenant {rows}'
+    customer = models.Customers.objects.filter(company_name=company_name).first()
+    if customer is not None and models.Parkinglog.objects.filter(customer_id=customer).count() == rows:
+        return customer
+    if customer is not None:
+        customer.delete()
+
+    rng = random.Random(seed)
+    customer = models.Customers.objects.create(company_name=company_name, address='Kigali')
+    gate_objs = [models.Gates.objects.create(customer_id=customer, name=f'Gate {n}', status='Active') for n in range(gates)]
+    user_objs = [models.Users.objects.create(customer_id=customer, email=f'cashier{n}.{rows}@bench.rw', mail_verified='True') for n in range(cashiers)]
+    today = datetime.date.today()
+    started = time.perf_counter()
+    batch = []
+    for n in range(rows):
+        date = today - datetime.timedelta(days=rng.randrange(days))
+        checkin_time = int(datetime.datetime.combine(date, datetime.time()).timestamp()) + rng.randrange(86400)
+        parked = rng.random() < 0.02
+        duration = None if parked else rng.randrange(60, 6 * 3600)
+        cost = None if parked else rng.choice((200, 500, 1000, 2000))
+        plate_number = 'R{}{:03d}{}'.format(''.join(rng.choice('ABCDEFGH') for _ in range(2)), rng.randrange(1000), rng.choice('ABCDEFGHJKLMNPQRSTUVWXYZ'))
+        batch.append(models.Parkinglog(
+            customer_id = customer,
+            date = date,
+            plate_number = plate_number,
+            plate_normalized = plate_number,
+            entry_gate = rng.choice(gate_objs),
+            checkin_time = checkin_time,
+            checkin_user = rng.choice(user_objs),
+            checkout_time = None if parked else checkin_time + duration,
+            exit_gate = None if parked else rng.choice(gate_objs),
+            checkout_user = None if parked else rng.choice(user_objs),
+            parked = parked,
+            duration = duration,
+            cost = cost,
+            amount_payed = cost,
+            payment_method = None if parked else rng.choice(PAYMENT_METHODS),
+        ))
+        if len(batch) == 10000:
+            models.Parkinglog.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        models.Parkinglog.objects.bulk_create(batch)
+    models.DailyActivity.rebuild(customer_id=customer.customer_id)
+    models.RevenueLedger.rebuild(customer_id=customer.customer_id)
+    models.Occupancy.reconcile(customer_id=customer.customer_id)
+    models.PlateTrigram.rebuild(customer_id=customer.customer_id)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    print(f'Seeded {rows:,} parking logs in {time.perf_counter() - started:.1f}s')
+    return customer
+
+
+def measure(function, repeat=5):
+    """Run `function` `repeat` times and report its query count and latency."""
+    from django.db import connection
+    timings = []
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        #Counted here rather than from connection.queries, which keeps only the last 9000
+        queries[-1] += 1
+        return execute(sql, params, many, context)
+
+    for _ in range(repeat):
+        queries.append(0)
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - started) * 1000)
+    return {'queries': queries[-1], 'best_ms': min(timings), 'median_ms': statistics.median(timings)}
+
+
+def report(title, results):
+    print(f'\n{title}')
+    print(f"{'case':<40}{'queries':>10}{'best ms':>12}{'median ms':>12}")
+    for name, result in results.items():
+        print(f"{name:<40}{result['queries']:>10}{result['best_ms']:>12.1f}{result['median_ms']:>12.1f}")
@@ -0,0 +1,30 @@
+"""
+Partial plate search: a substring scan over the tickets against the
+normalized plate range and PlateTrigram lookups of SystemApp.search.
+"""
+import harness
+
+
+def main():
+    args = harness.arguments(__doc__).parse_args()
+    harness.setup('plate_search')
+    from SystemApp import search
+    from SystemApp.models import Parkinglog
+    customer = harness.seed_tenant(args.rows)
+    plate = Parkinglog.objects.filter(customer_id=customer).values_list('plate_normalized', flat=True).first()
+    fragment = plate[1:6]
+    logs = Parkinglog.objects.filter(customer_id=customer)
+
+    def found(filters):
+        return lambda: list(search.search_logs(customer.customer_id, filters).values_list('ticket_id', flat=True)[:100])
+
+    harness.report(f'Plate search for {plate[:5]!r} and {fragment!r}, {args.rows:,} parking logs', {
+        'prefix, LIKE scan': harness.measure(lambda: list(logs.filter(plate_number__istartswith=plate[:5]).values_list('ticket_id', flat=True)[:100]), args.repeat),
+        'prefix, normalized range': harness.measure(found(search.HistoryFilters(plate=plate[:5])), args.repeat),
+        'substring, LIKE scan': harness.measure(lambda: list(logs.filter(plate_number__icontains=fragment).values_list('ticket_id', flat=True)[:100]), args.repeat),
+        'substring, trigrams': harness.measure(found(search.HistoryFilters(plate_contains=fragment)), args.repeat),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Hot Parkinglog queries of the dashboard and models with and without the
+composite indexes of SystemApp migration 0005: the SQLite query plan and the
+latency of every query are recorded before and after the indexes exist.
+"""
+import datetime
+import harness
+
+
+def indexes_enabled(enabled):
+    """Create or drop the Parkinglog Meta.indexes so the same data is measured both ways."""
+    from django.db import connection
+    from SystemApp.models import Parkinglog
+    with connection.cursor() as cursor:
+        existing = connection.introspection.get_constraints(cursor, Parkinglog._meta.db_table)
+    with connection.schema_editor() as editor:
+        for index in Parkinglog._meta.indexes:
+            if enabled and index.name not in existing:
+                editor.add_index(Parkinglog, index)
+            elif not enabled and index.name in existing:
+                editor.remove_index(Parkinglog, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def query_plan(function):
+    """EXPLAIN QUERY PLAN of the last statement `function` runs."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    with CaptureQueriesContext(connection) as queries:
+        function()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + queries[-1]['sql'])
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def main():
+    args = harness.arguments(__doc__).parse_args()
+    harness.setup('query_plans')
+    from django.db.models import Count, Sum
+    from SystemApp.models import Parkinglog
+    customer = harness.seed_tenant(args.rows)
+    logs = Parkinglog.objects.filter(customer_id=customer.customer_id)
+    today = datetime.date.today()
+    plate_number = logs.values_list('plate_number', flat=True).first()
+    midnight = int(datetime.datetime.combine(today, datetime.time()).timestamp())
+
+    cases = {
+        'parked vehicles': lambda: list(logs.filter(parked=True)[:100]),
+        'history page': lambda: list(logs[:100]),
+        'cars today': lambda: logs.filter(date=today).count(),
+        'plate already parked': lambda: logs.filter(plate_number=plate_number, parked=True).exists(),
+        'payment method this week': lambda: logs.filter(payment_method='Cash', date__gte=today - datetime.timedelta(days=7)).aggregate(Sum('amount_payed')),
+        'rollup chunk': lambda: list(logs.filter(date__gte=today - datetime.timedelta(days=31)).order_by().values('date', 'payment_method').annotate(Count('ticket_id'))),
+        'checkouts today': lambda: logs.filter(checkout_time__gte=midnight).order_by().aggregate(Sum('amount_payed')),
+    }
+
+    plans = {}
+    for label, enabled in (('without indexes', False), ('with indexes', True)):
+        indexes_enabled(enabled)
+        plans[label] = {name: query_plan(case) for name, case in cases.items()}
+        harness.report(f'Parkinglog queries {label}, {args.rows:,} parking logs',
+                       {name: harness.measure(case, args.repeat) for name, case in cases.items()})
+
+    print('\nQuery plans')
+    for name in cases:
+        print(f'\n{name}')
+        for label, plan in plans.items():
+            print(f'  {label}:')
+            for step in plan[name]:
+                print(f'    {step}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""
+Tariff what-if simulation over a year of closed tickets: loading the
+durations, re-pricing them with SystemApp.simulation and the whole
+simulation, against quoting every ticket through the compiled schedule.
+"""
+import datetime
+
+import harness
+
+PROPOSAL = [(0, 30, 200), (31, 60, 300), (61, 180, 500), (181, 360, 1000), (361, 1440, 2000)]
+
+
+def main():
+    args = harness.arguments(__doc__, rows=300000).parse_args()
+    harness.setup('tariff_simulation')
+    from SystemApp import simulation, tariffs
+    customer = harness.seed_tenant(args.rows)
+    end = datetime.date.today()
+    start = end - datetime.timedelta(days=364)
+    checkouts, gates, minutes, actual = simulation.load_tickets(customer.customer_id, start, end)
+    schedule = tariffs.Schedule(PROPOSAL)
+
+    harness.report(f'Re-pricing {len(minutes):,} closed tickets of {args.rows:,} parking logs', {
+        'load durations': harness.measure(lambda: simulation.load_tickets(customer.customer_id, start, end), args.repeat),
+        'price, Schedule.quote per ticket': harness.measure(lambda: [schedule.quote(value)[0] for value in minutes.tolist()], args.repeat),
+        'price, numpy searchsorted': harness.measure(lambda: simulation.price(PROPOSAL, minutes), args.repeat),
+        'whole simulation': harness.measure(lambda: simulation.simulate(customer.customer_id, PROPOSAL, start, end), args.repeat),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Rendering the parked vehicles table for 10k tickets: model instances with a
+gate query per row against the values() projection of SystemApp.listings.
+"""
+import tracemalloc
+
+import harness
+
+TABLE = '''{% for vehicle in vehicles %}<tr><th scope="row">{{forloop.counter}}</th><td>{{vehicle.plate_number}}</td>
+<td>{{vehicle.entry_gate}}</td><td>{{vehicle.checkin_datetime}}</td><td>{{vehicle.format_elapsed}}</td>
+<td><a id={{ vehicle.ticket_id }}>Checkout</a></td></tr>{% endfor %}'''
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = harness.arguments(__doc__, rows=200000)
+    parser.add_argument('--tickets', type=int, default=10000, help='Tickets rendered in the table')
+    args = parser.parse_args()
+    harness.setup('ticket_listing')
+    from django.template import Context, Template
+    from SystemApp import listings
+    from SystemApp.models import Parkinglog
+    from SystemApp.pagination import HISTORY_FIELDS
+    customer = harness.seed_tenant(args.rows)
+    logs = Parkinglog.objects.filter(customer_id=customer).order_by('-checkin_time')[:args.tickets]
+    table = Template(TABLE)
+
+    def instances():
+        return table.render(Context({'vehicles': list(logs.all())}))
+
+    def projection():
+        return table.render(Context({'vehicles': listings.ticket_rows(logs.values(*HISTORY_FIELDS))}))
+
+    harness.report(f'Rendering {args.tickets:,} tickets of {args.rows:,} parking logs', {
+        'model instances': harness.measure(instances, args.repeat),
+        'values() projection': harness.measure(projection, args.repeat),
+    })
+    print(f'\n{"case":<40}{"peak MB":>10}')
+    for name, function in (('model instances', instances), ('values() projection', projection)):
+        print(f'{name:<40}{peak_memory(function) / 2 ** 20:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()